@@ -0,0 +1,75 @@
+"""
+Pages/sec of the crawler with its browser contexts spread over 1, 2, 4... Chromium processes, on the
+local fixture site. The frontier and templates stay shared in the crawler's event loop.
+
+The fixture site is a single host: its limit starts at the concurrency, instead of growing from
+INITIAL_HOST_LIMIT, so that the browsers bound the throughput rather than the politeness.
+
+    python benchmark/browser_fanout.py --pages 1000 --concurrency 16 --browsers 1 2 4 8
+"""
+
+import argparse
+import asyncio
+import os
+import time
+
+from fixture_site import fixture_urls, serve_fixture_site
+from playwright.async_api import async_playwright
+
+from webportal.map_website.browser_pool import BrowserContextPool
+from webportal.map_website.crawl import FastJSCrawler
+from webportal.map_website.host_scheduler import HostScheduler
+
+
+async def crawl_urls(
+    base_url: str, paths: list[str], concurrency: int, nb_browsers: int
+) -> float:
+    crawler = FastJSCrawler(
+        base_url,
+        max_pages=len(paths),
+        max_depth=0,  # Only visit the given pages
+        concurrency=concurrency,
+        use_sitemap=False,
+        respect_robots=False,
+    )
+    crawler.host_scheduler = HostScheduler(
+        max_host_limit=concurrency, initial_host_limit=concurrency
+    )
+    async with async_playwright() as p:
+        browsers = await asyncio.gather(
+            *(p.chromium.launch(headless=True) for _ in range(nb_browsers))
+        )
+        context_pool = BrowserContextPool(list(browsers), size=concurrency)
+        start = time.perf_counter()
+        await asyncio.gather(
+            *(crawler.crawl_page(context_pool, base_url + path, 0) for path in paths)
+        )
+        elapsed = time.perf_counter() - start
+        await context_pool.close()
+        await asyncio.gather(*(browser.close() for browser in browsers))
+    return elapsed
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--pages", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--browsers", type=int, nargs="+", default=[1, 2, 4, 8])
+    args = parser.parse_args()
+
+    paths = fixture_urls(args.pages)
+    print(f"{os.cpu_count()} cores, {args.concurrency} contexts and requests to the host")
+    with serve_fixture_site() as base_url:
+        baseline = None
+        for nb_browsers in args.browsers:
+            elapsed = await crawl_urls(base_url, paths, args.concurrency, nb_browsers)
+            pages_per_second = len(paths) / elapsed
+            baseline = baseline or pages_per_second
+            print(
+                f"{nb_browsers} browsers: {pages_per_second:.2f} pages/s "
+                f"(x{pages_per_second / baseline:.2f}, {len(paths)} pages in {elapsed:.1f}s)"
+            )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
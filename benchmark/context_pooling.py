@@ -0,0 +1,60 @@
+"""
+Pages/sec of the crawler with and without browser-context pooling, on the local fixture site.
+
+    python benchmark/context_pooling.py --pages 1000 --concurrency 8
+"""
+
+import argparse
+import asyncio
+import time
+
+from fixture_site import fixture_urls, serve_fixture_site
+from playwright.async_api import async_playwright
+
+from webportal.map_website.browser_pool import BrowserContextPool
+from webportal.map_website.crawl import FastJSCrawler
+
+
+async def crawl_urls(base_url: str, paths: list[str], concurrency: int, pooled: bool):
+    crawler = FastJSCrawler(
+        base_url,
+        max_pages=len(paths),
+        max_depth=0,  # Only visit the given pages
+        concurrency=concurrency,
+        use_sitemap=False,
+    )
+    async with async_playwright() as p:
+        browser = await p.chromium.launch(headless=True)
+        context_pool = BrowserContextPool(
+            browser, size=concurrency, max_pages_per_context=50 if pooled else 1
+        )
+        start = time.perf_counter()
+        await asyncio.gather(
+            *(crawler.crawl_page(context_pool, base_url + path, 0) for path in paths)
+        )
+        elapsed = time.perf_counter() - start
+        await context_pool.close()
+        await browser.close()
+    return elapsed, context_pool.contexts_created
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--pages", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=8)
+    args = parser.parse_args()
+
+    paths = fixture_urls(args.pages)
+    with serve_fixture_site() as base_url:
+        for pooled in (False, True):
+            elapsed, nb_contexts = await crawl_urls(
+                base_url, paths, args.concurrency, pooled
+            )
+            print(
+                f"Context pooling {'on ' if pooled else 'off'}: {len(paths) / elapsed:.2f} pages/s "
+                f"({len(paths)} pages in {elapsed:.1f}s, {nb_contexts} contexts created)"
+            )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,228 @@
+"""
+Synthetic website served locally, to benchmark the crawler without hitting real sites.
+
+    python benchmark/fixture_site.py --port 8000
+
+Structure (all pages are generated from their path):
+- /                                 home, links to the sections and a few static pages
+- /{section}                        section index, links to its articles and listing pages
+- /{section}/page/{n}               paginated listing, links to articles and the next page
+- /{section}/{topic}/{slug}         article, links to related articles, its comments, author and tags
+- /{section}/{topic}/{slug}/comments comments of an article
+- /authors/{name}                   author, links to their publications and articles
+- /tags/{tag}                       tag, links to tagged articles
+- /shop/{category}/{brand}/{slug}   product catalog, each page links to many other products
+- /static/...                       images, fonts, scripts and stylesheets (a few KB each)
+
+With `--long-polling`, the script of the pages adds a few links once rendered and keeps a request
+to /poll open, like chat widgets and live updates: the network is never idle.
+"""
+
+import argparse
+import hashlib
+import random
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+SECTIONS = [
+    "news", "research", "careers", "events", "products", "docs", "blog", "community",
+    "support", "about", "partners", "press", "education", "policy", "data", "tools",
+]  # fmt: skip
+TOPICS = ["physics", "biology", "chemistry", "climate", "ai", "health", "space", "energy"]
+CATEGORIES = ["laptops", "phones", "cameras", "audio", "games", "books", "garden", "kitchen"]
+BRANDS = ["acme", "globex", "initech", "umbrella", "hooli", "stark", "wayne", "wonka"]
+WORDS = [
+    "quantum", "cell", "protein", "model", "ocean", "carbon", "neural", "genome",
+    "fusion", "vaccine", "galaxy", "battery", "robot", "brain", "forest", "water",
+]  # fmt: skip
+STATIC_ASSET_SIZES = {".png": 20_000, ".woff2": 30_000, ".js": 15_000, ".css": 5_000}
+POLL_SECONDS = 5.0
+LONG_POLLING_SCRIPT = b"""
+document.addEventListener('DOMContentLoaded', () => {
+    setTimeout(() => {
+        const list = document.querySelector('nav ul');
+        for (const tag of ['live', 'latest', 'trending']) {
+            const item = document.createElement('li');
+            item.innerHTML = `<a href="/tags/${tag}">${tag}</a>`;
+            list.appendChild(item);
+        }
+    }, 200);
+    const poll = () => fetch('/poll').then(poll, poll);
+    poll();
+});
+"""
+
+
+def _rng(path: str) -> random.Random:
+    return random.Random(hashlib.md5(path.encode()).hexdigest())
+
+
+def _slug(rng: random.Random) -> str:
+    return "-".join(rng.sample(WORDS, 3))
+
+
+def _links_for_path(path: str, links_per_page: int) -> list[str]:
+    rng = _rng(path)
+    parts = [part for part in path.split("/") if part]
+    if not parts:
+        return (
+            [f"/{section}" for section in SECTIONS]
+            + ["/legal/terms", "/legal/privacy"]
+            + [f"/shop/{_product(rng)}" for _ in range(5)]
+        )
+    section = parts[0]
+    if section == "shop":
+        # Large catalog: many links, no new structure
+        return ["/"] + [f"/shop/{_product(rng)}" for _ in range(links_per_page - 1)]
+    if section == "authors":
+        links = ["/", f"/authors/{parts[1]}/publications/{rng.randint(2000, 2024)}"]
+    elif section == "tags":
+        links = ["/", f"/tags/{parts[1]}/page/2"]
+    else:
+        links = ["/", f"/{section}", f"/{rng.choice(SECTIONS)}"]
+    if len(parts) == 1 or parts[1] == "page":
+        page_number = int(parts[2]) if len(parts) == 3 and parts[2].isdigit() else 1
+        links.append(f"/{section}/page/{page_number + 1}")
+    elif len(parts) == 3 and section in SECTIONS:
+        # Article
+        links += [f"{path.rstrip('/')}/comments", f"/authors/{_slug(rng)}", f"/tags/{rng.choice(WORDS)}"]
+    links += [
+        f"/{rng.choice(SECTIONS) if section not in SECTIONS else section}/{rng.choice(TOPICS)}/{_slug(rng)}"
+        for _ in range(links_per_page - len(links))
+    ]
+    return links
+
+
+def _product(rng: random.Random) -> str:
+    return f"{rng.choice(CATEGORIES)}/{rng.choice(BRANDS)}/{_slug(rng)}"
+
+
+def route_of(path: str) -> str:
+    """Kind of page of a path, e.g. "/authors/{name}/publications/{year}" """
+    parts = [part for part in path.split("/") if part]
+    if not parts:
+        return "/"
+    section = parts[0]
+    if section == "shop":
+        return "/shop/{category}/{brand}/{slug}"
+    if section == "legal":
+        return "/legal/{page}"
+    if section in ("authors", "tags"):
+        names = ["{name}", "publications", "{year}"] if section == "authors" else ["{tag}", "page", "{n}"]
+        return "/" + "/".join([section] + names[: len(parts) - 1])
+    if len(parts) == 1:
+        return "/{section}"
+    if parts[1] == "page":
+        return "/{section}/page/{n}"
+    return "/" + "/".join(["{section}", "{topic}", "{slug}", "comments"][: len(parts)])
+
+
+def render_page(path: str, links_per_page: int = 30) -> str:
+    rng = _rng(path)
+    links = "\n".join(
+        f'<li><a href="{link}">{link.strip("/") or "home"}</a></li>'
+        for link in _links_for_path(path, links_per_page)
+    )
+    media = "\n".join(
+        f'<img src="/static/img/{rng.randint(0, 99)}.png" alt="">' for _ in range(5)
+    )
+    paragraphs = "\n".join(
+        "<p>" + " ".join(rng.choices(WORDS, k=60)) + "</p>" for _ in range(5)
+    )
+    return f"""<!DOCTYPE html>
+<html><head><title>Fixture {path}</title>
+<link rel="stylesheet" href="/static/css/site.css">
+<link rel="preload" href="/static/fonts/main.woff2" as="font" crossorigin>
+<script src="/static/js/app.js"></script>
+</head><body>
+<div id="cookie-banner"><button id="onetrust-accept-btn-handler" onclick="this.parentNode.remove()">Accept all</button></div>
+<nav><ul>{links}</ul></nav>
+<main><h1>{path}</h1>{paragraphs}{media}</main>
+</body></html>"""
+
+
+def make_handler(latency: float, links_per_page: int, long_polling: bool = False):
+    class FixtureHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            path = self.path.split("?")[0].split("#")[0]
+            if latency:
+                time.sleep(latency)
+            if path == "/poll":
+                time.sleep(POLL_SECONDS)
+                self.send_response(204)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            if long_polling and path.endswith(".js"):
+                body = LONG_POLLING_SCRIPT
+                content_type = "text/javascript"
+            elif path.startswith("/static/"):
+                size = next(
+                    (s for ext, s in STATIC_ASSET_SIZES.items() if path.endswith(ext)),
+                    1_000,
+                )
+                # Comments keep scripts and stylesheets valid
+                body = b"/*" + b" " * size + b"*/"
+                content_type = "application/octet-stream"
+            elif path.endswith((".xml", ".txt")):
+                self.send_response(404)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            else:
+                body = render_page(path, links_per_page).encode()
+                content_type = "text/html; charset=utf-8"
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return FixtureHandler
+
+
+@contextmanager
+def serve_fixture_site(
+    port: int = 0, latency: float = 0.0, links_per_page: int = 30, long_polling: bool = False
+):
+    """Serve the fixture site in a background thread, yields its base URL"""
+    server = ThreadingHTTPServer(
+        ("127.0.0.1", port), make_handler(latency, links_per_page, long_polling)
+    )
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f"http://localhost:{server.server_address[1]}"
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def fixture_urls(nb_urls: int, links_per_page: int = 30) -> list[str]:
+    """Distinct page paths of the fixture site, in breadth-first order from the home page"""
+    paths, seen, index = ["/"], {"/"}, 0
+    while len(paths) < nb_urls and index < len(paths):
+        for link in _links_for_path(paths[index], links_per_page):
+            if link not in seen:
+                seen.add(link)
+                paths.append(link)
+        index += 1
+    return paths[:nb_urls]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--long-polling", action="store_true")
+    args = parser.parse_args()
+    with serve_fixture_site(args.port, args.latency, long_polling=args.long_polling) as base_url:
+        print(f"Serving fixture site on {base_url}")
+        threading.Event().wait()
@@ -0,0 +1,79 @@
+"""
+Distinct URL templates found per page fetched, with the priority frontier and in discovery order,
+on the local fixture site. Pages are fetched over HTTP (the fixture pages never need a browser).
+
+Besides the number of templates of the crawler, the fixture routes (kinds of pages) covered by the
+visited pages are counted: 11 of them are reachable on the fixture site. The routes measure the
+coverage: the templates also count the links not generalized yet, e.g. one template per
+/{section}/{topic}/{slug}/comments link until enough of them are seen, so visiting the links of
+one route for longer gives more templates. Workers finish in varying order: both are averaged over
+`--runs` crawls.
+
+    python benchmark/frontier_order.py --pages 25 50 75 100 200 --concurrency 8 --runs 3
+"""
+
+import argparse
+import asyncio
+import contextlib
+import io
+from urllib.parse import urlparse
+
+from fixture_site import route_of, serve_fixture_site
+
+from webportal.map_website.crawl import FastJSCrawler
+from webportal.map_website.static_fetch import StaticFetcher
+
+
+async def count_templates(
+    base_url: str, max_pages: int, concurrency: int, use_priority_frontier: bool
+) -> tuple[int, int]:
+    """Number of templates found and of routes visited"""
+    crawler = FastJSCrawler(
+        base_url,
+        max_pages=max_pages,
+        concurrency=concurrency,
+        use_sitemap=False,
+        http_first=True,
+        use_priority_frontier=use_priority_frontier,
+        respect_robots=False,
+    )
+    crawler.static_fetcher = StaticFetcher(concurrency=concurrency)
+    with contextlib.redirect_stdout(io.StringIO()):
+        await crawler.enqueue(crawler.start_url, 0)
+        await crawler.run_workers(context_pool=None)
+    await crawler.static_fetcher.aclose()
+    routes = {route_of(urlparse(url).path) for url in crawler.visited}
+    return len(crawler.pattern_templates), len(routes)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--pages", type=int, nargs="+", default=[25, 50, 75, 100, 200])
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    with serve_fixture_site() as base_url:
+        for max_pages in args.pages:
+            (fifo, fifo_routes), (priority, priority_routes) = [
+                [
+                    sum(counts) / args.runs
+                    for counts in zip(
+                        *[
+                            await count_templates(
+                                base_url, max_pages, args.concurrency, use_priority_frontier
+                            )
+                            for _ in range(args.runs)
+                        ]
+                    )
+                ]
+                for use_priority_frontier in (False, True)
+            ]
+            print(
+                f"{max_pages:>5} pages: FIFO {fifo:.1f} templates ({fifo / max_pages:.2f}/page), {fifo_routes:.1f} routes visited | "
+                f"priority {priority:.1f} templates ({priority / max_pages:.2f}/page), {priority_routes:.1f} routes visited"
+            )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,66 @@
+"""
+Time to extract and process the links of link-heavy pages, with the links filtered in Python or in
+the page (`--filter-links-in-page`), on the catalog pages of the local fixture site.
+
+    python benchmark/link_extraction.py --pages 50 --links-per-page 5000
+"""
+
+import argparse
+import asyncio
+import json
+import time
+
+from fixture_site import serve_fixture_site
+from playwright.async_api import async_playwright
+
+from webportal.map_website.crawl import FastJSCrawler
+
+
+async def extract_links(page, base_url: str, paths: list[str], filter_links_in_page: bool):
+    """Seconds spent in the extraction script and in `process_links`, and size of the links sent"""
+    crawler = FastJSCrawler(
+        base_url,
+        use_sitemap=False,
+        respect_robots=False,
+        filter_links_in_page=filter_links_in_page,
+    )
+    extraction_seconds = processing_seconds = 0.0
+    nb_bytes = 0
+    for path in paths:
+        await page.goto(base_url + path, wait_until="load")
+        started = time.perf_counter()
+        _, links = await crawler._extract_links(page, base_url + path)
+        extracted = time.perf_counter()
+        await crawler.process_links(links, 0, prefiltered=filter_links_in_page)
+        extraction_seconds += extracted - started
+        processing_seconds += time.perf_counter() - extracted
+        nb_bytes += len(json.dumps(links))
+    return extraction_seconds, processing_seconds, nb_bytes
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--pages", type=int, default=50)
+    parser.add_argument("--links-per-page", type=int, default=5000)
+    args = parser.parse_args()
+
+    paths = [f"/shop/laptops/acme/page-{i}" for i in range(args.pages)]
+    with serve_fixture_site(links_per_page=args.links_per_page) as base_url:
+        async with async_playwright() as p:
+            browser = await p.chromium.launch(headless=True)
+            page = await browser.new_page()
+            for filter_links_in_page in (False, True):
+                extraction, processing, nb_bytes = await extract_links(
+                    page, base_url, paths, filter_links_in_page
+                )
+                mode = "in page" if filter_links_in_page else "in Python"
+                print(
+                    f"Filtered {mode}: {1000 * extraction / len(paths):.1f} ms extraction + "
+                    f"{1000 * processing / len(paths):.1f} ms processing per page, "
+                    f"{nb_bytes / len(paths) / 1000:.0f} KB of links per page"
+                )
+            await browser.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
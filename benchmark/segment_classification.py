@@ -0,0 +1,109 @@
+"""
+Microbenchmark of the URL segment classification, against the former per-call `re.match` loop.
+
+    python benchmark/segment_classification.py --urls 200000
+"""
+
+import argparse
+import random
+import re
+import string
+import time
+import uuid
+
+from webportal.map_website.url_patterns import (
+    classify_segment,
+    replace_with_generic_pattern,
+)
+
+
+def legacy_replace_with_generic_pattern(url: str) -> str:
+    """Former FastJSCrawler._replace_with_generic_pattern_if_necessary"""
+    if "://" in url:
+        protocol_part, path_part = url.split("://", 1)
+        protocol_prefix = protocol_part + "://"
+    else:
+        protocol_prefix = ""
+        path_part = url
+
+    segments = path_part.split("/")
+    segment_patterns = [
+        (
+            r"^[a-f0-9]{8}-[a-f0-9]{4}-[a-f0-9]{4}-[a-f0-9]{4}-[a-f0-9]{12}$",
+            "{uuid}",
+        ),
+        (r"^[a-f0-9]{8,}$", "{hash}"),
+        (r"^\d+$", "{id}"),
+        (r"^v?\d+(\.\d+)*$", "{version}"),
+        (r"^(?!.*[a-zA-Z]{3}).*$", "{id}"),
+    ]
+    for i, segment in enumerate(segments):
+        if segment:
+            for pattern_regex, pattern_name in segment_patterns:
+                if re.match(pattern_regex, segment):
+                    segments[i] = pattern_name
+                    break
+    return protocol_prefix + "/".join(segments)
+
+
+def synthetic_urls(nb_urls: int, seed: int = 0) -> list[str]:
+    """Sitemap-like URLs: a few sections, many slugs, ids and hashes"""
+    rng = random.Random(seed)
+
+    def slug() -> str:
+        return "-".join(
+            "".join(rng.choices(string.ascii_lowercase, k=rng.randint(3, 9)))
+            for _ in range(rng.randint(1, 5))
+        )
+
+    sections = [slug() for _ in range(50)]
+    urls = []
+    for _ in range(nb_urls):
+        variable = rng.choice(
+            [
+                str(rng.randint(1, 10**8)),
+                uuid.UUID(int=rng.getrandbits(128)).hex[:12],
+                str(uuid.UUID(int=rng.getrandbits(128))),
+                f"v{rng.randint(1, 9)}.{rng.randint(0, 20)}",
+                slug(),
+            ]
+        )
+        urls.append(
+            f"https://www.example.com/{rng.choice(sections)}/{variable}/{slug()}"
+        )
+    return urls
+
+
+def timed(function, *args) -> tuple[float, object]:
+    start = time.perf_counter()
+    result = function(*args)
+    return time.perf_counter() - start, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--urls", type=int, default=200000)
+    args = parser.parse_args()
+
+    urls = synthetic_urls(args.urls)
+    legacy_time, legacy_output = timed(
+        lambda: [legacy_replace_with_generic_pattern(url) for url in urls]
+    )
+    classify_segment.cache_clear()
+    single_time, single_output = timed(
+        lambda: [replace_with_generic_pattern(url) for url in urls]
+    )
+    assert legacy_output == single_output, "Outputs differ"
+
+    print(f"{args.urls} URLs")
+    for name, elapsed in [
+        ("Legacy re.match loop", legacy_time),
+        ("Compiled + LRU", single_time),
+    ]:
+        print(
+            f"{name:<25} {elapsed:.2f}s ({args.urls / elapsed:,.0f} URLs/s, x{legacy_time / elapsed:.1f})"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""
+Pages queued by the crawler for the routes of the fixture site, with templates generalizing over
+one position only or over several positions (`--min-values-to-generalize`). The links of each page
+are generated without serving the site: only the frontier and the templates are exercised.
+
+    python benchmark/template_inference.py --max-pages 5000
+"""
+
+import argparse
+import asyncio
+import time
+
+from fixture_site import _links_for_path, route_of
+
+from webportal.map_website.crawl import FastJSCrawler
+from webportal.map_website.templates import MIN_VALUES_TO_GENERALIZE
+
+BASE_URL = "https://fixture.example"
+
+
+async def crawl_links(min_values_to_generalize: int | None, max_pages: int):
+    """Pages crawled until the frontier runs dry, routes of these pages, and templates found"""
+    crawler = FastJSCrawler(
+        BASE_URL,
+        max_depth=100,
+        use_sitemap=False,
+        respect_robots=False,
+        min_values_to_generalize=min_values_to_generalize,
+    )
+    crawler.add_url_to_templates(BASE_URL + "/")
+    await crawler.enqueue(BASE_URL + "/", 0)
+    routes = set()
+    nb_pages = 0
+    while not crawler.to_visit.empty() and nb_pages < max_pages:
+        url, depth = crawler.to_visit.get_nowait()
+        path = url.removeprefix(BASE_URL) or "/"
+        nb_pages += 1
+        routes.add(route_of(path))
+        links = [BASE_URL + link for link in _links_for_path(path, 30)]
+        await crawler.process_links(links, depth)
+    return nb_pages, routes, len(crawler.pattern_templates)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--max-pages", type=int, default=5000)
+    args = parser.parse_args()
+
+    all_routes = set()
+    for min_values in (None, MIN_VALUES_TO_GENERALIZE, 2):
+        started = time.perf_counter()
+        nb_pages, routes, nb_templates = await crawl_links(min_values, args.max_pages)
+        elapsed = time.perf_counter() - started
+        all_routes |= routes
+        mode = "one position" if min_values is None else f"{min_values} values"
+        print(
+            f"Generalize on {mode}: {nb_pages} pages crawled, {len(routes)} routes covered, "
+            f"{nb_templates} templates ({elapsed:.2f}s)"
+        )
+    print(f"{len(all_routes)} routes in total")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
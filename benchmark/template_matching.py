@@ -0,0 +1,124 @@
+"""
+Compare the indexed template matcher with the former linear scan over all templates.
+
+    python benchmark/template_matching.py --urls 100000
+"""
+
+import argparse
+import random
+import string
+import time
+
+from webportal.map_website.templates import (
+    FixedTemplateSegment,
+    Template,
+    TemplateIndex,
+    VariableTemplateSegment,
+)
+
+
+def linear_match(templates: list[Template], segments: list[str]) -> int:
+    """Former FastJSCrawler.matches_existing_template: one pass over every template"""
+    for template_index, template in enumerate(templates):
+        template_segments = template.segments
+        if len(segments) != len(template_segments):
+            continue
+        segment_identity = [-1] * len(segments)
+        for segment_index, (segment, template_segment) in enumerate(
+            zip(segments, template_segments)
+        ):
+            if isinstance(template_segment, FixedTemplateSegment):
+                segment_identity[segment_index] = (
+                    1 if segment == template_segment.example else 0
+                )
+            else:
+                segment_identity[segment_index] = 1
+        if sum(segment_identity) == len(segments):
+            for segment, template_segment in zip(segments, template_segments):
+                if isinstance(template_segment, VariableTemplateSegment):
+                    template_segment.add_example(segment)
+            return template_index
+        if sum([el == 0 for el in segment_identity]) == 1 and all(
+            isinstance(template_segment, FixedTemplateSegment)
+            for template_segment in template_segments
+        ):
+            differing_segment_index = segment_identity.index(0)
+            template_segments[differing_segment_index] = VariableTemplateSegment(
+                examples=[
+                    template_segments[differing_segment_index].example,  # type: ignore
+                    segments[differing_segment_index],
+                ]
+            )
+            return template_index
+    return -1
+
+
+def synthetic_urls(nb_urls: int, nb_sections: int, seed: int = 0) -> list[list[str]]:
+    """URL segments looking like a large sitemap: many sections, each with a few page shapes"""
+    rng = random.Random(seed)
+
+    def word() -> str:
+        return "".join(rng.choices(string.ascii_lowercase, k=rng.randint(4, 10)))
+
+    sections = [word() for _ in range(nb_sections)]
+    subsections = {section: [word() for _ in range(5)] for section in sections}
+    urls = []
+    for _ in range(nb_urls):
+        section = rng.choice(sections)
+        shape = rng.randint(0, 3)
+        if shape == 0:
+            segments = ["https:", "example.com", section]
+        elif shape == 1:
+            segments = ["https:", "example.com", section, word()]
+        elif shape == 2:
+            segments = ["https:", "example.com", section, rng.choice(subsections[section])]
+            segments.append(word())
+        else:
+            segments = ["https:", f"{rng.choice(['www', 'blog'])}.example.com", section]
+            segments += [rng.choice(subsections[section]), "{id}", word()]
+        urls.append(segments)
+    return urls
+
+
+def run(urls: list[list[str]], use_index: bool) -> tuple[float, list[int], int]:
+    index = TemplateIndex()
+    templates: list[Template] = []
+    results = []
+    start = time.perf_counter()
+    for segments in urls:
+        if use_index:
+            template_index = index.match(segments)
+        else:
+            template_index = linear_match(templates, segments)
+        if template_index == -1:
+            template = Template(
+                segments=[FixedTemplateSegment(example=s) for s in segments]
+            )
+            if use_index:
+                index.add(template)
+            else:
+                templates.append(template)
+        results.append(template_index)
+    elapsed = time.perf_counter() - start
+    return elapsed, results, len(index) if use_index else len(templates)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--urls", type=int, default=20000)
+    parser.add_argument("--sections", type=int, default=500)
+    args = parser.parse_args()
+
+    urls = synthetic_urls(args.urls, args.sections)
+    linear_time, linear_results, nb_templates = run(urls, use_index=False)
+    index_time, index_results, _ = run(urls, use_index=True)
+    assert linear_results == index_results, "Matchers disagree"
+
+    print(f"{args.urls} URLs, {nb_templates} templates")
+    print(f"Linear scan: {linear_time:.2f}s ({args.urls / linear_time:,.0f} URLs/s)")
+    print(f"Trie index:  {index_time:.2f}s ({args.urls / index_time:,.0f} URLs/s)")
+    print(f"Speedup: x{linear_time / index_time:.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+Memory and time of the stores of visited URLs, for synthetic URLs of ~70 characters.
+
+The false positive rate of the Bloom filters is measured on as many URLs that were never added.
+
+    python benchmark/visited_memory.py --urls 1000000
+"""
+
+import argparse
+import random
+import string
+import time
+import tracemalloc
+
+from webportal.map_website.visited_store import (
+    HashedURLSet,
+    ScalableBloomFilter,
+    TitleStore,
+)
+
+
+def random_urls(nb_urls: int, seed: int) -> list[str]:
+    rng = random.Random(seed)
+    sections = ["news", "products", "blog", "docs", "people", "events", "jobs"]
+    return [
+        f"https://www.example.com/{rng.choice(sections)}/{rng.randrange(10**6)}/"
+        + "".join(rng.choices(string.ascii_lowercase + "-", k=rng.randint(20, 40)))
+        for _ in range(nb_urls)
+    ]
+
+
+def measure(name: str, make_store, urls: list[str], unseen: list[str]):
+    start = time.perf_counter()
+    store = make_store()
+    for url in urls:
+        store.add(url)
+    elapsed = time.perf_counter() - start
+    start = time.perf_counter()
+    assert all(url in store for url in urls[:10_000])
+    lookup = (time.perf_counter() - start) / 10_000
+    false_positives = sum(url in store for url in unseen) / len(unseen)
+    del store
+
+    # Built again with tracing, which slows down allocations
+    tracemalloc.start()
+    store = make_store()
+    for url in urls:
+        # A new string, like the URLs extracted from the pages, freed unless the store keeps it
+        store.add(url.encode().decode())
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    print(
+        f"{name:<26} {size / 1e6:>8.1f} MB  {size / len(urls):>6.1f} B/URL  "
+        f"add {elapsed / len(urls) * 1e6:.2f} µs  lookup {lookup * 1e6:.2f} µs  "
+        f"false positives {false_positives:.1e}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--urls", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    urls = random_urls(args.urls, seed=0)
+    unseen = random_urls(min(args.urls, 100_000), seed=1)
+    print(f"{len(urls)} URLs of {sum(map(len, urls)) / len(urls):.0f} characters on average")
+
+    measure("set", set, urls, unseen)
+    measure("hashed", HashedURLSet, urls, unseen)
+    for error_rate in (1e-3, 1e-4, 1e-5):
+        measure(
+            f"bloom, error rate {error_rate:.0e}",
+            lambda: ScalableBloomFilter(error_rate=error_rate),
+            urls,
+            unseen,
+        )
+
+    for name, store in [("titles (dict)", {}), ("titles (10k)", TitleStore(10_000))]:
+        tracemalloc.start()
+        for i, url in enumerate(urls):
+            store[url.encode().decode()] = f"Article {i} - Example News Site"
+        size = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        print(f"{name:<26} {size / 1e6:>8.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""
+Time spent waiting for rendered pages to settle, and links found, with the `networkidle` wait or the
+DOM quiescence wait (`--wait-strategy`), on the local fixture site whose pages keep a long-polling
+request open and add links once rendered. Timeouts adapt to the settle times of the host.
+
+    python benchmark/wait_strategy.py --pages 30
+"""
+
+import argparse
+import asyncio
+import time
+
+from fixture_site import fixture_urls, serve_fixture_site
+from playwright.async_api import async_playwright
+
+from webportal.map_website.crawl import FastJSCrawler
+from webportal.map_website.page_settling import WAIT_STRATEGIES
+
+
+async def settle_pages(page, base_url: str, paths: list[str], wait_strategy: str):
+    """Seconds spent in the settle wait, links found and pages which did not settle"""
+    crawler = FastJSCrawler(
+        base_url, use_sitemap=False, respect_robots=False, wait_strategy=wait_strategy
+    )
+    started = time.perf_counter()
+    for path in paths:
+        await page.goto(base_url + path, wait_until="domcontentloaded")
+        await crawler.extract_link_patterns(page, base_url + path, 0)
+    elapsed = time.perf_counter() - started
+    settle_seconds = crawler.metrics.stages["settle_wait"].sum
+    return settle_seconds, elapsed, crawler.metrics.total("links"), crawler.nb_unsettled_pages
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--pages", type=int, default=30)
+    args = parser.parse_args()
+
+    paths = fixture_urls(args.pages)
+    with serve_fixture_site(long_polling=True) as base_url:
+        async with async_playwright() as p:
+            browser = await p.chromium.launch(headless=True)
+            page = await browser.new_page()
+            for wait_strategy in WAIT_STRATEGIES:
+                settle_seconds, elapsed, nb_links, nb_unsettled = await settle_pages(
+                    page, base_url, paths, wait_strategy
+                )
+                print(
+                    f"{wait_strategy}: {1000 * settle_seconds / len(paths):.0f} ms waiting per page, "
+                    f"{elapsed:.1f}s in total, {nb_links} links found, {nb_unsettled} pages not settled"
+                )
+            await browser.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -20,26 +20,89 @@ from webportal.get_interactive.convert_to_api_docs import (
 from webportal.get_interactive.ingest_page import INGESTION_PROMPT, ingest_page
 from webportal.get_interactive.network_capture import SeleniumVisionAgent
 from webportal.inference import call_llm
+from webportal.common import DATA_PATH
+from webportal.map_website.checkpoint import CHECKPOINT_FILENAME, CrawlCheckpoint
 from webportal.map_website.crawl import crawl
+from webportal.map_website.page_cache import PAGE_CACHE_FILENAME, PageCache
+from webportal.map_website.templates import templates_from_json, templates_to_json
 from webportal.map_website.get_skeleton import get_clean_urls_list
 from webportal.storage_utils import (
+    download_domain_file_to_path,
+    download_job_file_to_path,
+    read_latest_job_file_from_storage,
+    write_domain_file_from_path_to_storage,
+    write_job_file_from_path_to_storage,
     write_job_file_to_storage,
 )
 import yaml
 
+TEMPLATES_FILENAME = "templates.json"
+CRAWL_METRICS_FILENAME = "crawl_metrics.json"
+CRAWL_METRICS_PROMETHEUS_FILENAME = "crawl_metrics.prom"
+# How the URLs to ingest are picked: by an LLM reading the site tree, from the link graph of the
+# crawl without any LLM call, or by the LLM among the best ranked pages of the link graph
+URL_SELECTORS = ("llm", "graph", "graph+llm")
+# Ranked pages sent to the LLM per URL to select, with the graph+llm selector
+LLM_CANDIDATES_PER_URL = 3
+
 
 def get_main_website_urls(
     main_url: str, max_urls: int, concurrency: int, max_pages: int, max_depth: int, 
-    domain_name: str, job_id: str
+    domain_name: str, job_id: str, url_selector: str = "llm"
 ) -> list[str]:
+    # Checkpoints under the job's storage prefix: a retried job resumes the crawl
+    checkpoint_path = DATA_PATH / domain_name / job_id / CHECKPOINT_FILENAME
+    download_job_file_to_path(domain_name, job_id, CHECKPOINT_FILENAME, checkpoint_path)
+    checkpoint = CrawlCheckpoint(
+        checkpoint_path,
+        on_save=lambda path: write_job_file_from_path_to_storage(
+            domain_name, job_id, CHECKPOINT_FILENAME, path
+        ),
+    )
+
+    # Pages and templates of the previous jobs: unchanged pages are not downloaded nor rendered again
+    page_cache = PageCache.for_domain(domain_name)
+    download_domain_file_to_path(domain_name, PAGE_CACHE_FILENAME, page_cache.path)
+    previous_templates = read_latest_job_file_from_storage(
+        domain_name, TEMPLATES_FILENAME, current_job_id=job_id
+    )
+
     crawler = asyncio.run(
         crawl(
             url=main_url,
             max_pages=max_pages,
             max_depth=max_depth,
             concurrency=concurrency,
+            checkpoint=checkpoint,
+            resume=True,
+            page_cache=page_cache,
+            previous_templates=(
+                templates_from_json(previous_templates) if previous_templates else None
+            ),
         )
     )
+    if page_cache.path.exists():
+        write_domain_file_from_path_to_storage(
+            domain_name, PAGE_CACHE_FILENAME, page_cache.path
+        )
+    write_job_file_to_storage(
+        domain_name=domain_name,
+        job_id=job_id,
+        filename=TEMPLATES_FILENAME,
+        content=templates_to_json(crawler.pattern_templates),
+    )
+    write_job_file_to_storage(
+        domain_name=domain_name,
+        job_id=job_id,
+        filename=CRAWL_METRICS_FILENAME,
+        content=crawler.metrics.to_json(),
+    )
+    write_job_file_to_storage(
+        domain_name=domain_name,
+        job_id=job_id,
+        filename=CRAWL_METRICS_PROMETHEUS_FILENAME,
+        content=crawler.metrics.to_prometheus(labels={"domain": domain_name, "job_id": job_id}),
+    )
     tree_output = crawler.export_structure("tree")
     
     # Save site structure using job-specific storage
@@ -50,7 +113,27 @@ def get_main_website_urls(
         content=tree_output
     )
     
-    urls = list(set(get_clean_urls_list(tree_output)))
+    ranked_urls = []
+    if url_selector != "llm":
+        ranked_urls = crawler.select_urls(
+            max_urls if url_selector == "graph" else LLM_CANDIDATES_PER_URL * max_urls
+        )
+        if not ranked_urls:
+            # e.g. the structure came from the sitemap, without crawling any page
+            print("No link graph to rank pages, selecting URLs from the site tree")
+    if url_selector == "graph" and ranked_urls:
+        urls = ranked_urls
+    elif ranked_urls:
+        urls = list(
+            dict.fromkeys(
+                get_clean_urls_list(
+                    "Most linked pages of the website, one per page template first:\n"
+                    + "\n".join(ranked_urls)
+                )
+            )
+        )
+    else:
+        urls = list(set(get_clean_urls_list(tree_output)))
     
     # Save URLs before trimming using job-specific storage
     urls_yaml = yaml.dump({"urls": urls})
@@ -169,7 +252,10 @@ def ingest_website(
     max_depth: int = 5,
     reload_from_saved: bool = False,
     job_id: str | None = None,
+    url_selector: str = "llm",
 ) -> str:
+    if url_selector not in URL_SELECTORS:
+        raise ValueError(f"Unknown URL selector {url_selector!r}, expected one of {URL_SELECTORS}")
 
     domain_name = get_domain_name(main_url)
     if job_id is None:
@@ -192,6 +278,7 @@ def ingest_website(
             max_depth=max_depth,
             domain_name=domain_name,
             job_id=job_id,
+            url_selector=url_selector,
         )
     
         # Save URLs using job-specific storage
@@ -262,7 +349,8 @@ if __name__ == "__main__":
     import os
     main_url = os.getenv("TARGET_WEBSITE", "clinicaltrials.gov")
     job_id = os.getenv("JOB_ID")
+    url_selector = os.getenv("URL_SELECTOR", "llm")
     print(f"Processing website: {main_url}")
     if job_id:
         print(f"Using job_id from environment: {job_id}")
-    output = ingest_website(main_url=main_url, job_id=job_id)
+    output = ingest_website(main_url=main_url, job_id=job_id, url_selector=url_selector)
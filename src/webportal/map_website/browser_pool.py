@@ -0,0 +1,116 @@
+"""
+Pool of long-lived browser contexts for the crawler.
+
+Each slot of the pool holds a context and its page, reused from one navigation to the next: the
+cookie jar, the HTTP cache and the accepted cookie banners carry over between pages of the site.
+A context is replaced after `max_pages_per_context` pages, or as soon as a navigation fails.
+
+The slots can be spread over several browser processes, so that a single Chromium does not become
+the bottleneck on multi-core hosts: each slot always creates its contexts in the same browser.
+"""
+
+import asyncio
+from collections.abc import AsyncIterator, Awaitable, Callable
+from contextlib import asynccontextmanager
+
+from playwright.async_api import Browser, BrowserContext, Page
+
+CONTEXT_OPTIONS = {
+    "viewport": {"width": 1920, "height": 1080},
+    "user_agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36",
+    "extra_http_headers": {"Cookie": "cc-accept=true"},
+}
+
+
+class PooledContext:
+    def __init__(self, browser: Browser, context: BrowserContext, page: Page):
+        self.browser = browser
+        self.context = context
+        self.page = page
+        self.nb_pages = 0
+
+
+class BrowserContextPool:
+    def __init__(
+        self,
+        browser: Browser | list[Browser],
+        size: int,
+        max_pages_per_context: int = 50,
+        context_options: dict | None = None,
+        setup_page: Callable[[Page], Awaitable[None]] | None = None,
+        get_storage_state: Callable[[], dict | None] | None = None,
+    ):
+        self.browsers = browser if isinstance(browser, list) else [browser]
+        self.max_pages_per_context = max_pages_per_context
+        self.context_options = context_options or CONTEXT_OPTIONS
+        # Called on each new page, e.g. to install request routing
+        self.setup_page = setup_page
+        # Storage state (e.g. consent cookies) given to each new context
+        self.get_storage_state = get_storage_state
+        # Slots are filled lazily: a browser means that a context must be created in it
+        self.slots: asyncio.Queue[PooledContext | Browser] = asyncio.Queue()
+        for index in range(size):
+            self.slots.put_nowait(self.browsers[index % len(self.browsers)])
+        self.contexts_created = 0
+        self.contexts_replaced_after_error = 0
+
+    @asynccontextmanager
+    async def page(self) -> AsyncIterator[Page]:
+        """Lease a page for one navigation. An exception raised in the block discards its context."""
+        slot = await self.slots.get()
+        failed = False
+        try:
+            if not isinstance(slot, PooledContext):
+                slot = await self._new_slot(slot)
+            yield slot.page
+        except BaseException:
+            failed = True
+            raise
+        finally:
+            self.slots.put_nowait(await self._recycle(slot, failed))
+
+    async def _new_slot(self, browser: Browser) -> PooledContext:
+        context_options = dict(self.context_options)
+        storage_state = self.get_storage_state() if self.get_storage_state else None
+        if storage_state:
+            context_options["storage_state"] = storage_state
+        context = await browser.new_context(**context_options)
+        page = await context.new_page()
+        if self.setup_page is not None:
+            await self.setup_page(page)
+        self.contexts_created += 1
+        return PooledContext(browser, context, page)
+
+    async def _recycle(
+        self, slot: PooledContext | Browser, failed: bool
+    ) -> PooledContext | Browser:
+        """Reset the page for the next navigation, or close the context if it must be replaced"""
+        if not isinstance(slot, PooledContext):
+            return slot
+        slot.nb_pages += 1
+        if failed:
+            self.contexts_replaced_after_error += 1
+        if failed or slot.nb_pages >= self.max_pages_per_context or slot.page.is_closed():
+            await self._close_slot(slot)
+            return slot.browser
+        try:
+            # Stop the scripts and pending requests of the previous page
+            await slot.page.goto("about:blank", timeout=5000)
+            return slot
+        except Exception:
+            await self._close_slot(slot)
+            return slot.browser
+
+    @staticmethod
+    async def _close_slot(slot: PooledContext):
+        try:
+            await slot.context.close()
+        except Exception as e:
+            print(f"Could not close browser context: {str(e)[:50]}")
+
+    async def close(self):
+        """Close the contexts currently in the pool"""
+        while not self.slots.empty():
+            slot = self.slots.get_nowait()
+            if isinstance(slot, PooledContext):
+                await self._close_slot(slot)
@@ -0,0 +1,170 @@
+"""
+Crash-safe checkpoints of the crawl state, to resume a preempted crawl.
+
+The frontier, the visited pages with their titles and the templates are kept in a SQLite file.
+Changes are buffered in memory and written in a single transaction at most every `interval`
+seconds (or every `max_pending` changes), so a crash loses at most one interval of work. A page is
+only checkpointed as visited once its links are queued: a page in progress is visited again on resume.
+The transaction runs in a worker thread, the crawl goes on meanwhile.
+"""
+
+import asyncio
+import sqlite3
+import time
+from collections.abc import Callable
+from pathlib import Path
+
+from webportal.map_website.templates import (
+    Template,
+    templates_from_json,
+    templates_to_json,
+)
+
+CHECKPOINT_FILENAME = "crawl_checkpoint.sqlite"
+CHECKPOINT_INTERVAL_SECONDS = 30.0
+CHECKPOINT_MAX_PENDING = 500
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS frontier (url TEXT PRIMARY KEY, depth INTEGER NOT NULL);
+CREATE TABLE IF NOT EXISTS visited (url TEXT PRIMARY KEY, title TEXT);
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+"""
+
+
+class CrawlState:
+    def __init__(
+        self,
+        start_url: str,
+        visited: dict[str, str | None],
+        frontier: list[tuple[str, int]],
+        templates: list[Template],
+    ):
+        self.start_url = start_url
+        # Visited URL -> page title
+        self.visited = visited
+        # Queued URLs not visited yet, with their depth
+        self.frontier = frontier
+        self.templates = templates
+
+
+class CrawlCheckpoint:
+    def __init__(
+        self,
+        path: Path,
+        interval: float = CHECKPOINT_INTERVAL_SECONDS,
+        max_pending: int = CHECKPOINT_MAX_PENDING,
+        on_save: Callable[[Path], object] | None = None,
+    ):
+        self.path = path
+        self.interval = interval
+        self.max_pending = max_pending
+        # Called in a thread after each save, e.g. to upload the file to the job's bucket
+        self.on_save = on_save
+        self.connection: sqlite3.Connection | None = None
+        self.pending_queued: dict[str, int] = {}
+        self.pending_visited: dict[str, str | None] = {}
+        self.last_save = time.monotonic()
+        self.saving = False
+        self.nb_saves = 0
+
+    def _connect(self) -> sqlite3.Connection:
+        if self.connection is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            # Rollback journal rather than WAL: the database file alone is consistent after each
+            # commit, so it can be uploaded as is
+            # Saves write from a worker thread, one at a time
+            self.connection = sqlite3.connect(self.path, check_same_thread=False)
+            self.connection.execute("PRAGMA synchronous = NORMAL")
+            self.connection.executescript(SCHEMA)
+        return self.connection
+
+    def load(self) -> CrawlState | None:
+        """State saved by a previous run, None if there is no checkpoint"""
+        if not self.path.exists():
+            return None
+        connection = self._connect()
+        meta = dict(connection.execute("SELECT key, value FROM meta"))
+        if "start_url" not in meta:
+            return None
+        visited = dict(connection.execute("SELECT url, title FROM visited"))
+        frontier = list(
+            connection.execute(
+                "SELECT url, depth FROM frontier WHERE url NOT IN (SELECT url FROM visited)"
+                " ORDER BY rowid"
+            )
+        )
+        templates = templates_from_json(meta.get("templates", "[]"))
+        return CrawlState(meta["start_url"], visited, frontier, templates)
+
+    def record_queued(self, url: str, depth: int):
+        if url not in self.pending_queued:
+            self.pending_queued[url] = depth
+
+    def record_visited(self, url: str, title: str | None = None):
+        """Mark a page as done, once the links found on it are queued"""
+        self.pending_visited[url] = title
+
+    @property
+    def nb_pending(self) -> int:
+        return len(self.pending_queued) + len(self.pending_visited)
+
+    def is_due(self) -> bool:
+        return self.nb_pending >= self.max_pending or (
+            self.nb_pending > 0 and time.monotonic() - self.last_save >= self.interval
+        )
+
+    async def maybe_save(self, start_url: str, templates: list[Template]) -> bool:
+        """Save if the checkpoint interval elapsed, returns whether a save happened"""
+        if self.saving or not self.is_due():
+            return False
+        await self.save(start_url, templates)
+        return True
+
+    async def save(self, start_url: str, templates: list[Template]):
+        """Write the pending changes and a snapshot of the templates in one transaction"""
+        self.saving = True
+        try:
+            queued, self.pending_queued = self.pending_queued, {}
+            visited, self.pending_visited = self.pending_visited, {}
+            # Serialized in the event loop: the templates change while the crawl goes on
+            templates_json = templates_to_json(templates)
+            await asyncio.to_thread(self._write, start_url, queued, visited, templates_json)
+            self.last_save = time.monotonic()
+            self.nb_saves += 1
+            if self.on_save is not None:
+                try:
+                    await asyncio.to_thread(self.on_save, self.path)
+                except Exception as e:
+                    print(f"Could not upload crawl checkpoint: {str(e)[:50]}")
+        finally:
+            self.saving = False
+
+    def _write(
+        self,
+        start_url: str,
+        queued: dict[str, int],
+        visited: dict[str, str | None],
+        templates_json: str,
+    ):
+        connection = self._connect()
+        with connection:
+            connection.executemany(
+                "INSERT OR IGNORE INTO frontier (url, depth) VALUES (?, ?)",
+                queued.items(),
+            )
+            connection.executemany(
+                "INSERT OR REPLACE INTO visited (url, title) VALUES (?, ?)",
+                visited.items(),
+            )
+            connection.executemany(
+                "DELETE FROM frontier WHERE url = ?", ((url,) for url in visited)
+            )
+            connection.executemany(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)",
+                [("start_url", start_url), ("templates", templates_json)],
+            )
+
+    def close(self):
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
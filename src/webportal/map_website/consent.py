@@ -0,0 +1,241 @@
+"""
+Cookie banner dismissal and consent-state caching for the crawler.
+
+The banner is looked for by a single in-page script, instead of one browser round-trip per selector,
+and its accept button is clicked once the storage state of the context was taken. Once a banner was
+accepted on a host, the cookies and localStorage keys set by the click (the consent) are saved as
+Playwright storage state (in memory and on disk), and given to the other contexts so the banner never
+shows again. Cookies that were there before the click, such as session cookies, are never saved.
+"""
+
+import json
+import weakref
+from collections import Counter
+from pathlib import Path
+from urllib.parse import urlparse
+
+from playwright.async_api import BrowserContext
+
+from webportal.common import DATA_PATH
+
+CONSENT_STATE_PATH = DATA_PATH / "consent_state"
+
+# How long to wait for a banner to show up on a host where none was accepted yet
+COOKIE_BANNER_WAIT_MS = 1000
+# After this many pages without a banner, a host is considered banner-less: no more waiting
+BANNER_LESS_AFTER_PAGES = 3
+
+# (provider, CSS selector of the accept button), most specific first
+COOKIE_CONSENT_SELECTORS = [
+    ["onetrust", "#onetrust-accept-btn-handler"],
+    ["nature", ".cc-banner__button-accept"],
+    ["hubspot", "#hs-eu-confirmation-button"],
+    ["osano", ".osano-cm-accept-all"],
+    ["cookiebot", "#CybotCookiebotDialogBodyLevelButtonLevelOptinAllowAll"],
+    ["didomi", "#didomi-notice-agree-button"],
+    ["quantcast", ".qc-cmp2-summary-buttons button[mode='primary']"],
+    ["generic", ".cookie-consent-accept"],
+    ["generic", ".gdpr-accept"],
+    ["generic", '[data-cc-action="accept"]'],
+    ["generic", '[data-action="accept"]'],
+    ["generic", 'button[id*="accept"]'],
+    ["generic", 'button[class*="accept"]'],
+    ["generic", '[aria-label*="Accept"]'],
+    ["generic", '[title*="Accept"]'],
+]
+# Regex (case-insensitive) on the text of buttons and links
+COOKIE_CONSENT_TEXT_PATTERN = r"^(accept( all( cookies)?)?|allow all( cookies)?|i agree|agree|ok|got it)\b"
+
+DISMISS_COOKIE_BANNER_SCRIPT = """
+async ([selectors, textPattern, waitMs]) => {
+    const textRegex = new RegExp(textPattern, 'i');
+    const isVisible = (el) => {
+        const rect = el.getBoundingClientRect();
+        if (rect.width === 0 || rect.height === 0) return false;
+        const style = window.getComputedStyle(el);
+        return style.visibility !== 'hidden' && style.display !== 'none' && style.opacity !== '0';
+    };
+    const find = () => {
+        for (const [provider, selector] of selectors) {
+            for (const el of document.querySelectorAll(selector)) {
+                if (isVisible(el)) return {provider, selector, el};
+            }
+        }
+        for (const el of document.querySelectorAll('button, a, [role="button"]')) {
+            const text = (el.innerText || '').trim();
+            if (text.length < 40 && textRegex.test(text) && isVisible(el)) {
+                return {provider: 'text', selector: text, el};
+            }
+        }
+        return null;
+    };
+    let found = find();
+    if (!found && waitMs > 0) {
+        // Wait for a banner injected after load, checking at most every 100ms
+        found = await new Promise((resolve) => {
+            let scheduled = false;
+            const observer = new MutationObserver(() => {
+                if (scheduled) return;
+                scheduled = true;
+                setTimeout(() => {
+                    scheduled = false;
+                    const match = find();
+                    if (match) { observer.disconnect(); clearTimeout(timer); resolve(match); }
+                }, 100);
+            });
+            observer.observe(document.documentElement, {childList: true, subtree: true, attributes: true});
+            const timer = setTimeout(() => { observer.disconnect(); resolve(find()); }, waitMs);
+        });
+    }
+    if (!found) return null;
+    // Clicked by CLICK_COOKIE_BANNER_SCRIPT, once the storage state before the click was taken
+    found.el.setAttribute('data-webportal-consent-accept', '');
+    return {provider: found.provider, selector: found.selector};
+}
+"""
+
+CLICK_COOKIE_BANNER_SCRIPT = """
+() => {
+    const el = document.querySelector('[data-webportal-consent-accept]');
+    if (!el) return false;
+    el.removeAttribute('data-webportal-consent-accept');
+    el.click();
+    return true;
+}
+"""
+
+
+def _matches_host(domain: str, host: str) -> bool:
+    domain = domain.lstrip(".")
+    return host == domain or host.endswith("." + domain)
+
+
+def _added_storage(before: dict, after: dict, host: str) -> dict:
+    """Cookies and localStorage keys of a host that were added or changed between two storage states"""
+    cookies_before = {
+        (cookie["name"], cookie["domain"], cookie["path"]): cookie["value"]
+        for cookie in before["cookies"]
+    }
+    cookies = [
+        cookie
+        for cookie in after["cookies"]
+        if _matches_host(cookie["domain"], host)
+        and cookies_before.get((cookie["name"], cookie["domain"], cookie["path"]))
+        != cookie["value"]
+    ]
+    storage_before = {
+        (origin["origin"], item["name"]): item["value"]
+        for origin in before["origins"]
+        for item in origin["localStorage"]
+    }
+    origins = []
+    for origin in after["origins"]:
+        if urlparse(origin["origin"]).netloc != host:
+            continue
+        items = [
+            item
+            for item in origin["localStorage"]
+            if storage_before.get((origin["origin"], item["name"])) != item["value"]
+        ]
+        if items:
+            origins.append({"origin": origin["origin"], "localStorage": items})
+    return {"cookies": cookies, "origins": origins}
+
+
+class ConsentStore:
+    """Consent storage state per host, shared by all the contexts of a crawl"""
+
+    def __init__(self, cache_dir: Path | None = CONSENT_STATE_PATH):
+        self.cache_dir = cache_dir
+        self.states: dict[str, dict] = {}
+        self.pages_without_banner: Counter[str] = Counter()
+        self.provider_by_host: dict[str, str] = {}
+        self.hosts_without_saved_state: set[str] = set()
+        # Hosts whose cookies were already added to each live context
+        self.applied_hosts: weakref.WeakKeyDictionary[BrowserContext, set[str]] = (
+            weakref.WeakKeyDictionary()
+        )
+        # Storage state of each context right before it clicks an accept button
+        self.states_before_click: weakref.WeakKeyDictionary[BrowserContext, dict] = (
+            weakref.WeakKeyDictionary()
+        )
+
+    def _state_path(self, host: str) -> Path | None:
+        if self.cache_dir is None:
+            return None
+        return self.cache_dir / f"{host.replace(':', '_')}.json"
+
+    def load(self, host: str) -> bool:
+        """Load the consent state saved for a host by a previous run, if any"""
+        if host in self.states:
+            return True
+        if host in self.hosts_without_saved_state:
+            return False
+        path = self._state_path(host)
+        if path is None or not path.exists():
+            self.hosts_without_saved_state.add(host)
+            return False
+        try:
+            self.states[host] = json.loads(path.read_text())
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"Could not read consent state for {host}: {str(e)[:50]}")
+            return False
+        return True
+
+    def has_consent(self, host: str) -> bool:
+        return self.load(host)
+
+    def is_banner_less(self, host: str) -> bool:
+        return self.pages_without_banner[host] >= BANNER_LESS_AFTER_PAGES
+
+    def record_no_banner(self, host: str):
+        self.pages_without_banner[host] += 1
+
+    def storage_state(self) -> dict | None:
+        """Storage state for a new context, merging the consent of all hosts"""
+        if not self.states:
+            return None
+        return {
+            "cookies": [
+                cookie for state in self.states.values() for cookie in state["cookies"]
+            ],
+            "origins": [
+                origin for state in self.states.values() for origin in state["origins"]
+            ],
+        }
+
+    async def apply(self, context: BrowserContext):
+        """Add the consent cookies obtained since this context was created"""
+        applied = self.applied_hosts.setdefault(context, set())
+        for host, state in self.states.items():
+            if host not in applied:
+                applied.add(host)
+                if state["cookies"]:
+                    await context.add_cookies(state["cookies"])
+
+    async def snapshot(self, context: BrowserContext):
+        """Take the storage state of a context about to click an accept button"""
+        try:
+            self.states_before_click[context] = await context.storage_state()
+        except Exception as e:
+            print(f"Could not read storage state before consent: {str(e)[:50]}")
+
+    async def save(self, context: BrowserContext, host: str, provider: str):
+        """Save the consent obtained on a host: what the click of the context added to its storage state"""
+        before = self.states_before_click.pop(context, None)
+        if before is None:
+            # Without the state before the click, the consent can't be told from the other cookies
+            return
+        try:
+            after = await context.storage_state()
+        except Exception as e:
+            print(f"Could not save consent state for {host}: {str(e)[:50]}")
+            return
+        state = _added_storage(before, after, host)
+        self.states[host] = state
+        self.provider_by_host[host] = provider
+        self.applied_hosts.setdefault(context, set()).add(host)
+        path = self._state_path(host)
+        if path is not None:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_text(json.dumps(state))
@@ -6,29 +6,85 @@ Extracts ~90% of a website's structure quickly with concurrent browser contexts
 
 import argparse
 import asyncio
-import re
 import time
-from collections import defaultdict
+from collections import Counter, defaultdict, deque
+from contextlib import aclosing
+from pathlib import Path
 from urllib.parse import urlparse
 
 from playwright.async_api import Page, async_playwright
-from pydantic import BaseModel
 
-
-class TemplateSegment(BaseModel):
-    pass
-
-
-class VariableTemplateSegment(TemplateSegment):
-    examples: list[str] = []
-
-
-class FixedTemplateSegment(TemplateSegment):
-    example: str
-
-
-class Template(BaseModel):
-    segments: list[TemplateSegment]
+from webportal.map_website.browser_pool import BrowserContextPool
+from webportal.map_website.checkpoint import CrawlCheckpoint
+from webportal.map_website.consent import (
+    CLICK_COOKIE_BANNER_SCRIPT,
+    COOKIE_BANNER_WAIT_MS,
+    COOKIE_CONSENT_SELECTORS,
+    COOKIE_CONSENT_TEXT_PATTERN,
+    DISMISS_COOKIE_BANNER_SCRIPT,
+    ConsentStore,
+)
+from webportal.map_website.crawl_metrics import CrawlMetrics
+from webportal.map_website.crawl_traps import TrapDetector
+from webportal.map_website.frontier import PriorityFrontier
+from webportal.map_website.host_scheduler import THROTTLE_STATUS_CODES, HostScheduler
+from webportal.map_website.link_extraction import (
+    EXTRACT_CANDIDATE_LINKS_SCRIPT,
+    EXTRACT_LINKS_SCRIPT,
+    STATIC_EXTENSIONS,
+    STATIC_PATHS,
+    is_static_asset,
+)
+from webportal.map_website.link_graph import LinkGraph, select_representative_urls
+from webportal.map_website.near_duplicates import (
+    DEFAULT_MAX_DISTANCE,
+    IGNORED_TAGS,
+    MAX_TEXT_LENGTH,
+    PAGE_CONTENT_SCRIPT,
+    NearDuplicateIndex,
+    page_fingerprint,
+)
+from webportal.map_website.page_cache import PageCache, validators_from_headers
+from webportal.map_website.page_settling import (
+    DEFAULT_WAIT_STRATEGY,
+    NAVIGATION_TIMEOUT_SECONDS,
+    SETTLE_TIMEOUT_SECONDS,
+    WAIT_STRATEGIES,
+    wait_for_page_to_settle,
+)
+from webportal.map_website.resource_blocking import ResourceBlocker
+from webportal.map_website.resource_cache import DEFAULT_MAX_BYTES, ResourceCache
+from webportal.map_website.robots import RobotsCache, RobotsRules
+from webportal.map_website.sitemap import SitemapLoader
+from webportal.map_website.static_fetch import (
+    StaticFetcher,
+    StaticPage,
+    escalation_reason,
+)
+from webportal.map_website.templates import (
+    MIN_VALUES_TO_GENERALIZE,
+    FixedTemplateSegment,
+    Template,
+    TemplateIndex,
+    TemplateSegment,
+    VariableTemplateSegment,
+)
+from webportal.map_website.url_patterns import replace_with_generic_pattern
+from webportal.map_website.visited_store import (
+    DEFAULT_BLOOM_ERROR_RATE,
+    VISITED_STORES,
+    HashedURLSet,
+    ScalableBloomFilter,
+    TitleStore,
+    make_visited_store,
+)
+
+# Times a page answered with 429/503 is queued again
+MAX_THROTTLED_RETRIES = 2
+# Pages over which the rate of new templates is measured, to stop once discovery saturates
+SATURATION_WINDOW = 50
+# Time given to the pages in flight to finish when the crawl stops early, before they are cancelled
+STOP_GRACE_PERIOD_SECONDS = 10.0
 
 
 class FastJSCrawler:
@@ -39,6 +95,32 @@ class FastJSCrawler:
         max_depth=5,
         concurrency=10,
         use_sitemap: bool = True,
+        use_context_pool: bool = True,
+        max_pages_per_context: int = 50,
+        fast_mode: bool = False,
+        blocked_resource_types: set[str] | None = None,
+        blocked_hosts: set[str] | None = None,
+        http_first: bool = False,
+        checkpoint: CrawlCheckpoint | None = None,
+        resume: bool = False,
+        use_priority_frontier: bool = True,
+        respect_robots: bool = True,
+        page_cache: PageCache | None = None,
+        previous_templates: list[Template] | None = None,
+        visited_store: str = "set",
+        bloom_error_rate: float = DEFAULT_BLOOM_ERROR_RATE,
+        max_titles: int | None = None,
+        record_link_graph: bool = True,
+        min_new_templates_per_page: float | None = None,
+        saturation_window: int = SATURATION_WINDOW,
+        stop_grace_period: float = STOP_GRACE_PERIOD_SECONDS,
+        browser_processes: int = 1,
+        filter_links_in_page: bool = False,
+        min_values_to_generalize: int | None = MIN_VALUES_TO_GENERALIZE,
+        near_duplicate_distance: int | None = None,
+        detect_crawl_traps: bool = True,
+        wait_strategy: str = DEFAULT_WAIT_STRATEGY,
+        resource_cache: ResourceCache | None = None,
     ):
         self.start_url = start_url
         if not self.start_url.startswith(("http://", "https://")):
@@ -48,68 +130,142 @@ class FastJSCrawler:
         self.max_depth = max_depth
         self.concurrency = concurrency
         self.use_sitemap = use_sitemap
+        self.use_context_pool = use_context_pool
+        self.max_pages_per_context = max_pages_per_context
+        # The contexts are spread over this many Chromium processes, sharing the frontier and templates
+        self.browser_processes = max(1, min(browser_processes, concurrency))
+        # In fast mode, images, media, fonts and analytics/ads requests are aborted
+        self.resource_blocker = (
+            ResourceBlocker(blocked_resource_types, blocked_hosts) if fast_mode else None
+        )
 
-        self.visited: set[str] = set()
-        self.to_visit: asyncio.Queue[tuple[str, int]] = asyncio.Queue()
-        self.site_structure = defaultdict(set)
-        self.page_titles = {}
+        # Compact stores only answer membership tests, for crawls of millions of pages
+        self.visited: set[str] | HashedURLSet | ScalableBloomFilter = (
+            make_visited_store(visited_store, bloom_error_rate)
+        )
+        # Most novel URLs first, or discovery order
+        self.to_visit: asyncio.Queue[tuple[str, int]] = (
+            PriorityFrontier(self._page_template) if use_priority_frontier else asyncio.Queue()
+        )
+        self.page_titles = {} if max_titles is None else TitleStore(max_titles)
         self.generic_url_patterns = set()  # Store discovered URL patterns
-        self.pattern_templates: list[
-            Template
-        ] = []  # Store structural templates with examples: {template: {position: [examples]}}
+        # Templates generalize over several positions once enough values were seen, None to disable
+        self.min_values_to_generalize = min_values_to_generalize
+        self.template_index = TemplateIndex(  # Store structural templates with examples
+            min_values_to_generalize=min_values_to_generalize
+        )
         self.path_structures = defaultdict(
             set
         )  # Track path lengths for each position's segments
         self.semaphore = asyncio.Semaphore(concurrency)
+        self.context_pool: BrowserContextPool | None = None
+        self.consent_store = ConsentStore()
+        # HTTP-first fetching, escalating to the browser for JS-rendered pages
+        self.http_first = http_first
+        self.static_fetcher: StaticFetcher | None = None
+        self.fetch_stats: Counter[str] = Counter()
+        # Time per stage, errors and links per page, queue depth over time
+        self.metrics = CrawlMetrics()
+        # Domain scoping, static asset filtering and deduplication of the links by the page itself
+        self.filter_links_in_page = filter_links_in_page
+        # Pages by text and structure SimHash: the links of near-duplicates are not expanded
+        self.near_duplicates = (
+            NearDuplicateIndex(near_duplicate_distance)
+            if near_duplicate_distance is not None
+            else None
+        )
+        # Calendars, facets and cycles in paths: quarantined branches are not queued anymore
+        self.trap_detector = TrapDetector() if detect_crawl_traps else None
+        # Links between pages, to rank the pages without an LLM
+        self.link_graph = LinkGraph() if record_link_graph else None
+        # By template: indices shift when generalized templates absorb others
+        self.browser_link_counts: dict[Template, tuple[int, int]] = {}
+        # Per-host adaptive concurrency, under the global limit of the semaphore
+        self.host_scheduler = HostScheduler(max_host_limit=concurrency)
+        self.throttled_retries: Counter[str] = Counter()
+        # Disallowed links never enter the frontier, Crawl-delay values go to the host scheduler
+        self.robots = (
+            RobotsCache(on_load=self._apply_robots_rules) if respect_robots else None
+        )
+        self.nb_disallowed_by_robots = 0
+        # How rendered pages are waited for before extracting links, with per-host timeouts
+        if wait_strategy not in WAIT_STRATEGIES:
+            raise ValueError(
+                f"Unknown wait strategy {wait_strategy}, expected one of {WAIT_STRATEGIES}"
+            )
+        self.wait_strategy = wait_strategy
+        self.nb_unsettled_pages = 0
+        # Links of the pages seen by previous jobs, revalidated with conditional requests
+        self.page_cache = page_cache
+        # Static resources shared by all the contexts of the crawl and by later runs
+        self.resource_cache = resource_cache
+        # Templates of the previous job, whose example URLs seed the frontier
+        self.previous_templates = previous_templates or []
+        # Early termination: page budget spent, or fewer new templates per page than the threshold
+        # over the last `saturation_window` pages
+        self.min_new_templates_per_page = min_new_templates_per_page
+        self.saturation_window = saturation_window
+        self.template_counts: deque[int] = deque(maxlen=saturation_window + 1)
+        self.stop_grace_period = stop_grace_period
+        self.stop_event = asyncio.Event()
+        self.stop_reason: str | None = None
+        # The budget counts the pages crawled; workers reserve a page of it before taking a URL, so
+        # that no more pages are started than the budget, and the pages started are all finished
+        self.nb_pages_done = 0
+        self.nb_pages_reserved = 0
+        self.budget_released = asyncio.Event()
+        self.nb_in_flight = 0
+        self.in_flight_done = asyncio.Event()
+        # Periodic saves of the frontier, visited pages and templates, to resume after a preemption
+        self.checkpoint = checkpoint
+        self.resume = resume
+        self.sitemap_loader = SitemapLoader(concurrency=concurrency)
+        self.start_path_depth = len(
+            [p for p in urlparse(self.start_url).path.split("/") if p]
+        )
 
-    def load_sitemap(self) -> list[str]:
-        """Load URLs from sitemap.xml if available"""
-        print(self.start_url)
+    def _apply_robots_rules(self, host: str, rules: RobotsRules):
+        if rules.crawl_delay:
+            print(f"Crawl-delay of {rules.crawl_delay}s for {host}")
+            self.host_scheduler.set_crawl_delay(host, rules.crawl_delay)
 
-        parsed_start = urlparse(self.start_url)
-        sitemap_url = f"{parsed_start.scheme}://{parsed_start.netloc}/sitemap.xml"
+    @property
+    def pattern_templates(self) -> list[Template]:
+        """Discovered templates, in discovery order. Add new ones through `template_index`."""
+        return self.template_index.templates
 
-        import requests
-        from lxml import etree
+    @pattern_templates.setter
+    def pattern_templates(self, templates: list[Template]):
+        self.template_index = TemplateIndex(templates, self.min_values_to_generalize)
 
-        print(f"Attempting to load sitemap from: {sitemap_url}")
+    async def load_sitemap(self) -> int:
+        """Stream URLs from sitemap.xml (and the sitemaps it references) into the templates.
 
-        r = requests.get(sitemap_url)
-        if r.status_code != 200:
-            print(
-                f"Could not load sitemap.xml from {sitemap_url}: HTTP {r.status_code}"
-            )
-            return []
-
-        # Check if response content looks like XML
+        Returns the number of sitemap URLs used, 0 if no sitemap could be loaded.
+        """
+        parsed_start = urlparse(self.start_url)
+        sitemap_urls = [f"{parsed_start.scheme}://{parsed_start.netloc}/sitemap.xml"]
+        if self.robots is not None:
+            # Sitemap: directives of robots.txt
+            robots_rules = await self.robots.get(self.start_url)
+            sitemap_urls += [
+                url for url in robots_rules.sitemaps if url not in sitemap_urls
+            ]
+        print(f"Attempting to load sitemap from: {', '.join(sitemap_urls)}")
 
-        content_type = r.headers.get("content-type", "").lower()
-        if not content_type.startswith(
-            "application/xml"
-        ) and not content_type.startswith("text/xml"):
-            print(
-                f"Response from {sitemap_url} doesn't appear to be XML (content-type: {content_type})"
-            )
-            return []
+        nb_urls = 0
+        async with aclosing(self.sitemap_loader.iter_page_urls(sitemap_urls)) as urls:
+            async for url in urls:
+                if not self.is_in_sitemap_scope(url):
+                    continue
+                self.add_url_to_templates(url)
+                self.visited.add(url)
+                nb_urls += 1
+                if nb_urls >= self.max_pages:
+                    break
 
-        root = etree.fromstring(r.content)
-        urls = []
-
-        # Handle sitemap index files
-        for elem in root:
-            if elem.tag.endswith("sitemap"):
-                # This is a sitemap index, get the location
-                for child in elem:
-                    if child.tag.endswith("loc"):
-                        urls.append(child.text)
-            elif elem.tag.endswith("url"):
-                # This is a URL entry
-                for child in elem:
-                    if child.tag.endswith("loc"):
-                        urls.append(child.text)
-
-        print(f"Found {len(urls)} URLs in sitemap")
-        return urls
+        print(f"Used {nb_urls} URLs from sitemap")
+        return nb_urls
 
     def filter_sitemap_urls(self, urls: list[str]) -> list[str]:
         """Filter sitemap URLs based on max_pages, max_depth, and domain"""
@@ -119,80 +275,31 @@ class FastJSCrawler:
             # Skip if we've hit max pages
             if len(filtered_urls) >= self.max_pages:
                 break
+            if self.is_in_sitemap_scope(url):
+                filtered_urls.append(url)
 
-            # Skip static assets
-            if self.is_static_asset(url):
-                continue
-
-            # Check domain
-            parsed = urlparse(url)
-            if not self.is_same_domain_or_subdomain(parsed.netloc):
-                continue
+        return filtered_urls
 
-            # Check depth
-            path_depth = len([p for p in parsed.path.split("/") if p])
-            start_path_depth = len(
-                [p for p in urlparse(self.start_url).path.split("/") if p]
-            )
-            relative_depth = path_depth - start_path_depth
+    def is_in_sitemap_scope(self, url: str) -> bool:
+        """Check if a sitemap URL should be used: not a static asset, on the domain and within max_depth"""
+        # Skip static assets
+        if self.is_static_asset(url):
+            return False
 
-            if relative_depth > self.max_depth:
-                continue
+        # Check domain
+        parsed = urlparse(url)
+        if not self.is_same_domain_or_subdomain(parsed.netloc):
+            return False
 
-            filtered_urls.append(url)
+        # Check depth
+        path_depth = len([p for p in parsed.path.split("/") if p])
+        relative_depth = path_depth - self.start_path_depth
 
-        return filtered_urls
+        return relative_depth <= self.max_depth
 
     def is_static_asset(self, url: str) -> bool:
         """Check if URL points to a static asset that shouldn't be crawled"""
-        static_extensions = {
-            ".css",
-            ".js",
-            ".png",
-            ".jpg",
-            ".jpeg",
-            ".gif",
-            ".svg",
-            ".ico",
-            ".pdf",
-            ".zip",
-            ".tar",
-            ".gz",
-            ".mp4",
-            ".mp3",
-            ".webm",
-            ".woff",
-            ".woff2",
-            ".ttf",
-            ".eot",
-            ".xml",
-            ".json",
-            ".txt",
-            ".webmanifest",
-        }
-
-        parsed = urlparse(url)
-        path = parsed.path.lower()
-
-        # Check file extension
-        for ext in static_extensions:
-            if path.endswith(ext):
-                return True
-
-        # Check for common static asset paths
-        static_paths = [
-            "/static/",
-            "/assets/",
-            "/css/",
-            "/js/",
-            "/images/",
-            "/img/",
-            "/fonts/",
-        ]
-        if any(static_path in path for static_path in static_paths):
-            return True
-
-        return False
+        return is_static_asset(url)
 
     def is_same_domain_or_subdomain(self, url_domain: str) -> bool:
         """Check if a domain is the same or a subdomain of the original domain"""
@@ -211,193 +318,84 @@ class FastJSCrawler:
 
         return False
 
-    async def handle_cookie_banners(self, page: Page):
-        """Handle common cookie banners and consent dialogs"""
-        try:
-            # Wait a moment for banners to load
-            await asyncio.sleep(1)
-
-            # Common cookie banner selectors and their accept buttons
-            cookie_selectors = [
-                # Generic patterns
-                '[data-cc-action="accept"]',
-                '[data-action="accept"]',
-                'button[id*="accept"]',
-                'button[class*="accept"]',
-                'button:has-text("Accept")',
-                'button:has-text("Accept all")',
-                'button:has-text("Allow all")',
-                'button:has-text("I agree")',
-                'button:has-text("OK")',
-                # Specific to nature.com and common providers
-                ".cc-banner__button-accept",
-                "#onetrust-accept-btn-handler",
-                "#hs-eu-confirmation-button",
-                ".osano-cm-accept-all",
-                ".cookie-consent-accept",
-                ".gdpr-accept",
-                # Other common patterns
-                '.btn:has-text("Accept")',
-                '.button:has-text("Accept")',
-                'a:has-text("Accept")',
-                '[aria-label*="Accept"]',
-                '[title*="Accept"]',
-            ]
-
-            # Try each selector
-            for selector in cookie_selectors:
-                try:
-                    # Check if element exists and is visible
-                    element = await page.query_selector(selector)
-                    if element:
-                        is_visible = await element.is_visible()
-                        if is_visible:
-                            await element.click()
-                            # Wait for the banner to disappear
-                            await asyncio.sleep(0.5)
-                            print(
-                                f"Clicked cookie accept button with selector: {selector}"
-                            )
-                            return
-                except Exception:
-                    # Continue to next selector if this one fails
-                    continue
+    async def handle_cookie_banners(self, page: Page) -> str | None:
+        """Handle common cookie banners and consent dialogs, looked for in a single in-page pass.
 
+        Returns the consent provider whose accept button was clicked, None if there was none.
+        """
+        host = urlparse(page.url).netloc
+        if self.consent_store.has_consent(host):
+            # The consent cookies were given to this context: no banner to expect
+            return None
+        try:
+            wait_ms = (
+                0 if self.consent_store.is_banner_less(host) else COOKIE_BANNER_WAIT_MS
+            )
+            with self.metrics.time("cookie_handling"):
+                match = await page.evaluate(
+                    DISMISS_COOKIE_BANNER_SCRIPT,
+                    [COOKIE_CONSENT_SELECTORS, COOKIE_CONSENT_TEXT_PATTERN, wait_ms],
+                )
+                if match is not None:
+                    # Taken before the click, so that only the consent set by the click is saved
+                    await self.consent_store.snapshot(page.context)
+                    await page.evaluate(CLICK_COOKIE_BANNER_SCRIPT)
         except Exception as e:
             # Don't let cookie handling break the crawler
             print(f"Cookie banner handling failed: {str(e)[:50]}")
+            return None
+
+        if match is None:
+            self.consent_store.record_no_banner(host)
+            return None
+        print(
+            f"Clicked {match['provider']} cookie accept button with selector: {match['selector']}"
+        )
+        return match["provider"]
 
     def _replace_with_generic_pattern_if_necessary(self, url: str) -> str:
         """Apply generic pattern detection to individual URL segments"""
-        # Handle the protocol part separately to preserve double slashes
-        if "://" in url:
-            protocol_part, path_part = url.split("://", 1)
-            protocol_prefix = protocol_part + "://"
-        else:
-            protocol_prefix = ""
-            path_part = url
-
-        segments = path_part.split("/")
-
-        # Pattern definitions for individual segments (without slashes)
-        segment_patterns = [
-            # UUIDs
-            (
-                r"^[a-f0-9]{8}-[a-f0-9]{4}-[a-f0-9]{4}-[a-f0-9]{4}-[a-f0-9]{12}$",
-                "{uuid}",
-            ),
-            # Alphanumeric hashes (like commit hashes, session IDs) - must contain at least one letter and be 8+ chars
-            (r"^[a-f0-9]{8,}$", "{hash}"),
-            # Numeric IDs
-            (r"^\d+$", "{id}"),
-            # Version numbers (like v1.2.3, 2024.1.1)
-            (r"^v?\d+(\.\d+)*$", "{version}"),
-            # Version numbers
-            (r"^(?!.*[a-zA-Z]{3}).*$", "{id}"),
-        ]
+        return replace_with_generic_pattern(url)
 
-        # Apply pattern matching to each segment
-        for i, segment in enumerate(segments):
-            if segment:  # Skip empty segments
-                for pattern_regex, pattern_name in segment_patterns:
-                    if re.match(pattern_regex, segment):
-                        segments[i] = pattern_name
-                        break
+    def log_new_fixed_template(self, url: str, example: str | None = None):
+        """Log a new fixed template, applying generic pattern detection to segments.
 
-        return protocol_prefix + "/".join(segments)
-
-    def log_new_fixed_template(self, url: str):
-        """Log a new fixed template, applying generic pattern detection to segments"""
+        `example` is the URL of a real page of the template, as `url` may have placeholders.
+        """
         segments = [seg for seg in url.split("/") if seg]
         template_segments: list[TemplateSegment] = []
 
         for segment in segments:
             template_segments.append(FixedTemplateSegment(example=segment))
 
-        self.pattern_templates.append(Template(segments=template_segments))
+        self.template_index.add(Template(segments=template_segments, example=example))
 
     def matches_existing_template(self, url: str) -> int:
         """Check if a specific URL path matches any of our discovered templates. Criterion for belonging to a template:
         - have the same number as segments
-        - segments should match except for variable positions. There will be at max one variable position (assumption)
+        - segments should match except for variable positions
+        - or the template has only fixed segments and differs at one position: then this position becomes variable
+        - or, with `min_values_to_generalize` (MIN_VALUES_TO_GENERALIZE by default), a template with variable
+          segments differs at one more position, which has taken enough distinct values: then it becomes variable
+          too, e.g. /{lang}/journal/{slug}. Templates may have several variable positions.
 
         Returns the template index if the url matches an existing template, -1 otherwise.
+        The lookup goes through `self.template_index`, so it does not scan all templates.
         """
         segments = [seg for seg in url.split("/") if seg]
-        if not segments:
-            return -1
-
-        for template_index, template in enumerate(self.pattern_templates):
-            template_segments = template.segments
-
-            if len(segments) != len(template_segments):
-                continue
-
-            # Cases here:
-            # 1. The url belongs to an existing template:
-            # Either at one variable part difference: should be only one variabel part, and append it to the variables
-            # Or matches all segments except for one, and the exisiting template has only fixed parts else : then make it variable
-            # 2. The url does not belong to an existing template, it's new and should be visited.
+        return self.template_index.match(segments)
 
-            # Note which segments are same vs different:
+    def add_url_to_templates(self, url: str) -> int:
+        """Merge a URL into the templates, returns the index of the matching template or -1 if it was new"""
+        normalized_url = self.normalize_url(url)
+        generic_url = self._replace_with_generic_pattern_if_necessary(normalized_url)
+        return self._add_generic_url_to_templates(generic_url, normalized_url)
 
-            segment_identity: list[int] = [-1] * len(segments)
-
-            for segment_index, (segment, template_segment) in enumerate(
-                zip(segments, template_segments)
-            ):
-                if isinstance(template_segment, FixedTemplateSegment):
-                    segment_identity[segment_index] = (
-                        1 if segment == template_segment.example else 0
-                    )
-                else:
-                    # Just add the segment value to variable segment examples if not there
-                    if segment not in template_segment.examples:
-                        template_segment.examples.append(segment)
-                    segment_identity[segment_index] = 1
-
-            if sum(segment_identity) == len(segments):
-                # The url directly belongs to this existing template: return the template index
-                return template_index
-
-            if sum([el == 0 for el in segment_identity]) == 1:
-                # There is one difference : see if it can be conciled. It will be conciled only if the other segments are all fixed
-                differing_segment_index = segment_identity.index(0)
-                if (
-                    sum(
-                        [
-                            isinstance(template_segment, VariableTemplateSegment)
-                            for segment_index, template_segment in enumerate(
-                                template_segments
-                            )
-                            if not segment_index == differing_segment_index
-                        ]
-                    )
-                    == 0
-                ):
-                    if isinstance(
-                        template_segments[differing_segment_index],
-                        VariableTemplateSegment,
-                    ):
-                        # Just append the new segment to the variable segment
-                        template_segments[differing_segment_index].examples.append(
-                            segment
-                        )  # type: ignore
-                        return template_index
-                    elif isinstance(
-                        template_segments[differing_segment_index], FixedTemplateSegment
-                    ):
-                        # We've discovered a new variable segment!
-                        template_segments[differing_segment_index] = (
-                            VariableTemplateSegment(
-                                examples=[
-                                    template_segments[differing_segment_index].example,  # type: ignore
-                                    segment,
-                                ]
-                            )
-                        )
-                        return template_index
-        return -1
+    def _add_generic_url_to_templates(self, generic_url: str, example: str) -> int:
+        matching_template_index = self.matches_existing_template(generic_url)
+        if matching_template_index == -1:
+            self.log_new_fixed_template(generic_url, example)
+        return matching_template_index
 
     def normalize_url(self, url: str) -> str:
         """Normalize URL by removing/parameterizing query parameters and recognizing patterns"""
@@ -405,12 +403,24 @@ class FastJSCrawler:
         path = parsed.path
         return parsed.scheme + "://" + parsed.netloc + path
 
-    async def extract_link_patterns(self, page: Page, url, current_depth):
+    async def extract_link_patterns(
+        self, page: Page, url, current_depth, validators: dict[str, str] | None = None
+    ):
         """Extract all link patterns from the page after JavaScript execution, merges them with existing patterns"""
         new_links = []
         try:
-            # Wait for initial load
-            await page.wait_for_load_state("networkidle", timeout=10000)
+            # Wait for the scripts to render the page, links are extracted even if it did not settle
+            host = urlparse(url).netloc
+            started = time.monotonic()
+            with self.metrics.time("settle_wait"):
+                settled = await wait_for_page_to_settle(
+                    page,
+                    self.wait_strategy,
+                    self.host_scheduler.timeout(host, "settle", SETTLE_TIMEOUT_SECONDS),
+                )
+            self.host_scheduler.record_wait(host, "settle", time.monotonic() - started)
+            if not settled:
+                self.nb_unsettled_pages += 1
             # await page.wait_for_selector("body", timeout=15000)
 
             # visible_text = await page.evaluate("() => document.body.innerHTML")
@@ -418,130 +428,570 @@ class FastJSCrawler:
             # print(visible_text[:10000])  # First 1000 characters
             # print("=" * 50)
 
-            # Extract title
-            title = await page.title()
-            if title:
-                self.page_titles[url] = title.strip()
-
-            # Extract all links using JavaScript
-            links = await page.evaluate("""
-                () => {
-                    const links = new Set();
-                    // Get all anchor tags
-                    document.querySelectorAll('a[href]').forEach(a => {
-                        links.add(a.href);
-                    });
-                    // Get links from JavaScript navigation elements
-                    document.querySelectorAll('[onclick], [data-href], [data-url]').forEach(el => {
-                        const onclick = el.getAttribute('onclick');
-                        if (onclick) {
-                            const match = onclick.match(/(?:location\\.href|window\\.location|navigate)\\s*=\\s*['"]([^'"]+)['"]/);
-                            if (match) links.add(new URL(match[1], window.location.href).href);
-                        }
-                        const dataHref = el.getAttribute('data-href') || el.getAttribute('data-url');
-                        if (dataHref) links.add(new URL(dataHref, window.location.href).href);
-                    });
-                    // Get router links (React, Vue, etc)
-                    document.querySelectorAll('[to], [href^="/"], [href^="./"], [href^="../"]').forEach(el => {
-                        const href = el.getAttribute('to') || el.getAttribute('href');
-                        if (href) links.add(new URL(href, window.location.href).href);
-                    });
-                    return Array.from(links);
-                }
-            """)
-
-            # Filter links to same domain and apply normalization
-            for link in links:
-                if link in self.visited:
-                    continue
-
-                parsed = urlparse(link)
-                if self.is_same_domain_or_subdomain(parsed.netloc):
-                    # Remove fragment
-                    clean_url = link.split("#")[0].split("?")[0]
-
-                    # Skip static assets
-                    if self.is_static_asset(clean_url):
-                        continue
-
-                    # Check if this URL matches an existing structural template
-                    normalized_url = self.normalize_url(clean_url)
-                    normalized_url = self._replace_with_generic_pattern_if_necessary(
-                        normalized_url
-                    )
-                    matching_template_index = self.matches_existing_template(
-                        normalized_url
-                    )
-                    if matching_template_index != -1:
-                        # Skip this URL as it matches a known pattern already
-                        continue
-                    else:
-                        if "?" in normalized_url:
-                            raise ValueError(
-                                f"URL {normalized_url} has a query parameter, which is not supported"
-                            )
-                        new_links.append(normalized_url)
-                        self.log_new_fixed_template(normalized_url)
-                        if current_depth < self.max_depth:
-                            await self.to_visit.put((normalized_url, current_depth + 1))
-            return new_links
+            with self.metrics.time("link_extraction"):
+                nb_links, links = await self._extract_links(page, url)
+
+            prefiltered = self.filter_links_in_page
+            self.record_page_links(url, "browser", links, nb_links, prefiltered)
+            # Escalation decisions compare against all the links, filtered or not
+            self.record_browser_link_count(url, nb_links)
+            if self.page_cache is not None and validators:
+                self.page_cache.store(url, validators, self.page_titles.get(url), links)
+            if self.near_duplicates is not None:
+                content = await page.evaluate(
+                    PAGE_CONTENT_SCRIPT, [MAX_TEXT_LENGTH, list(IGNORED_TAGS)]
+                )
+                if self.is_near_duplicate(url, content["text"], content["tagPaths"], links):
+                    return []
+            return await self.process_links(links, current_depth, prefiltered, url)
 
         except Exception as e:
             # Return empty list on error to keep crawling
             print(f"Error extracting links from {url}: {str(e)[:50]}")
             return new_links
 
-    async def crawl_page(self, browser, url, depth):
-        """Crawl a single page"""
-        async with self.semaphore:
-            if url in self.visited or len(self.visited) >= self.max_pages:
-                return
+    async def _extract_links(self, page: Page, url) -> tuple[int, list[str]]:
+        """Title and links of the rendered page, with the number of links before filtering"""
+        # Extract title
+        title = await page.title()
+        if title:
+            self.page_titles[url] = title.strip()
+
+        if self.filter_links_in_page:
+            # Only candidate URLs are sent back by the page
+            result = await page.evaluate(
+                EXTRACT_CANDIDATE_LINKS_SCRIPT,
+                [self.domain, list(STATIC_EXTENSIONS), list(STATIC_PATHS)],
+            )
+            return result["total"], result["links"]
+        # Extract all links using JavaScript
+        links = await page.evaluate(EXTRACT_LINKS_SCRIPT)
+        return len(links), links
 
-            self.visited.add(url)
+    async def process_links(
+        self,
+        links: list[str],
+        current_depth,
+        prefiltered: bool = False,
+        page_url: str | None = None,
+    ) -> list[str]:
+        """Merge the links of a page with existing patterns, queue those matching no template.
+
+        Prefiltered links were already scoped to the domain, stripped of their fragment and
+        deduplicated by the page. Queries are stripped after the robots.txt check.
+        Links in crawl traps are not queued, the fan-out is counted by template of `page_url`.
+        """
+        new_links = []
+        source_template = (
+            self._page_template(page_url)
+            if page_url is not None and self.trap_detector is not None
+            else None
+        )
+        matching_seconds = 0.0
+        # Filter links to same domain and apply normalization
+        for link in links:
+            if link in self.visited:
+                continue
 
-            context = await browser.new_context(
-                viewport={"width": 1920, "height": 1080},
-                user_agent="Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36",
-                extra_http_headers={"Cookie": "cc-accept=true"},
+            if prefiltered or self.is_same_domain_or_subdomain(urlparse(link).netloc):
+                # Remove fragment
+                link = link if prefiltered else link.split("#")[0]
+                clean_url = link.split("?")[0]
+
+                # Skip static assets
+                if not prefiltered and self.is_static_asset(clean_url):
+                    continue
+
+                # With the query, for the rules matching it, e.g. Disallow: /*?sort=
+                if self.robots is not None and not await self.robots.is_allowed(link):
+                    self.nb_disallowed_by_robots += 1
+                    continue
+
+                # Check if this URL matches an existing structural template
+                matching_started = time.perf_counter()
+                normalized_url = self.normalize_url(clean_url)
+                generic_url = self._replace_with_generic_pattern_if_necessary(
+                    normalized_url
+                )
+                matching_template_index = self.matches_existing_template(generic_url)
+                matching_seconds += time.perf_counter() - matching_started
+                if matching_template_index != -1:
+                    # Skip this URL as it matches a known pattern already
+                    continue
+                else:
+                    if "?" in normalized_url:
+                        raise ValueError(
+                            f"URL {normalized_url} has a query parameter, which is not supported"
+                        )
+                    new_links.append(normalized_url)
+                    self.log_new_fixed_template(generic_url, normalized_url)
+                    if current_depth < self.max_depth and (
+                        self.trap_detector is None
+                        or self.trap_detector.check(normalized_url, source_template) is None
+                    ):
+                        # The page itself, the template may have placeholders, e.g. {id}
+                        await self.enqueue(normalized_url, current_depth + 1)
+        self.metrics.observe("template_matching", matching_seconds)
+        return new_links
+
+    async def enqueue(self, url: str, depth: int):
+        if self.stop_event.is_set():
+            # The crawl is over: the pages in flight must not grow the frontier
+            return
+        await self.to_visit.put((url, depth))
+        if self.checkpoint is not None:
+            self.checkpoint.record_queued(url, depth)
+
+    def restore_checkpoint(self) -> bool:
+        """Reload the state saved by a previous run of this crawl, returns whether there was one"""
+        state = self.checkpoint.load()
+        if state is None:
+            return False
+        if state.start_url != self.start_url:
+            print(
+                f"Ignoring checkpoint of a crawl of {state.start_url}, not {self.start_url}"
             )
-            page = await context.new_page()
+            return False
+        self.visited.update(state.visited)
+        self.nb_pages_done = self.nb_pages_reserved = len(self.visited)
+        self.page_titles.update(
+            (url, title) for url, title in state.visited.items() if title
+        )
+        self.pattern_templates = state.templates
+        for url, depth in state.frontier:
+            self.to_visit.put_nowait((url, depth))
+        print(
+            f"Resumed crawl: {len(self.visited)} pages visited, {len(state.frontier)} queued, {len(self.pattern_templates)} templates"
+        )
+        return True
 
-            try:
-                # Navigate to the page
-                await page.goto(url, wait_until="domcontentloaded", timeout=15000)
+    async def seed_from_previous_templates(self):
+        """Queue one example URL of each template of the previous job, up to half the pages budget"""
+        nb_seeds = 0
+        for template in self.previous_templates:
+            if nb_seeds >= self.max_pages // 2:
+                break
+            url = template.example_url()
+            # Templates saved without an example page have placeholders, e.g. {id}
+            if "{" in url or url == self.start_url:
+                continue
+            if not self.is_same_domain_or_subdomain(urlparse(url).netloc):
+                continue
+            if self.robots is not None and not await self.robots.is_allowed(url):
+                continue
+            await self.enqueue(url, 1)
+            nb_seeds += 1
+        if nb_seeds:
+            print(f"Queued {nb_seeds} example URLs of the previous job's templates")
+
+    def _page_template_index(self, url: str) -> int:
+        """Index of the template of a page URL, without updating the templates"""
+        generic_url = self._replace_with_generic_pattern_if_necessary(
+            self.normalize_url(url)
+        )
+        segments = [seg for seg in generic_url.split("/") if seg]
+        return self.template_index.match(segments, update=False)
+
+    def record_page_links(
+        self,
+        url: str,
+        fetch: str,
+        links: list[str],
+        nb_links: int | None = None,
+        prefiltered: bool = False,
+    ):
+        """Count the links of a crawled page, and add those to pages of the site to the link graph"""
+        self.metrics.record_page(url, fetch, len(links) if nb_links is None else nb_links)
+        if self.link_graph is None:
+            return
+        if prefiltered:
+            self.link_graph.add_page(url, [link.split("?")[0] for link in links])
+            return
+        page_links = []
+        for link in links:
+            if not self.is_same_domain_or_subdomain(urlparse(link).netloc):
+                continue
+            clean_url = link.split("#")[0].split("?")[0]
+            if not self.is_static_asset(clean_url):
+                page_links.append(clean_url)
+        self.link_graph.add_page(url, page_links)
+
+    def select_urls(self, max_urls: int) -> list[str]:
+        """Representative crawled pages, by PageRank over the link graph and one template at a time"""
+        if self.link_graph is None:
+            return []
+
+        def template_of(url: str) -> int | str:
+            template_index = self._page_template_index(url)
+            # URLs matching no template are their own group
+            return template_index if template_index != -1 else url
+
+        return select_representative_urls(
+            self.link_graph,
+            max_urls,
+            template_of,
+            # URLs with placeholders, e.g. {id}, from older checkpoints are not real pages
+            is_candidate=lambda url: "{" not in url,
+        )
+
+    def _page_template(self, url: str) -> Template | None:
+        template_index = self._page_template_index(url)
+        return self.pattern_templates[template_index] if template_index != -1 else None
+
+    def is_near_duplicate(
+        self, url: str, text: str, tag_paths: list[str], links: list[str]
+    ) -> bool:
+        """Whether a page is a near-duplicate of a page already crawled, whose links it shares"""
+        with self.metrics.time("near_duplicate_check"):
+            fingerprint = page_fingerprint(text, tag_paths)
+            if fingerprint is None:
+                return False
+            original_url = self.near_duplicates.find(fingerprint)
+            if original_url is None:
+                self.near_duplicates.add(url, fingerprint)
+                return False
+            # Pages the links of this page would have queued
+            nb_saved = self._count_new_links(links)
+        self.metrics.count("near_duplicates")
+        self.metrics.count("near_duplicate_links_skipped", value=len(links))
+        self.metrics.count("near_duplicate_pages_saved", value=nb_saved)
+        print(f"Near-duplicate of {original_url}: {url}, {nb_saved} new links not followed")
+        return True
+
+    def _count_new_links(self, links: list[str]) -> int:
+        """Number of pages `process_links` would queue for these links, without updating templates"""
+        new_links = set()
+        for link in links:
+            if not self.is_same_domain_or_subdomain(urlparse(link).netloc):
+                continue
+            clean_url = self.normalize_url(link)
+            if clean_url in self.visited or self.is_static_asset(clean_url):
+                continue
+            if self._page_template_index(clean_url) == -1:
+                # Links of a new template would match each other once the first is merged
+                new_links.add(self._replace_with_generic_pattern_if_necessary(clean_url))
+        return len(new_links)
+
+    def record_browser_link_count(self, url: str, nb_links: int):
+        template = self._page_template(url)
+        if template is not None:
+            total, count = self.browser_link_counts.get(template, (0, 0))
+            self.browser_link_counts[template] = (total + nb_links, count + 1)
+
+    def expected_link_count(self, url: str) -> float | None:
+        """Mean number of links found by the browser on pages of the same template"""
+        template = self._page_template(url)
+        if template is None:
+            return None
+        total, count = self.browser_link_counts.get(template, (0, 0))
+        return total / count if count else None
+
+    async def process_static_page(
+        self, static_page: StaticPage, url, depth
+    ) -> list[str] | None:
+        """Process the links of a page fetched over HTTP, returns None if it needs a browser render"""
+        reason = escalation_reason(static_page, self.expected_link_count(url))
+        if reason is not None:
+            self.fetch_stats[f"escalated_{reason}"] += 1
+            return None
+        self.fetch_stats["without_browser"] += 1
+        self.record_page_links(url, "static", static_page.links)
+        if static_page.title:
+            self.page_titles[url] = static_page.title
+        if self.page_cache is not None:
+            self.page_cache.store(
+                url, static_page.validators, static_page.title, static_page.links
+            )
+        if self.near_duplicates is not None and self.is_near_duplicate(
+            url, static_page.text, static_page.tag_paths, static_page.links
+        ):
+            return []
+        return await self.process_links(static_page.links, depth, page_url=url)
+
+    async def retry_later(self, url, depth) -> bool:
+        """Queue a throttled page again, to be fetched once its host backoff is over"""
+        if self.throttled_retries[url] >= MAX_THROTTLED_RETRIES:
+            return False
+        self.throttled_retries[url] += 1
+        self.visited.discard(url)
+        await self.enqueue(url, depth)
+        print(f"Throttled on {url}, retrying later")
+        return True
+
+    async def crawl_page(self, context_pool: BrowserContextPool, url, depth) -> bool:
+        """Crawl a single page, returns whether it was crawled and counts against the page budget"""
+        if self.nb_pages_done >= self.max_pages or url in self.visited:
+            return False
+        host = urlparse(url).netloc
+        host_acquired = responded = False
+        # Set once the page holds a global slot
+        page_started: float | None = None
+        # Sample of the static fetch, recorded unless the browser records its own: one per page
+        static_sample: tuple | None = None
+        try:
+            self.visited.add(url)
+            # The host slot first: a page waiting for a busy host must not hold a global slot
+            await self.host_scheduler.acquire(host)
+            host_acquired = True
+            async with self.semaphore:
+                started = page_started = time.monotonic()
+                cached_page = (
+                    self.page_cache.get(url) if self.page_cache is not None else None
+                )
+                if self.http_first or cached_page is not None:
+                    # Conditional request for pages cached by a previous crawl
+                    with self.metrics.time("static_fetch"):
+                        static_page = await self.static_fetcher.fetch(
+                            url,
+                            headers=cached_page.conditional_headers() if cached_page else None,
+                            read_body=self.http_first,
+                        )
+                    if static_page.error is not None:
+                        self.metrics.record_error(
+                            "static_fetch", timeout=static_page.error == "timeout"
+                        )
+                    static_sample = (
+                        host,
+                        time.monotonic() - started,
+                        static_page.status_code if static_page.error is None else None,
+                        static_page.retry_after,
+                    )
+                    responded = True
+                    if static_page.status_code in THROTTLE_STATUS_CODES:
+                        # Recorded right away, so that the host backs off before the retry
+                        self.host_scheduler.record(*static_sample)
+                        static_sample = None
+                        if await self.retry_later(url, depth):
+                            return False
+                    if cached_page is not None:
+                        self.page_cache.record_revalidation(
+                            static_page.status_code == 304
+                        )
+                        if static_page.status_code == 304:
+                            self.fetch_stats["not_modified"] += 1
+                            self.record_page_links(
+                                url, "not_modified", cached_page.links
+                            )
+                            if cached_page.title:
+                                self.page_titles[url] = cached_page.title
+                            new_links = await self.process_links(
+                                cached_page.links, depth, page_url=url
+                            )
+                            print(
+                                f"Not modified: {url} ({len(self.visited)}/{self.max_pages}) - Found {len(new_links)} new links from cache"
+                            )
+                            return True
+                if self.http_first:
+                    new_links = await self.process_static_page(static_page, url, depth)
+                    if new_links is not None:
+                        print(
+                            f"Crawled without browser: {url} ({len(self.visited)}/{self.max_pages}) - Found {len(new_links)} new links, totaling {len(self.pattern_templates)} patterns so far"
+                        )
+                        return True
 
-                # Handle cookie banners and consent dialogs
-                await self.handle_cookie_banners(page)
+                self.fetch_stats["with_browser"] += 1
+                async with context_pool.page() as page:
+                    if self.resource_blocker:
+                        self.resource_blocker.start_page(page)
 
-                # Extract links after JS execution
-                new_links = await self.extract_link_patterns(page, url, depth)
+                    # Reuse the consent obtained by the other contexts
+                    await self.consent_store.apply(page.context)
+
+                    # Navigate to the page, the navigation is the sample of the page
+                    started, responded = time.monotonic(), False
+                    static_sample = None
+                    navigation_timeout = self.host_scheduler.timeout(
+                        host, "navigation", NAVIGATION_TIMEOUT_SECONDS
+                    )
+                    with self.metrics.time("navigation"):
+                        try:
+                            response = await page.goto(
+                                url,
+                                wait_until="domcontentloaded",
+                                timeout=navigation_timeout * 1000,
+                            )
+                        finally:
+                            self.host_scheduler.record_wait(
+                                host, "navigation", time.monotonic() - started
+                            )
+                    status = response.status if response else None
+                    self.host_scheduler.record(
+                        host,
+                        time.monotonic() - started,
+                        status,
+                        response.headers.get("retry-after") if response else None,
+                    )
+                    responded = True
+                    if status in THROTTLE_STATUS_CODES and await self.retry_later(
+                        url, depth
+                    ):
+                        return False
+                    if status is not None and status >= 400:
+                        self.metrics.count("error_pages", str(status))
+
+                    # Handle cookie banners and consent dialogs
+                    consent_provider = await self.handle_cookie_banners(page)
+
+                    # Extract links after JS execution
+                    new_links = await self.extract_link_patterns(
+                        page,
+                        url,
+                        depth,
+                        validators=(
+                            validators_from_headers(response.headers) if response else None
+                        ),
+                    )
+
+                    if consent_provider:
+                        # Saved once the page settled, so that the consent cookies are set
+                        await self.consent_store.save(
+                            page.context, urlparse(page.url).netloc, consent_provider
+                        )
+
+                    blocking_report = ""
+                    if self.resource_blocker:
+                        blocking_stats = self.resource_blocker.finish_page(page)
+                        blocking_report = f", blocked {blocking_stats.blocked_requests} requests (~{blocking_stats.estimated_bytes_saved // 1000} KB saved)"
 
                 # Count patterns discovered
                 pattern_count = len(self.generic_url_patterns) + len(
                     self.pattern_templates
                 )
                 print(
-                    f"Crawled: {url} ({len(self.visited)}/{self.max_pages}) - Found {len(new_links)} new links, totaling {pattern_count} patterns so far"
+                    f"Crawled: {url} ({len(self.visited)}/{self.max_pages}) - Found {len(new_links)} new links, totaling {pattern_count} patterns so far{blocking_report}"
                 )
 
-            except Exception as e:
-                print(f"Error crawling {url}: {str(e)[:50]}")
-                # raise e
-            finally:
-                await context.close()
+        except asyncio.CancelledError:
+            # Stopped past the grace period: the page was not crawled
+            self.visited.discard(url)
+            raise
+        except Exception as e:
+            print(f"Error crawling {url}: {str(e)[:50]}")
+            self.metrics.count("failed_pages")
+            if page_started is not None and not responded:
+                # Navigation error or timeout
+                self.host_scheduler.record(host, time.monotonic() - started, None)
+            # raise e
+        finally:
+            if page_started is not None:
+                self.metrics.observe("page", time.monotonic() - page_started)
+            if static_sample is not None:
+                self.host_scheduler.record(*static_sample)
+            if host_acquired:
+                await self.host_scheduler.release(host)
+            # Pages queued again after throttling are not done
+            if url in self.visited:
+                self.nb_pages_done += 1
+                if self.checkpoint is not None:
+                    self.checkpoint.record_visited(url, self.page_titles.get(url))
+                self.check_stop_conditions()
+        return True
+
+    def crawl_error_rate(self) -> float:
+        """Share of the crawled pages that failed or answered with an HTTP error status"""
+        nb_errors = self.metrics.total("failed_pages") + self.metrics.total("error_pages")
+        return round(nb_errors / len(self.visited), 4) if len(self.visited) else 0.0
+
+    def request_stop(self, reason: str):
+        if not self.stop_event.is_set():
+            self.stop_reason = reason
+            self.stop_event.set()
+            # Workers waiting for the budget exit
+            self.budget_released.set()
+
+    async def reserve_page_budget(self) -> bool:
+        """Wait for a page of the budget not handed out yet, False once the crawl is stopped"""
+        while self.nb_pages_reserved >= self.max_pages:
+            if self.stop_event.is_set():
+                return False
+            self.budget_released.clear()
+            await self.budget_released.wait()
+        self.nb_pages_reserved += 1
+        return True
+
+    def release_page_budget(self):
+        """Give back the page reserved by a worker, if it did not crawl a page with it"""
+        self.nb_pages_reserved -= 1
+        self.budget_released.set()
+
+    def check_stop_conditions(self):
+        """Stop the crawl once the page budget is spent, or template discovery has saturated"""
+        if self.nb_pages_done >= self.max_pages:
+            self.request_stop("page budget spent")
+        if self.min_new_templates_per_page is None:
+            return
+        self.template_counts.append(self.template_index.nb_added)
+        if len(self.template_counts) == self.template_counts.maxlen:
+            rate = (
+                self.template_counts[-1] - self.template_counts[0]
+            ) / self.saturation_window
+            if rate < self.min_new_templates_per_page:
+                self.request_stop(
+                    f"{rate:.2f} new templates per page over the last {self.saturation_window} pages"
+                )
 
-    async def worker(self, browser):
+    async def worker(self, context_pool: BrowserContextPool):
         """Worker that processes URLs from the queue"""
         while True:
             try:
+                if not await self.reserve_page_budget():
+                    break
                 url, depth = await self.to_visit.get()
-                await self.crawl_page(browser, url, depth)
+                if self.stop_event.is_set():
+                    self.release_page_budget()
+                    self.to_visit.task_done()
+                    break
+                self.nb_in_flight += 1
+                crawled = False
+                try:
+                    crawled = await self.crawl_page(context_pool, url, depth)
+                finally:
+                    if not crawled:
+                        self.release_page_budget()
+                    self.nb_in_flight -= 1
+                    if not self.nb_in_flight:
+                        self.in_flight_done.set()
                 self.to_visit.task_done()
+                self.metrics.sample_queue_depth(self.to_visit.qsize())
                 print(f"Remaining links to visit: {self.to_visit.qsize()}")
+                if self.checkpoint is not None:
+                    await self.checkpoint.maybe_save(
+                        self.start_url, self.pattern_templates
+                    )
             except Exception as e:
                 print(f"Worker error:\n" + str(e))
                 break
 
+    async def run_workers(self, context_pool: BrowserContextPool | None):
+        """Crawl the frontier until it is empty or the crawl is stopped"""
+        workers = [
+            asyncio.create_task(self.worker(context_pool))
+            for _ in range(self.concurrency)
+        ]
+        queue_done = asyncio.ensure_future(self.to_visit.join())
+        stopped = asyncio.ensure_future(self.stop_event.wait())
+        await asyncio.wait({queue_done, stopped}, return_when=asyncio.FIRST_COMPLETED)
+
+        if self.stop_event.is_set():
+            print(
+                f"Stopping the crawl: {self.stop_reason} ({len(self.visited)} pages, "
+                f"{self.nb_in_flight} in flight, {self.to_visit.qsize()} left in the queue)"
+            )
+            if self.nb_in_flight:
+                # Workers exit after their current page, the pages still running are then cancelled
+                self.in_flight_done.clear()
+                try:
+                    await asyncio.wait_for(
+                        self.in_flight_done.wait(), self.stop_grace_period
+                    )
+                except asyncio.TimeoutError:
+                    print(f"Cancelling {self.nb_in_flight} pages still in flight")
+
+        # Cancel the workers, idle or past the grace period
+        for task in [*workers, queue_done, stopped]:
+            task.cancel()
+        await asyncio.gather(*workers, queue_done, stopped, return_exceptions=True)
+
     async def crawl(self):
         """Main crawling function"""
         print(f"Starting crawl of {self.start_url}")
@@ -552,83 +1002,135 @@ class FastJSCrawler:
             print("Using sitemap.xml for URL discovery")
         print("-" * 70)
 
-        # If using sitemap, load URLs from sitemap.xml and build tree directly
-        if self.use_sitemap:
-            sitemap_urls = self.load_sitemap()
-            if sitemap_urls:
-                filtered_urls = self.filter_sitemap_urls(sitemap_urls)
-                print(f"Processing {len(filtered_urls)} URLs from sitemap")
-
-                # Process each URL to build templates
-                for url in filtered_urls:
-                    normalized_url = self.normalize_url(url)
-                    normalized_url = self._replace_with_generic_pattern_if_necessary(
-                        normalized_url
-                    )
-
-                    matching_template_index = self.matches_existing_template(
-                        normalized_url
-                    )
-                    if matching_template_index == -1:
-                        self.log_new_fixed_template(normalized_url)
-
-                    self.visited.add(url)
-
-                print(f"Built {len(self.pattern_templates)} URL patterns from sitemap")
-                return
-            else:
-                print("No URLs found in sitemap, falling back to regular crawling")
-
-        async with async_playwright() as p:
-            # Launch browser in headless mode
-            browser = await p.chromium.launch(
-                headless=True, args=["--disable-blink-features=AutomationControlled"]
+        try:
+            resumed = (
+                self.checkpoint is not None and self.resume and self.restore_checkpoint()
             )
 
-            # Add start URL to queue
-            await self.to_visit.put((self.start_url, 0))
-
-            # Create workers
-            workers = [
-                asyncio.create_task(self.worker(browser))
-                for _ in range(self.concurrency)
-            ]
-
-            # Wait for all tasks to be processed
-            await self.to_visit.join()
-
-            # Cancel all workers since all tasks are done
-            for worker in workers:
-                worker.cancel()
+            # If using sitemap, stream URLs from sitemap.xml and build tree directly
+            if self.use_sitemap and not resumed:
+                if await self.load_sitemap():
+                    print(f"Built {len(self.pattern_templates)} URL patterns from sitemap")
+                    return
+                else:
+                    print("No URLs found in sitemap, falling back to regular crawling")
+
+            async with async_playwright() as p:
+                # Launch browsers in headless mode
+                browsers = await asyncio.gather(
+                    *(
+                        p.chromium.launch(
+                            headless=True,
+                            args=["--disable-blink-features=AutomationControlled"],
+                        )
+                        for _ in range(self.browser_processes)
+                    )
+                )
 
-            # Wait for workers to finish cancellation
-            await asyncio.gather(*workers, return_exceptions=True)
+                # Consent given on a previous run
+                self.consent_store.load(urlparse(self.start_url).netloc)
+
+                # One long-lived context per worker, or a fresh context per page without pooling
+                self.context_pool = BrowserContextPool(
+                    list(browsers),
+                    size=self.concurrency,
+                    max_pages_per_context=(
+                        self.max_pages_per_context if self.use_context_pool else 1
+                    ),
+                    setup_page=(
+                        self.setup_page
+                        if self.resource_blocker or self.resource_cache
+                        else None
+                    ),
+                    get_storage_state=self.consent_store.storage_state,
+                )
 
-            await browser.close()
+                if self.http_first or self.page_cache is not None:
+                    self.static_fetcher = StaticFetcher(concurrency=self.concurrency)
+
+                # Add start URL to queue
+                if not resumed:
+                    await self.enqueue(self.start_url, 0)
+                    await self.seed_from_previous_templates()
+
+                await self.run_workers(self.context_pool)
+
+                await self.context_pool.close()
+                await asyncio.gather(*(browser.close() for browser in browsers))
+                if self.static_fetcher is not None:
+                    await self.static_fetcher.aclose()
+        finally:
+            # Also when the crawl fails: the files are uploaded by the ingestion
+            if self.checkpoint is not None:
+                await self.checkpoint.save(self.start_url, self.pattern_templates)
+                self.checkpoint.close()
+            if self.page_cache is not None:
+                self.page_cache.close()
+            if self.resource_cache is not None:
+                self.resource_cache.close()
+
+    async def setup_page(self, page: Page):
+        """Install the request routing of a new page: the routes added last handle requests first"""
+        if self.resource_cache is not None:
+            await self.resource_cache.install(page)
+        if self.resource_blocker is not None:
+            # Blocked requests never reach the cache
+            await self.resource_blocker.install(page)
 
     def get_statistics(self):
         """Generate crawl statistics"""
-        total_links = sum(len(links) for links in self.site_structure.values())
-
-        # Find pages with most links
-        pages_by_links = sorted(
-            [(url, len(links)) for url, links in self.site_structure.items()],
-            key=lambda x: x[1],
-            reverse=True,
-        )[:10]
-
-        # Path depth analysis
+        # Path depth analysis, unless the visited URLs are only kept as hashes
         depth_distribution = defaultdict(int)
-        for url in self.visited:
-            path = urlparse(url).path
-            depth = path.count("/")
-            depth_distribution[depth] += 1
+        if isinstance(self.visited, set):
+            for url in self.visited:
+                path = urlparse(url).path
+                depth = path.count("/")
+                depth_distribution[depth] += 1
 
         return {
             "pages_crawled": len(self.visited),
-            "total_links_found": total_links,
-            "pages_with_most_links": pages_by_links,
+            "stop_reason": self.stop_reason,
+            "crawl_error_rate": self.crawl_error_rate(),
+            "near_duplicates": {
+                "pages": self.metrics.total("near_duplicates"),
+                "links_not_followed": self.metrics.total("near_duplicate_links_skipped"),
+                "pages_saved": self.metrics.total("near_duplicate_pages_saved"),
+            },
+            "crawl_traps": (
+                self.trap_detector.to_dict() if self.trap_detector is not None else None
+            ),
+            "total_links_found": self.metrics.total("links"),
+            "pages_with_most_links": self.metrics.pages_with_most_links(),
             "depth_distribution": dict(depth_distribution),
+            "browser_contexts_created": (
+                self.context_pool.contexts_created if self.context_pool else 0
+            ),
+            "browser_processes": self.browser_processes,
+            "cookie_consent_providers": self.consent_store.provider_by_host,
+            "pages_without_browser": self.fetch_stats["without_browser"],
+            "pages_with_browser": self.fetch_stats["with_browser"],
+            "browser_escalations": {
+                key.removeprefix("escalated_"): count
+                for key, count in self.fetch_stats.items()
+                if key.startswith("escalated_")
+            },
+            "hosts": self.host_scheduler.get_statistics(),
+            "links_disallowed_by_robots": self.nb_disallowed_by_robots,
+            "wait_strategy": self.wait_strategy,
+            "pages_not_settled": self.nb_unsettled_pages,
+            "pages_not_modified": self.fetch_stats["not_modified"],
+            "resource_blocking": (
+                self.resource_blocker.get_statistics() if self.resource_blocker else None
+            ),
+            "resource_cache": (
+                self.resource_cache.get_statistics() if self.resource_cache else None
+            ),
+            "link_graph": (
+                {"nodes": self.link_graph.nb_nodes, "edges": self.link_graph.nb_edges}
+                if self.link_graph is not None
+                else None
+            ),
+            "metrics": self.metrics.to_dict(),
         }
 
     def export_structure(self, format="tree"):
@@ -721,6 +1223,8 @@ class FastJSCrawler:
 
     def _export_urls(self):
         """Export as simple URL list"""
+        if not isinstance(self.visited, set):
+            raise ValueError("The visited URLs are not kept by compact visited stores")
         return "\n".join(sorted(self.visited))
 
 
@@ -757,13 +1261,64 @@ def test_crawler_logs_variable_template():
     ), replaced_url
 
 
-async def crawl(url: str, max_pages: int, max_depth: int, concurrency: int):
+async def crawl(
+    url: str,
+    max_pages: int,
+    max_depth: int,
+    concurrency: int,
+    use_context_pool: bool = True,
+    fast_mode: bool = False,
+    blocked_hosts: set[str] | None = None,
+    http_first: bool = False,
+    checkpoint: CrawlCheckpoint | None = None,
+    resume: bool = False,
+    use_priority_frontier: bool = True,
+    respect_robots: bool = True,
+    page_cache: PageCache | None = None,
+    previous_templates: list[Template] | None = None,
+    visited_store: str = "set",
+    bloom_error_rate: float = DEFAULT_BLOOM_ERROR_RATE,
+    max_titles: int | None = None,
+    min_new_templates_per_page: float | None = None,
+    saturation_window: int = SATURATION_WINDOW,
+    stop_grace_period: float = STOP_GRACE_PERIOD_SECONDS,
+    browser_processes: int = 1,
+    filter_links_in_page: bool = False,
+    min_values_to_generalize: int | None = MIN_VALUES_TO_GENERALIZE,
+    near_duplicate_distance: int | None = None,
+    detect_crawl_traps: bool = True,
+    wait_strategy: str = DEFAULT_WAIT_STRATEGY,
+    resource_cache: ResourceCache | None = None,
+):
     print(f"Running crawler for {url}")
     crawler = FastJSCrawler(
         url,
         max_pages=max_pages,
         max_depth=max_depth,
         concurrency=concurrency,
+        use_context_pool=use_context_pool,
+        fast_mode=fast_mode,
+        blocked_hosts=blocked_hosts,
+        http_first=http_first,
+        checkpoint=checkpoint,
+        resume=resume,
+        use_priority_frontier=use_priority_frontier,
+        respect_robots=respect_robots,
+        page_cache=page_cache,
+        previous_templates=previous_templates,
+        visited_store=visited_store,
+        bloom_error_rate=bloom_error_rate,
+        max_titles=max_titles,
+        min_new_templates_per_page=min_new_templates_per_page,
+        saturation_window=saturation_window,
+        stop_grace_period=stop_grace_period,
+        browser_processes=browser_processes,
+        filter_links_in_page=filter_links_in_page,
+        min_values_to_generalize=min_values_to_generalize,
+        near_duplicate_distance=near_duplicate_distance,
+        detect_crawl_traps=detect_crawl_traps,
+        wait_strategy=wait_strategy,
+        resource_cache=resource_cache,
     )
     await crawler.crawl()
     return crawler
@@ -799,11 +1354,193 @@ async def main():
         help="Output format",
     )
     parser.add_argument("--output", help="Output file (optional)")
+    parser.add_argument(
+        "--no-context-pool",
+        action="store_true",
+        help="Create a new browser context for every page instead of reusing one per worker",
+    )
+    parser.add_argument(
+        "--browsers",
+        type=int,
+        default=1,
+        help="Number of Chromium processes the browser contexts are spread over (default: 1)",
+    )
+    parser.add_argument(
+        "--filter-links-in-page",
+        action="store_true",
+        help="Scope links to the domain, drop static assets and duplicates in the page, before sending them to Python",
+    )
+    parser.add_argument(
+        "--min-values-to-generalize",
+        type=int,
+        default=MIN_VALUES_TO_GENERALIZE,
+        help=f"Distinct values at a position of sibling templates after which it becomes variable, 0 to only generalize one position per template (default: {MIN_VALUES_TO_GENERALIZE})",
+    )
+    parser.add_argument(
+        "--near-duplicate-distance",
+        type=int,
+        help=f"Do not follow the links of pages whose text SimHash is within this many bits of a crawled page with the same structure, e.g. {DEFAULT_MAX_DISTANCE} (default: follow all links)",
+    )
+    parser.add_argument(
+        "--no-trap-detection",
+        action="store_true",
+        help="Queue the links of crawl traps too: ever deeper paths, segment cycles, unbounded fan-out of a template and increasing numbers",
+    )
+    parser.add_argument(
+        "--wait-strategy",
+        choices=WAIT_STRATEGIES,
+        default=DEFAULT_WAIT_STRATEGY,
+        help="Wait for rendered pages to settle until their DOM and anchors stop changing, or until the network is idle, under per-host timeouts learned from latency percentiles (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--fast",
+        action="store_true",
+        help="Block images, media, fonts and analytics/ads hosts while crawling",
+    )
+    parser.add_argument(
+        "--block-hosts-file",
+        help="File listing the hosts to block in fast mode, one per line (default: built-in list)",
+    )
+    parser.add_argument(
+        "--http-first",
+        action="store_true",
+        help="Fetch pages over HTTP and only render with the browser those that look JS-rendered",
+    )
+    parser.add_argument(
+        "--fifo-frontier",
+        action="store_true",
+        help="Visit pages in discovery order instead of the most novel URLs first",
+    )
+    parser.add_argument(
+        "--ignore-robots",
+        action="store_true",
+        help="Do not read robots.txt (rules, Sitemap: and Crawl-delay directives)",
+    )
+    parser.add_argument(
+        "--recrawl-cache",
+        action="store_true",
+        help="Revalidate the pages seen by previous runs with conditional requests, reusing their links when unchanged",
+    )
+    parser.add_argument(
+        "--resource-cache",
+        action="store_true",
+        help="Serve the scripts, stylesheets, fonts and images of rendered pages from a disk cache shared by all browser contexts and kept across runs",
+    )
+    parser.add_argument(
+        "--resource-cache-size",
+        type=int,
+        default=DEFAULT_MAX_BYTES // 1_000_000,
+        help="Size of the resource cache in MB, the least recently used resources are evicted beyond it (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--checkpoint",
+        help="SQLite file where the crawl state is periodically saved (default: no checkpoints)",
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="Resume the crawl saved in the --checkpoint file instead of starting over",
+    )
+    parser.add_argument(
+        "--visited-store",
+        choices=VISITED_STORES,
+        default="set",
+        help="Store of the visited URLs: 'hashed' (8 bytes per URL) and 'bloom' (a few bytes per URL, with false positives) do not keep the URLs themselves (default: set)",
+    )
+    parser.add_argument(
+        "--bloom-error-rate",
+        type=float,
+        default=DEFAULT_BLOOM_ERROR_RATE,
+        help=f"False positive rate of the 'bloom' visited store (default: {DEFAULT_BLOOM_ERROR_RATE})",
+    )
+    parser.add_argument(
+        "--min-new-templates-per-page",
+        type=float,
+        help="Stop once fewer new templates per page are found over the last --saturation-window pages (default: never)",
+    )
+    parser.add_argument(
+        "--saturation-window",
+        type=int,
+        default=SATURATION_WINDOW,
+        help=f"Number of pages over which the rate of new templates is measured (default: {SATURATION_WINDOW})",
+    )
+    parser.add_argument(
+        "--stop-grace-period",
+        type=float,
+        default=STOP_GRACE_PERIOD_SECONDS,
+        help=f"Seconds given to the pages in flight to finish when the crawl stops early (default: {STOP_GRACE_PERIOD_SECONDS})",
+    )
+    parser.add_argument(
+        "--metrics-json",
+        help="File where the crawl metrics (time per stage, errors, queue depth) are written as JSON",
+    )
+    parser.add_argument(
+        "--metrics-prometheus",
+        help="File where the crawl metrics are written in the Prometheus text format",
+    )
+    parser.add_argument(
+        "--select-urls",
+        type=int,
+        help="Print this many representative URLs, ranked by PageRank over the link graph",
+    )
+    parser.add_argument(
+        "--max-titles",
+        type=int,
+        help="Keep the titles of at most this many pages (default: all of them)",
+    )
 
     args = parser.parse_args()
+    if args.visited_store != "set" and args.format == "urls":
+        parser.error("--format urls needs the visited URLs, kept only by --visited-store set")
+
+    blocked_hosts = None
+    if args.block_hosts_file:
+        with open(args.block_hosts_file) as f:
+            blocked_hosts = {line.strip() for line in f if line.strip()}
+
+    checkpoint = CrawlCheckpoint(Path(args.checkpoint)) if args.checkpoint else None
+    page_cache = None
+    if args.recrawl_cache:
+        url = args.url
+        if not url.startswith(("http://", "https://")):
+            url = "https://" + url
+        page_cache = PageCache.for_domain(urlparse(url).netloc)
+
+    resource_cache = (
+        ResourceCache.in_data_directory(args.resource_cache_size * 1_000_000)
+        if args.resource_cache
+        else None
+    )
 
     start_time = time.time()
-    crawler = await crawl(args.url, args.max_pages, args.max_depth, args.concurrency)
+    crawler = await crawl(
+        args.url,
+        args.max_pages,
+        args.max_depth,
+        args.concurrency,
+        use_context_pool=not args.no_context_pool,
+        fast_mode=args.fast,
+        blocked_hosts=blocked_hosts,
+        http_first=args.http_first,
+        checkpoint=checkpoint,
+        resume=args.resume,
+        use_priority_frontier=not args.fifo_frontier,
+        respect_robots=not args.ignore_robots,
+        page_cache=page_cache,
+        visited_store=args.visited_store,
+        bloom_error_rate=args.bloom_error_rate,
+        max_titles=args.max_titles,
+        min_new_templates_per_page=args.min_new_templates_per_page,
+        saturation_window=args.saturation_window,
+        stop_grace_period=args.stop_grace_period,
+        browser_processes=args.browsers,
+        filter_links_in_page=args.filter_links_in_page,
+        min_values_to_generalize=args.min_values_to_generalize or None,
+        near_duplicate_distance=args.near_duplicate_distance,
+        detect_crawl_traps=not args.no_trap_detection,
+        wait_strategy=args.wait_strategy,
+        resource_cache=resource_cache,
+    )
     elapsed = time.time() - start_time
 
     # Print statistics
@@ -811,8 +1548,77 @@ async def main():
     stats = crawler.get_statistics()
     print(f"Crawl completed in {elapsed:.2f} seconds")
     print(f"Pages crawled: {stats['pages_crawled']}")
-    print(f"Pages per second: {stats['pages_crawled'] / elapsed:.2f}")
+    if stats["stop_reason"]:
+        print(f"Stopped early: {stats['stop_reason']}")
+    print(
+        f"Pages per second: {stats['pages_crawled'] / elapsed:.2f} (context pooling {'off' if args.no_context_pool else 'on'}, {stats['browser_contexts_created']} contexts created in {stats['browser_processes']} browsers)"
+    )
     print(f"Total unique links found: {stats['total_links_found']}")
+    print(f"Crawl errors: {stats['crawl_error_rate']:.1%} of pages")
+    if stats["pages_not_settled"]:
+        print(
+            f"Pages whose links were extracted before they settled ({stats['wait_strategy']}): {stats['pages_not_settled']}"
+        )
+    if args.near_duplicate_distance is not None:
+        near_duplicates = stats["near_duplicates"]
+        print(
+            f"Near-duplicates: {near_duplicates['pages']} pages whose links were not followed, saving ~{near_duplicates['pages_saved']} pages"
+        )
+    crawl_traps = stats["crawl_traps"]
+    if crawl_traps is not None and any(crawl_traps["links_rejected"].values()):
+        print(
+            f"Crawl traps: {sum(crawl_traps['links_rejected'].values())} links not queued, {len(crawl_traps['quarantined'])} branches quarantined"
+        )
+        for branch, reason in crawl_traps["quarantined"].items():
+            print(f"  {branch}: {reason}")
+    if args.recrawl_cache:
+        print(f"Pages not modified since the previous run: {stats['pages_not_modified']}")
+    if stats["links_disallowed_by_robots"]:
+        print(f"Links disallowed by robots.txt: {stats['links_disallowed_by_robots']}")
+    if args.http_first:
+        nb_fetched = stats["pages_without_browser"] + stats["pages_with_browser"]
+        print(
+            f"Pages served without browser: {stats['pages_without_browser']}/{nb_fetched} "
+            f"({stats['pages_without_browser'] / max(nb_fetched, 1):.0%}), escalations: {stats['browser_escalations']}"
+        )
+    if stats["resource_blocking"]:
+        blocking = stats["resource_blocking"]
+        print(
+            f"Blocked requests: {blocking['blocked_requests']} {blocking['blocked_by_type']}, "
+            f"~{blocking['estimated_bytes_saved_per_page'] // 1000} KB saved per page"
+        )
+    if stats["resource_cache"]:
+        resource_cache_stats = stats["resource_cache"]
+        print(
+            f"Resource cache: {resource_cache_stats['hit_rate']:.0%} hit rate over {resource_cache_stats['requests']} requests "
+            f"({resource_cache_stats['revalidated']} revalidated), {resource_cache_stats['bytes_saved'] // 1000} KB saved, "
+            f"{resource_cache_stats['size_bytes'] // 1_000_000} MB on disk"
+        )
+    print("\nHosts:")
+    for host, host_stats in stats["hosts"].items():
+        print(
+            f"  {host}: {host_stats['pages_per_second']} pages/s, limit {host_stats['limit']} "
+            f"(history {host_stats['limit_history'][-5:]}), {host_stats['errors']} errors, {host_stats['throttled']} throttled"
+        )
+    print("\nTime per stage:")
+    for stage, stage_stats in stats["metrics"]["stage_seconds"].items():
+        print(
+            f"  {stage}: {stage_stats['count']} times, {stage_stats['sum']:.1f}s in total, "
+            f"mean {stage_stats['mean']:.3f}s, p90 {stage_stats['p90']:.3f}s"
+        )
+    if args.metrics_json:
+        Path(args.metrics_json).write_text(crawler.metrics.to_json())
+    if args.metrics_prometheus:
+        Path(args.metrics_prometheus).write_text(
+            crawler.metrics.to_prometheus(labels={"domain": crawler.domain})
+        )
+    if args.select_urls:
+        link_graph = stats["link_graph"]
+        print(
+            f"\nRepresentative URLs ({link_graph['nodes']} pages, {link_graph['edges']} links in the graph):"
+        )
+        for url in crawler.select_urls(args.select_urls):
+            print(f"  {url}")
     print("\nDepth distribution:")
     for depth, count in sorted(stats["depth_distribution"].items()):
         print(f"  Level {depth}: {count} pages")
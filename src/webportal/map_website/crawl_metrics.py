@@ -0,0 +1,236 @@
+"""
+Instrumentation of the crawler: where the crawl time goes.
+
+Each stage of the crawl of a page (static fetch, navigation, cookie banner handling, settle wait,
+link extraction, template matching, near-duplicate check) is timed into a histogram with fixed buckets, along with the
+total time per page. Counters track pages by fetch kind, errors and timeouts by stage and links
+found, and the depth of the frontier is sampled over time.
+
+The metrics are exported as JSON (job artifact) and in the Prometheus text format.
+"""
+
+import heapq
+import json
+import time
+from bisect import bisect_left
+from collections import Counter
+from collections.abc import Iterator
+from contextlib import contextmanager
+
+STAGES = (
+    "static_fetch",
+    "navigation",
+    "cookie_handling",
+    "settle_wait",
+    "link_extraction",
+    "template_matching",
+    "near_duplicate_check",
+    "page",
+)
+# Upper bounds of the buckets, in seconds: navigation and settle waits time out at 15s and 10s at most
+SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 15, 30, 60)
+LINKS_BUCKETS = (0, 5, 10, 25, 50, 100, 250, 500, 1000, 2500)
+QUEUE_DEPTH_SAMPLE_SECONDS = 1.0
+# Samples are thinned out (and the interval doubled) beyond this number
+MAX_QUEUE_DEPTH_SAMPLES = 3600
+NB_TOP_PAGES = 10
+PROMETHEUS_PREFIX = "webportal_crawl"
+
+
+def is_timeout(error: BaseException) -> bool:
+    """asyncio, Playwright and httpx timeouts"""
+    name = type(error).__name__
+    return isinstance(error, TimeoutError) or name == "TimeoutError" or name.endswith("Timeout")
+
+
+def _escape_label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class Histogram:
+    def __init__(self, buckets: tuple[float, ...]):
+        self.buckets = buckets
+        # The last count is for the values above the highest bucket
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def quantile(self, q: float) -> float | None:
+        """Estimate, interpolating linearly within the bucket of the quantile"""
+        if not self.count:
+            return None
+        rank = q * self.count
+        cumulative = 0
+        for index, count in enumerate(self.counts):
+            if count and cumulative + count >= rank:
+                lower = self.buckets[index - 1] if index > 0 else 0.0
+                upper = self.buckets[index] if index < len(self.buckets) else self.max
+                return lower + (upper - lower) * (rank - cumulative) / count
+            cumulative += count
+        return self.max
+
+    def to_dict(self) -> dict:
+        return {
+            "count": self.count,
+            "sum": round(self.sum, 6),
+            "mean": round(self.sum / self.count, 6) if self.count else None,
+            "max": round(self.max, 6),
+            **{
+                f"p{round(q * 100)}": (
+                    round(value, 6) if (value := self.quantile(q)) is not None else None
+                )
+                for q in (0.5, 0.9, 0.99)
+            },
+            "buckets": dict(zip([*map(str, self.buckets), "+Inf"], self.counts)),
+        }
+
+
+class CrawlMetrics:
+    def __init__(self):
+        self.started = time.monotonic()
+        self.stages = {stage: Histogram(SECONDS_BUCKETS) for stage in STAGES}
+        self.links_per_page = Histogram(LINKS_BUCKETS)
+        # (name, kind) -> count, e.g. ("errors", "navigation")
+        self.counters: Counter[tuple[str, str]] = Counter()
+        self.queue_depth: list[tuple[float, int]] = []
+        self.queue_depth_interval = QUEUE_DEPTH_SAMPLE_SECONDS
+        # Min-heap of the pages with the most links
+        self.top_pages: list[tuple[int, str]] = []
+
+    def observe(self, stage: str, seconds: float):
+        self.stages[stage].observe(seconds)
+
+    @contextmanager
+    def time(self, stage: str) -> Iterator[None]:
+        """Time a stage, counting the errors and timeouts raised in it"""
+        started = time.perf_counter()
+        try:
+            yield
+        except Exception as e:
+            self.record_error(stage, e)
+            raise
+        finally:
+            self.stages[stage].observe(time.perf_counter() - started)
+
+    def count(self, name: str, kind: str = "", value: int = 1):
+        self.counters[name, kind] += value
+
+    def record_error(self, stage: str, error: BaseException | None = None, timeout: bool = False):
+        self.count("errors", stage)
+        if timeout or (error is not None and is_timeout(error)):
+            self.count("timeouts", stage)
+
+    def record_page(self, url: str, fetch: str, nb_links: int):
+        """A page whose links were extracted, `fetch` being how: browser, static or not_modified"""
+        self.count("pages", fetch)
+        self.count("links", value=nb_links)
+        self.links_per_page.observe(nb_links)
+        if len(self.top_pages) < NB_TOP_PAGES:
+            heapq.heappush(self.top_pages, (nb_links, url))
+        elif nb_links > self.top_pages[0][0]:
+            heapq.heapreplace(self.top_pages, (nb_links, url))
+
+    def sample_queue_depth(self, depth: int):
+        elapsed = time.monotonic() - self.started
+        if self.queue_depth and elapsed - self.queue_depth[-1][0] < self.queue_depth_interval:
+            return
+        self.queue_depth.append((round(elapsed, 3), depth))
+        if len(self.queue_depth) > MAX_QUEUE_DEPTH_SAMPLES:
+            self.queue_depth = self.queue_depth[::2]
+            self.queue_depth_interval *= 2
+
+    def total(self, name: str) -> int:
+        return sum(count for (counter, _), count in self.counters.items() if counter == name)
+
+    def pages_with_most_links(self) -> list[tuple[str, int]]:
+        return [(url, nb_links) for nb_links, url in sorted(self.top_pages, reverse=True)]
+
+    def to_dict(self) -> dict:
+        elapsed = time.monotonic() - self.started
+        counters: dict[str, dict[str, int] | int] = {}
+        for (name, kind), count in sorted(self.counters.items()):
+            if kind:
+                counters.setdefault(name, {})[kind] = count
+            else:
+                counters[name] = count
+        return {
+            "elapsed_seconds": round(elapsed, 3),
+            "pages_per_second": round(self.total("pages") / elapsed, 3) if elapsed else 0.0,
+            "stage_seconds": {
+                stage: histogram.to_dict()
+                for stage, histogram in self.stages.items()
+                if histogram.count
+            },
+            "links_per_page": self.links_per_page.to_dict(),
+            "counters": counters,
+            "pages_with_most_links": self.pages_with_most_links(),
+            "queue_depth": self.queue_depth,
+        }
+
+    def to_json(self) -> str:
+        return json.dumps(self.to_dict(), indent=2)
+
+    def to_prometheus(
+        self, labels: dict[str, str] | None = None, prefix: str = PROMETHEUS_PREFIX
+    ) -> str:
+        """Metrics in the Prometheus text exposition format, e.g. for a pushgateway"""
+        base_labels = labels or {}
+        lines = []
+
+        def format_labels(extra: dict[str, str]) -> str:
+            all_labels = {**base_labels, **extra}
+            if not all_labels:
+                return ""
+            values = ",".join(
+                f'{key}="{_escape_label(value)}"' for key, value in all_labels.items()
+            )
+            return "{" + values + "}"
+
+        def add_histogram(name: str, histogram: Histogram, extra: dict[str, str]):
+            cumulative = 0
+            for bound, count in zip([*map(str, histogram.buckets), "+Inf"], histogram.counts):
+                cumulative += count
+                lines.append(f"{name}_bucket{format_labels({**extra, 'le': bound})} {cumulative}")
+            lines.append(f"{name}_sum{format_labels(extra)} {histogram.sum}")
+            lines.append(f"{name}_count{format_labels(extra)} {histogram.count}")
+
+        name = f"{prefix}_stage_seconds"
+        lines += [
+            f"# HELP {name} Time spent in each stage of the crawl of a page",
+            f"# TYPE {name} histogram",
+        ]
+        for stage, histogram in self.stages.items():
+            add_histogram(name, histogram, {"stage": stage})
+
+        name = f"{prefix}_links_per_page"
+        lines += [
+            f"# HELP {name} Links found on each crawled page",
+            f"# TYPE {name} histogram",
+        ]
+        add_histogram(name, self.links_per_page, {})
+
+        label_names = {"pages": "fetch", "errors": "stage", "timeouts": "stage"}
+        for counter in sorted({counter for counter, _ in self.counters}):
+            name = f"{prefix}_{counter}_total"
+            lines.append(f"# TYPE {name} counter")
+            for (other, kind), count in sorted(self.counters.items()):
+                if other == counter:
+                    extra = {label_names.get(counter, "kind"): kind} if kind else {}
+                    lines.append(f"{name}{format_labels(extra)} {count}")
+
+        name = f"{prefix}_queue_depth"
+        lines += [f"# TYPE {name} gauge"]
+        lines.append(
+            f"{name}{format_labels({})} {self.queue_depth[-1][1] if self.queue_depth else 0}"
+        )
+        name = f"{prefix}_elapsed_seconds"
+        lines += [f"# TYPE {name} gauge"]
+        lines.append(f"{name}{format_labels({})} {time.monotonic() - self.started}")
+        return "\n".join(lines) + "\n"
@@ -0,0 +1,139 @@
+"""
+Crawl-trap detection for the frontier: branches of a site generating URLs without end.
+
+The crawler only queues URLs matching no template, so the traps left are the ones creating new
+path shapes at every step:
+- ever deeper paths, e.g. relative links resolved against themselves
+- repeated segment cycles, e.g. /a/b/a/b/...
+- templates whose pages keep linking to new shapes, e.g. faceted filters encoded in paths
+- numbers increasing from one URL to the next in segments the templates do not generalize,
+  e.g. /archive/week-12, /archive/week-13...
+
+Cycles and increasing numbers quarantine their branch: no URL of it is queued anymore. Deep paths
+are refused and fan-out is capped per template. The reason of each quarantine is logged once.
+"""
+
+import re
+from collections import Counter
+from collections.abc import Hashable
+from urllib.parse import urlparse
+
+# Segments in the path of a URL
+MAX_PATH_DEPTH = 15
+# Occurrences of the same segment in a path
+MAX_SEGMENT_REPEATS = 2
+# Longest sequence of segments looked for as an immediately repeated cycle
+MAX_CYCLE_LENGTH = 3
+# URLs queued from the pages of one template
+MAX_LINKS_PER_TEMPLATE = 500
+# Consecutive URLs of the same shape with increasing numbers
+MAX_INCREASING_RUN = 20
+
+NUMBER_PATTERN = re.compile(r"\d+")
+
+TRAP_KINDS = ("depth", "cycle", "fan_out", "increasing_numbers")
+
+
+class TrapDetector:
+    def __init__(
+        self,
+        max_path_depth: int = MAX_PATH_DEPTH,
+        max_links_per_template: int = MAX_LINKS_PER_TEMPLATE,
+        max_increasing_run: int = MAX_INCREASING_RUN,
+    ):
+        self.max_path_depth = max_path_depth
+        self.max_links_per_template = max_links_per_template
+        self.max_increasing_run = max_increasing_run
+        # Branch (URL prefix or numeric shape) -> why it is quarantined
+        self.quarantined: dict[str, str] = {}
+        self.links_per_template: Counter[Hashable] = Counter()
+        self.capped_templates: set[Hashable] = set()
+        # Numeric shape, e.g. "a.com/archive/week-#" -> (last numbers, length of the increasing run)
+        self._numeric_runs: dict[str, tuple[tuple[int, ...], int]] = {}
+        self.nb_rejected: Counter[str] = Counter()
+
+    def check(self, url: str, source_template: Hashable | None = None) -> str | None:
+        """Why a URL found on a page of `source_template` must not be queued, None if it can be.
+
+        URLs which can be queued are counted towards the fan-out and numeric runs.
+        """
+        kind, reason = self._find_trap(url, source_template)
+        if kind is not None:
+            self.nb_rejected[kind] += 1
+            return reason
+        if source_template is not None:
+            self.links_per_template[source_template] += 1
+        return None
+
+    def _find_trap(
+        self, url: str, source_template: Hashable | None
+    ) -> tuple[str | None, str | None]:
+        parsed = urlparse(url)
+        segments = [segment for segment in parsed.path.split("/") if segment]
+        prefix = parsed.netloc
+        for segment in segments:
+            prefix += "/" + segment
+            reason = self.quarantined.get(prefix)
+            if reason is not None:
+                return "cycle", reason
+
+        if len(segments) > self.max_path_depth:
+            return "depth", f"path deeper than {self.max_path_depth} segments"
+
+        cycle_end = self._cycle_end(segments)
+        if cycle_end is not None:
+            branch = parsed.netloc + "/" + "/".join(segments[:cycle_end])
+            return "cycle", self._quarantine(branch, "repeated path segments")
+
+        if source_template is not None:
+            if source_template in self.capped_templates:
+                return "fan_out", "template fan-out capped"
+            if self.links_per_template[source_template] >= self.max_links_per_template:
+                self.capped_templates.add(source_template)
+                print(
+                    f"Crawl trap: pages of the template of {url} linked to {self.max_links_per_template} new pages, not following more"
+                )
+                return "fan_out", "template fan-out capped"
+
+        path = parsed.path.rstrip("/")
+        numbers = tuple(int(number) for number in NUMBER_PATTERN.findall(path))
+        if numbers:
+            shape = parsed.netloc + NUMBER_PATTERN.sub("#", path)
+            reason = self.quarantined.get(shape)
+            if reason is not None:
+                return "increasing_numbers", reason
+            last_numbers, run = self._numeric_runs.get(shape, ((), 0))
+            run = run + 1 if numbers > last_numbers else 1
+            self._numeric_runs[shape] = (numbers, run)
+            if run >= self.max_increasing_run:
+                return "increasing_numbers", self._quarantine(
+                    shape, f"numbers increasing over {run} URLs"
+                )
+        return None, None
+
+    def _quarantine(self, branch: str, reason: str) -> str:
+        self.quarantined[branch] = reason
+        print(f"Crawl trap: {reason}, quarantining {branch}")
+        return reason
+
+    @staticmethod
+    def _cycle_end(segments: list[str]) -> int | None:
+        """Number of segments up to the first repetition of a cycle, None if there is none"""
+        counts: Counter[str] = Counter()
+        for index, segment in enumerate(segments):
+            counts[segment] += 1
+            if counts[segment] > MAX_SEGMENT_REPEATS:
+                return index + 1
+            # Sequences of 2 or more segments repeated right after themselves
+            for length in range(2, MAX_CYCLE_LENGTH + 1):
+                start = index + 1 - 2 * length
+                if start >= 0 and segments[start : start + length] == segments[start + length : index + 1]:
+                    return index + 1
+        return None
+
+    def to_dict(self) -> dict:
+        return {
+            "links_rejected": {kind: self.nb_rejected[kind] for kind in TRAP_KINDS},
+            "quarantined": dict(self.quarantined),
+            "capped_templates": len(self.capped_templates),
+        }
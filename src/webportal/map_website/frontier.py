@@ -0,0 +1,89 @@
+"""
+Priority frontier for the crawler.
+
+The pages budget is spent on the URLs most likely to reveal new templates first: URLs whose template
+(as matched by the crawler's `TemplateIndex`), shape (host, section and number of segments) and
+section were rarely visited so far, and shallow URLs. Queued URLs match no template when they are
+found, and fall into templates as these generalize: the template of a URL is looked up again when
+its score is refreshed.
+Visit counts grow while URLs wait in the queue, so scores are refreshed lazily when URLs are popped:
+as scores mostly increase, a popped URL whose refreshed score is still the lowest is the best candidate.
+"""
+
+import asyncio
+import heapq
+import itertools
+from collections import Counter
+from collections.abc import Callable, Hashable
+from urllib.parse import urlparse
+
+TEMPLATE_VISIT_WEIGHT = 2.0
+SHAPE_VISIT_WEIGHT = 2.0
+SECTION_VISIT_WEIGHT = 1.0
+DEPTH_WEIGHT = 1.0
+
+
+def url_keys(url: str) -> tuple[tuple, tuple]:
+    """(section, shape) of a URL, e.g. ("example.com", "news") and ("example.com", "news", 3)"""
+    parsed = urlparse(url)
+    segments = [segment for segment in parsed.path.split("/") if segment]
+    section = (parsed.netloc, segments[0] if segments else "")
+    return section, (*section, len(segments))
+
+
+class PriorityFrontier(asyncio.Queue):
+    """Queue of (url, depth) items, returning the most promising URL first.
+
+    `template_of` returns the template a URL belongs to, None if it matches no template.
+    """
+
+    def __init__(
+        self,
+        template_of: Callable[[str], Hashable | None] | None = None,
+        maxsize: int = 0,
+    ):
+        self.template_of = template_of
+        super().__init__(maxsize)
+
+    def _init(self, maxsize):
+        self._queue = []
+        self._counter = itertools.count()
+        self.section_visits: Counter[tuple] = Counter()
+        self.shape_visits: Counter[tuple] = Counter()
+        self.template_visits: Counter[Hashable] = Counter()
+
+    def _template(self, url: str) -> Hashable | None:
+        return self.template_of(url) if self.template_of is not None else None
+
+    def score(self, section: tuple, shape: tuple, template: Hashable | None, depth: int) -> float:
+        """Lower is better"""
+        return (
+            (TEMPLATE_VISIT_WEIGHT * self.template_visits[template] if template is not None else 0.0)
+            + SHAPE_VISIT_WEIGHT * self.shape_visits[shape]
+            + SECTION_VISIT_WEIGHT * self.section_visits[section]
+            + DEPTH_WEIGHT * depth
+        )
+
+    def _put(self, item):
+        url, depth = item
+        section, shape = url_keys(url)
+        score = self.score(section, shape, self._template(url), depth)
+        heapq.heappush(
+            self._queue, (score, next(self._counter), url, depth, section, shape)
+        )
+
+    def _get(self):
+        while True:
+            entry = heapq.heappop(self._queue)
+            _, order, url, depth, section, shape = entry
+            template = self._template(url)
+            score = self.score(section, shape, template, depth)
+            if not self._queue or score <= self._queue[0][0]:
+                break
+            heapq.heappush(self._queue, (score, order, url, depth, section, shape))
+        # Counted when handed to a worker, so that concurrent workers spread over sections
+        self.section_visits[section] += 1
+        self.shape_visits[shape] += 1
+        if template is not None:
+            self.template_visits[template] += 1
+        return url, depth
@@ -0,0 +1,234 @@
+"""
+Per-host politeness and adaptive concurrency for the crawler.
+
+Each host gets its own concurrency limit, adapted AIMD-style (like TCP congestion control): every fast
+response adds 1/limit (about +1 per round of `limit` requests), while errors, timeouts and responses
+much slower than the fastest latency seen on the host divide it. 429/503 responses also pause the
+host, for the Retry-After delay or an exponential backoff, and a Crawl-delay spaces request starts.
+
+The durations of the browser stages (navigation, waiting for the page to settle) are sampled per host:
+their timeouts are a multiple of a high percentile of the recent durations, under the default
+timeouts. Timed-out waits are sampled at the timeout, so the timeouts of hosts getting slower grow back.
+"""
+
+import asyncio
+import time
+from collections import deque
+from email.utils import parsedate_to_datetime
+
+INITIAL_HOST_LIMIT = 2.0
+MIN_HOST_LIMIT = 1.0
+# Multiplicative decreases, on errors and on slow responses
+ERROR_DECREASE_FACTOR = 0.5
+SLOW_DECREASE_FACTOR = 0.75
+# A response is slow when its latency is this many times the host's baseline latency
+SLOW_LATENCY_FACTOR = 3.0
+LATENCY_EWMA_ALPHA = 0.2
+
+THROTTLE_STATUS_CODES = {429, 503}
+MIN_BACKOFF_SECONDS = 1.0
+MAX_BACKOFF_SECONDS = 120.0
+
+LIMIT_HISTORY_SIZE = 100
+
+# Recent durations per host and stage the timeouts are computed from
+WAIT_SAMPLES_SIZE = 50
+MIN_WAIT_SAMPLES = 5
+TIMEOUT_PERCENTILE = 0.95
+TIMEOUT_FACTOR = 3.0
+MIN_TIMEOUT_SECONDS = 2.0
+
+
+def percentile(values: list[float], fraction: float) -> float:
+    """Nearest-rank percentile of non-empty values"""
+    ordered = sorted(values)
+    return ordered[min(int(fraction * len(ordered)), len(ordered) - 1)]
+
+
+def parse_retry_after(value: str | None) -> float | None:
+    """Delay in seconds of a Retry-After header, in seconds or as an HTTP date"""
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+class HostState:
+    def __init__(self, limit: float, started: float):
+        self.limit = limit
+        self.in_flight = 0
+        self.condition = asyncio.Condition()
+        # Earliest start of the next request, for the Crawl-delay and the backoff
+        self.next_start = 0.0
+        self.backoff_until = 0.0
+        self.crawl_delay = 0.0
+        self.consecutive_throttles = 0
+        # Decreases are applied at most once per latency, not once per in-flight response
+        self.last_decrease = 0.0
+        self.latency_ewma: float | None = None
+        self.baseline_latency: float | None = None
+        self.nb_responses = 0
+        self.nb_errors = 0
+        self.nb_throttled = 0
+        self.started = started
+        # (seconds since the first request, limit)
+        self.limit_history: deque[tuple[float, float]] = deque(
+            [(0.0, limit)], maxlen=LIMIT_HISTORY_SIZE
+        )
+        # Stage -> recent durations in seconds
+        self.wait_samples: dict[str, deque[float]] = {}
+
+
+class HostScheduler:
+    def __init__(
+        self,
+        max_host_limit: int = 10,
+        initial_host_limit: float = INITIAL_HOST_LIMIT,
+    ):
+        self.max_host_limit = max_host_limit
+        self.initial_host_limit = min(initial_host_limit, max_host_limit)
+        self.hosts: dict[str, HostState] = {}
+
+    def _state(self, host: str) -> HostState:
+        state = self.hosts.get(host)
+        if state is None:
+            state = self.hosts[host] = HostState(
+                self.initial_host_limit, time.monotonic()
+            )
+        return state
+
+    def set_crawl_delay(self, host: str, delay: float):
+        """Space the requests to a host by `delay` seconds, one at a time"""
+        state = self._state(host)
+        state.crawl_delay = delay
+        if delay > 0:
+            self._set_limit(state, MIN_HOST_LIMIT)
+
+    async def acquire(self, host: str):
+        """Wait for a request slot on this host"""
+        state = self._state(host)
+        async with state.condition:
+            while True:
+                wait = max(state.next_start, state.backoff_until) - time.monotonic()
+                if wait <= 0 and state.in_flight < int(state.limit):
+                    break
+                if wait > 0:
+                    try:
+                        await asyncio.wait_for(state.condition.wait(), wait)
+                    except TimeoutError:
+                        pass
+                else:
+                    await state.condition.wait()
+            state.in_flight += 1
+            if state.crawl_delay:
+                state.next_start = time.monotonic() + state.crawl_delay
+
+    async def release(self, host: str):
+        state = self._state(host)
+        async with state.condition:
+            state.in_flight -= 1
+            state.condition.notify_all()
+
+    def record(
+        self,
+        host: str,
+        latency: float,
+        status: int | None,
+        retry_after: str | None = None,
+    ):
+        """Adapt the limit of a host to a response, `status` is None for errors and timeouts"""
+        state = self._state(host)
+        now = time.monotonic()
+        state.nb_responses += 1
+
+        if status in THROTTLE_STATUS_CODES:
+            state.nb_throttled += 1
+            state.consecutive_throttles += 1
+            delay = parse_retry_after(retry_after)
+            if delay is None:
+                delay = MIN_BACKOFF_SECONDS * 2 ** (state.consecutive_throttles - 1)
+            state.backoff_until = max(
+                state.backoff_until, now + min(delay, MAX_BACKOFF_SECONDS)
+            )
+            self._decrease(state, ERROR_DECREASE_FACTOR, now)
+            return
+        state.consecutive_throttles = 0
+
+        if status is None or status >= 500:
+            state.nb_errors += 1
+            self._decrease(state, ERROR_DECREASE_FACTOR, now)
+            return
+
+        state.latency_ewma = (
+            latency
+            if state.latency_ewma is None
+            else LATENCY_EWMA_ALPHA * latency
+            + (1 - LATENCY_EWMA_ALPHA) * state.latency_ewma
+        )
+        if state.baseline_latency is None or state.latency_ewma < state.baseline_latency:
+            state.baseline_latency = state.latency_ewma
+
+        if latency > SLOW_LATENCY_FACTOR * state.baseline_latency:
+            self._decrease(state, SLOW_DECREASE_FACTOR, now)
+        elif not state.crawl_delay:
+            self._set_limit(state, state.limit + 1 / state.limit)
+
+    def record_wait(self, host: str, stage: str, seconds: float):
+        """Sample the duration of a browser stage on a host, timed-out waits included"""
+        samples = self._state(host).wait_samples.setdefault(
+            stage, deque(maxlen=WAIT_SAMPLES_SIZE)
+        )
+        samples.append(seconds)
+
+    def timeout(self, host: str, stage: str, default: float) -> float:
+        """Timeout in seconds of a browser stage on a host, `default` until enough samples"""
+        samples = self._state(host).wait_samples.get(stage)
+        if not samples or len(samples) < MIN_WAIT_SAMPLES:
+            return default
+        timeout = TIMEOUT_FACTOR * percentile(list(samples), TIMEOUT_PERCENTILE)
+        return min(max(timeout, MIN_TIMEOUT_SECONDS), default)
+
+    def _decrease(self, state: HostState, factor: float, now: float):
+        if now - state.last_decrease < (state.latency_ewma or 0.0):
+            return
+        state.last_decrease = now
+        self._set_limit(state, state.limit * factor)
+
+    def _set_limit(self, state: HostState, limit: float):
+        limit = min(max(limit, MIN_HOST_LIMIT), self.max_host_limit)
+        if int(limit) != int(state.limit):
+            state.limit_history.append(
+                (round(time.monotonic() - state.started, 3), int(limit))
+            )
+        # Waiting requests see new slots when the request that was recorded is released
+        state.limit = limit
+
+    def get_statistics(self) -> dict[str, dict]:
+        now = time.monotonic()
+        return {
+            host: {
+                "limit": int(state.limit),
+                "responses": state.nb_responses,
+                "errors": state.nb_errors,
+                "throttled": state.nb_throttled,
+                "crawl_delay": state.crawl_delay,
+                "latency_ewma": (
+                    round(state.latency_ewma, 3) if state.latency_ewma is not None else None
+                ),
+                "pages_per_second": round(
+                    state.nb_responses / max(now - state.started, 1e-6), 2
+                ),
+                "limit_history": list(state.limit_history),
+                "wait_p95": {
+                    stage: round(percentile(list(samples), TIMEOUT_PERCENTILE), 3)
+                    for stage, samples in state.wait_samples.items()
+                },
+            }
+            for host, state in self.hosts.items()
+        }
@@ -0,0 +1,124 @@
+"""
+In-page scripts extracting the links of a rendered page.
+
+`EXTRACT_LINKS_SCRIPT` returns every link found in the DOM, filtered by the crawler in Python.
+`EXTRACT_CANDIDATE_LINKS_SCRIPT` does that filtering in the page: links to other domains, static
+assets and duplicates once fragments are stripped never cross the CDP boundary. Query strings are
+kept for the robots.txt rules matching them, the crawler strips them after the check.
+On catalog pages with thousands of anchors, this is most of the serialized links and most of the
+`urlparse` calls of the crawler. Both scripts share the rules of `is_static_asset` below.
+"""
+
+from urllib.parse import urlparse
+
+STATIC_EXTENSIONS = (
+    ".css",
+    ".js",
+    ".png",
+    ".jpg",
+    ".jpeg",
+    ".gif",
+    ".svg",
+    ".ico",
+    ".pdf",
+    ".zip",
+    ".tar",
+    ".gz",
+    ".mp4",
+    ".mp3",
+    ".webm",
+    ".woff",
+    ".woff2",
+    ".ttf",
+    ".eot",
+    ".xml",
+    ".json",
+    ".txt",
+    ".webmanifest",
+)
+# Common static asset paths
+STATIC_PATHS = (
+    "/static/",
+    "/assets/",
+    "/css/",
+    "/js/",
+    "/images/",
+    "/img/",
+    "/fonts/",
+)
+
+
+def is_static_asset(url: str) -> bool:
+    """Check if URL points to a static asset that shouldn't be crawled"""
+    path = urlparse(url).path.lower()
+    return path.endswith(STATIC_EXTENSIONS) or any(
+        static_path in path for static_path in STATIC_PATHS
+    )
+
+
+# Collects the links of the page into the `links` set
+_COLLECT_LINKS = """
+    const links = new Set();
+    const addLink = (href) => {
+        try {
+            links.add(new URL(href, window.location.href).href);
+        } catch (e) {
+            // Invalid URL
+        }
+    };
+    // Get all anchor tags
+    document.querySelectorAll('a[href]').forEach(a => {
+        links.add(a.href);
+    });
+    // Get links from JavaScript navigation elements
+    document.querySelectorAll('[onclick], [data-href], [data-url]').forEach(el => {
+        const onclick = el.getAttribute('onclick');
+        if (onclick) {
+            const match = onclick.match(/(?:location\\.href|window\\.location|navigate)\\s*=\\s*['"]([^'"]+)['"]/);
+            if (match) addLink(match[1]);
+        }
+        const dataHref = el.getAttribute('data-href') || el.getAttribute('data-url');
+        if (dataHref) addLink(dataHref);
+    });
+    // Get router links (React, Vue, etc)
+    document.querySelectorAll('[to], [href^="/"], [href^="./"], [href^="../"]').forEach(el => {
+        const href = el.getAttribute('to') || el.getAttribute('href');
+        if (href) addLink(href);
+    });
+"""
+
+EXTRACT_LINKS_SCRIPT = f"""
+() => {{
+{_COLLECT_LINKS}
+    return Array.from(links);
+}}
+"""
+
+# Same rules as `FastJSCrawler.is_same_domain_or_subdomain` and `is_static_asset`, applied to the
+# netloc: links with credentials, e.g. https://user@example.com/, are dropped like in Python.
+# Returns the number of links found, before filtering, and the candidate URLs without fragment.
+EXTRACT_CANDIDATE_LINKS_SCRIPT = f"""
+([domain, staticExtensions, staticPaths]) => {{
+{_COLLECT_LINKS}
+    const isSameSite = (host) =>
+        host === domain
+        || host.endsWith('.' + domain)
+        || (host.startsWith('www.') && host.slice(4) === domain)
+        || (domain.startsWith('www.') && host === domain.slice(4));
+    const candidates = new Set();
+    for (const link of links) {{
+        let url;
+        try {{
+            url = new URL(link);
+        }} catch (e) {{
+            continue;
+        }}
+        if (url.username || url.password || !isSameSite(url.host)) continue;
+        const path = url.pathname.toLowerCase();
+        if (staticExtensions.some(ext => path.endsWith(ext))) continue;
+        if (staticPaths.some(staticPath => path.includes(staticPath))) continue;
+        candidates.add(url.protocol + '//' + url.host + url.pathname + url.search);
+    }}
+    return {{total: links.size, links: Array.from(candidates)}};
+}}
+"""
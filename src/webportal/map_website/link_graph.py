@@ -0,0 +1,143 @@
+"""
+Link graph of the crawled pages, and a deterministic selection of representative URLs.
+
+Each URL gets an integer node ID; the edges found on each page are appended to two `array`s, turned
+into CSR adjacency arrays (offsets and targets) for the ranking. Pages are ranked by PageRank, and
+picked round-robin over their templates: the best page of every template first, then the second
+best, and so on. Only crawled pages are picked: the other nodes are link targets, which may be
+missing or disallowed by robots.txt. This selects URLs for ingestion without any LLM call.
+"""
+
+from array import array
+from collections.abc import Callable, Hashable, Iterable
+
+PAGERANK_DAMPING = 0.85
+PAGERANK_MAX_ITERATIONS = 100
+PAGERANK_TOLERANCE = 1e-8
+
+
+class LinkGraph:
+    def __init__(self):
+        self.node_ids: dict[str, int] = {}
+        self.urls: list[str] = []
+        # 1 for the nodes whose page was crawled, by node ID
+        self.crawled = bytearray()
+        # Edges in the order pages were crawled, see `csr()`
+        self._sources = array("I")
+        self._targets = array("I")
+        self._csr: tuple[array, array] | None = None
+
+    @property
+    def nb_nodes(self) -> int:
+        return len(self.urls)
+
+    @property
+    def nb_edges(self) -> int:
+        return len(self._targets)
+
+    def node_id(self, url: str) -> int:
+        node = self.node_ids.get(url)
+        if node is None:
+            node = self.node_ids[url] = len(self.urls)
+            self.urls.append(url)
+            self.crawled.append(0)
+        return node
+
+    def add_page(self, url: str, links: Iterable[str]):
+        """Record the links of a crawled page, without duplicates nor self-links"""
+        source = self.node_id(url)
+        self.crawled[source] = 1
+        targets = sorted({self.node_id(link) for link in links} - {source})
+        self._sources.extend([source] * len(targets))
+        self._targets.extend(targets)
+        self._csr = None
+
+    def csr(self) -> tuple[array, array]:
+        """Offsets and targets: the links of node i are targets[offsets[i]:offsets[i + 1]]"""
+        if self._csr is None:
+            offsets = array("I", [0]) * (self.nb_nodes + 1)
+            for source in self._sources:
+                offsets[source + 1] += 1
+            for node in range(self.nb_nodes):
+                offsets[node + 1] += offsets[node]
+            # Counting sort of the edges by source
+            positions = array("I", offsets[:-1])
+            targets = array("I", [0]) * self.nb_edges
+            for source, target in zip(self._sources, self._targets):
+                targets[positions[source]] = target
+                positions[source] += 1
+            self._csr = (offsets, targets)
+        return self._csr
+
+    def in_degrees(self) -> list[int]:
+        degrees = [0] * self.nb_nodes
+        for target in self._targets:
+            degrees[target] += 1
+        return degrees
+
+    def pagerank(
+        self,
+        damping: float = PAGERANK_DAMPING,
+        max_iterations: int = PAGERANK_MAX_ITERATIONS,
+        tolerance: float = PAGERANK_TOLERANCE,
+    ) -> list[float]:
+        """PageRank of each node, summing to 1. Pages not crawled have no known links: their rank
+        is spread over all nodes, like that of any dangling node."""
+        nb_nodes = self.nb_nodes
+        if not nb_nodes:
+            return []
+        offsets, targets = self.csr()
+        ranks = [1 / nb_nodes] * nb_nodes
+        for _ in range(max_iterations):
+            next_ranks = [0.0] * nb_nodes
+            dangling = 0.0
+            for node in range(nb_nodes):
+                start, end = offsets[node], offsets[node + 1]
+                if start == end:
+                    dangling += ranks[node]
+                    continue
+                share = ranks[node] / (end - start)
+                for index in range(start, end):
+                    next_ranks[targets[index]] += share
+            base = (1 - damping + damping * dangling) / nb_nodes
+            next_ranks = [base + damping * rank for rank in next_ranks]
+            delta = sum(abs(new - old) for new, old in zip(next_ranks, ranks))
+            ranks = next_ranks
+            if delta < tolerance:
+                break
+        return ranks
+
+
+def select_representative_urls(
+    graph: LinkGraph,
+    max_urls: int,
+    template_of: Callable[[str], Hashable],
+    is_candidate: Callable[[str], bool] | None = None,
+) -> list[str]:
+    """`max_urls` crawled URLs by decreasing PageRank, taking one page per template in each round"""
+    ranks = graph.pagerank()
+    # Ties are broken by discovery order, for a deterministic selection
+    order = sorted(
+        (node for node in range(graph.nb_nodes) if graph.crawled[node]),
+        key=lambda node: (-ranks[node], node),
+    )
+    pages_by_template: dict[Hashable, list[str]] = {}
+    for node in order:
+        url = graph.urls[node]
+        if is_candidate is None or is_candidate(url):
+            # Templates are ordered by their best page
+            pages_by_template.setdefault(template_of(url), []).append(url)
+
+    selected: list[str] = []
+    round_index = 0
+    while len(selected) < max_urls:
+        picks = [
+            pages[round_index]
+            for pages in pages_by_template.values()
+            if round_index < len(pages)
+        ]
+        if not picks:
+            break
+        selected += picks[: max_urls - len(selected)]
+        round_index += 1
+    return selected
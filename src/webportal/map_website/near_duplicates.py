@@ -0,0 +1,139 @@
+"""
+Near-duplicate detection of crawled pages: locale mirrors, print views, alias routes...
+
+Each page gets two 64-bit SimHash fingerprints: one of its visible text (3-word shingles), one of
+its structure (the set of tag paths of its elements, e.g. "html/body/div/ul/li/a"). A page is a
+near-duplicate of an earlier one when both fingerprints are within a few bits of those of that
+page. The crawler does not expand the links of near-duplicates: they lead to the same pages.
+
+Hamming distance queries use the pigeonhole principle: fingerprints within k bits of each other
+are equal on at least one of k + 1 blocks of bits, so text fingerprints are indexed by block.
+"""
+
+import hashlib
+import re
+from collections.abc import Iterable
+
+FINGERPRINT_BITS = 64
+DEFAULT_MAX_DISTANCE = 3
+# Pages of the same template share most of their structure, the text tells them apart
+MAX_STRUCTURE_DISTANCE = 12
+TEXT_SHINGLE_SIZE = 3
+# Pages with less text than this are not compared: empty shells would all look the same
+MIN_TEXT_SHINGLES = 20
+MAX_TEXT_LENGTH = 100_000
+# Elements whose subtree is not visible content
+IGNORED_TAGS = ("script", "style", "noscript", "template")
+
+WORD_PATTERN = re.compile(r"\w+")
+
+# Visible text and tag paths of the rendered page, the same as `tag_paths` for lxml documents
+PAGE_CONTENT_SCRIPT = """
+([maxTextLength, ignoredTags]) => {
+    const ignored = new Set(ignoredTags);
+    const tagPaths = new Set();
+    const walk = (element, path) => {
+        for (const child of element.children) {
+            const tag = child.tagName.toLowerCase();
+            if (ignored.has(tag)) continue;
+            const childPath = path + '/' + tag;
+            tagPaths.add(childPath);
+            walk(child, childPath);
+        }
+    };
+    tagPaths.add('html');
+    walk(document.documentElement, 'html');
+    const text = document.body ? document.body.innerText.slice(0, maxTextLength) : '';
+    return {text, tagPaths: Array.from(tagPaths)};
+}
+"""
+
+
+def tag_paths(root) -> list[str]:
+    """Distinct tag paths of the elements of an lxml document, from its root element"""
+    paths = {root.tag}
+    stack = [(root, root.tag)]
+    while stack:
+        element, path = stack.pop()
+        for child in element.iterchildren():
+            # Comments and processing instructions have a function as tag
+            if not isinstance(child.tag, str) or child.tag in IGNORED_TAGS:
+                continue
+            child_path = f"{path}/{child.tag}"
+            paths.add(child_path)
+            stack.append((child, child_path))
+    return list(paths)
+
+
+def text_shingles(text: str) -> list[str]:
+    words = WORD_PATTERN.findall(text[:MAX_TEXT_LENGTH].lower())
+    return [
+        " ".join(words[index : index + TEXT_SHINGLE_SIZE])
+        for index in range(len(words) - TEXT_SHINGLE_SIZE + 1)
+    ]
+
+
+def simhash(features: Iterable[str]) -> int:
+    """64-bit SimHash: bit i is set when most feature hashes have bit i set"""
+    bit_strings = [
+        format(int.from_bytes(hashlib.blake2b(feature.encode(), digest_size=8).digest()), "064b")
+        for feature in features
+    ]
+    # Transposed, each column holds one bit of every hash
+    fingerprint = 0
+    for column in zip(*bit_strings):
+        fingerprint = (fingerprint << 1) | (2 * column.count("1") > len(bit_strings))
+    return fingerprint
+
+
+def page_fingerprint(text: str, paths: Iterable[str]) -> tuple[int, int] | None:
+    """Text and structure fingerprints of a page, None if it has too little text to compare"""
+    shingles = text_shingles(text)
+    if len(shingles) < MIN_TEXT_SHINGLES:
+        return None
+    return simhash(shingles), simhash(paths)
+
+
+class NearDuplicateIndex:
+    def __init__(
+        self,
+        max_distance: int = DEFAULT_MAX_DISTANCE,
+        max_structure_distance: int = MAX_STRUCTURE_DISTANCE,
+    ):
+        self.max_distance = max_distance
+        self.max_structure_distance = max_structure_distance
+        # (shift, mask) of the k + 1 blocks of bits, the last one taking the remaining bits
+        nb_blocks = max_distance + 1
+        width = FINGERPRINT_BITS // nb_blocks
+        self._blocks = [
+            (
+                index * width,
+                (1 << (width if index < nb_blocks - 1 else FINGERPRINT_BITS - index * width)) - 1,
+            )
+            for index in range(nb_blocks)
+        ]
+        # Per block: block value -> indices in self._pages
+        self._tables: list[dict[int, list[int]]] = [{} for _ in self._blocks]
+        self._pages: list[tuple[str, int, int]] = []
+
+    def __len__(self) -> int:
+        return len(self._pages)
+
+    def find(self, fingerprint: tuple[int, int]) -> str | None:
+        """URL of an indexed page this fingerprint is a near-duplicate of, None if there is none"""
+        text_hash, structure_hash = fingerprint
+        for (shift, mask), table in zip(self._blocks, self._tables):
+            for page_index in table.get((text_hash >> shift) & mask, ()):
+                url, other_text_hash, other_structure_hash = self._pages[page_index]
+                if (text_hash ^ other_text_hash).bit_count() <= self.max_distance and (
+                    structure_hash ^ other_structure_hash
+                ).bit_count() <= self.max_structure_distance:
+                    return url
+        return None
+
+    def add(self, url: str, fingerprint: tuple[int, int]):
+        text_hash, structure_hash = fingerprint
+        page_index = len(self._pages)
+        self._pages.append((url, text_hash, structure_hash))
+        for (shift, mask), table in zip(self._blocks, self._tables):
+            table.setdefault((text_hash >> shift) & mask, []).append(page_index)
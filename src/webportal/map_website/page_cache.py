@@ -0,0 +1,144 @@
+"""
+Recrawl cache of the pages of a domain, kept across jobs.
+
+For each page whose response had validators (ETag / Last-Modified), the cache keeps them with the
+title and the raw links extracted from the page. A later crawl sends a conditional request first:
+on 304 Not Modified, the cached links are used without downloading the body or rendering the page.
+"""
+
+import json
+import sqlite3
+import time
+from collections.abc import Mapping
+from pathlib import Path
+
+from webportal.common import DATA_PATH
+
+PAGE_CACHE_FILENAME = "page_cache.sqlite"
+# Pending entries written in one transaction
+PAGE_CACHE_BATCH_SIZE = 200
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS pages (
+    url TEXT PRIMARY KEY,
+    etag TEXT,
+    last_modified TEXT,
+    title TEXT,
+    links TEXT NOT NULL,
+    fetched_at REAL NOT NULL
+);
+"""
+
+
+def validators_from_headers(headers: Mapping[str, str]) -> dict[str, str]:
+    """ETag and Last-Modified of a response, from headers with lowercase names"""
+    return {
+        name: headers[name] for name in ("etag", "last-modified") if headers.get(name)
+    }
+
+
+class CachedPage:
+    __slots__ = ("url", "etag", "last_modified", "title", "links")
+
+    def __init__(
+        self,
+        url: str,
+        etag: str | None,
+        last_modified: str | None,
+        title: str | None,
+        links: list[str],
+    ):
+        self.url = url
+        self.etag = etag
+        self.last_modified = last_modified
+        self.title = title
+        self.links = links
+
+    def conditional_headers(self) -> dict[str, str]:
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+
+class PageCache:
+    def __init__(self, path: Path):
+        self.path = path
+        self.connection: sqlite3.Connection | None = None
+        self.pending: dict[str, tuple] = {}
+        self.nb_not_modified = 0
+        self.nb_modified = 0
+
+    @classmethod
+    def for_domain(cls, domain: str) -> "PageCache":
+        """Cache in the domain's folder of the data directory, next to its jobs"""
+        return cls(DATA_PATH / domain / PAGE_CACHE_FILENAME)
+
+    def _connect(self) -> sqlite3.Connection:
+        if self.connection is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self.connection = sqlite3.connect(self.path)
+            self.connection.execute("PRAGMA synchronous = NORMAL")
+            self.connection.executescript(SCHEMA)
+        return self.connection
+
+    def get(self, url: str) -> CachedPage | None:
+        row = self.pending.get(url)
+        if row is None:
+            row = (
+                self._connect()
+                .execute(
+                    "SELECT url, etag, last_modified, title, links, fetched_at FROM pages WHERE url = ?",
+                    (url,),
+                )
+                .fetchone()
+            )
+        if row is None:
+            return None
+        return CachedPage(row[0], row[1], row[2], row[3], json.loads(row[4]))
+
+    def store(
+        self,
+        url: str,
+        validators: Mapping[str, str],
+        title: str | None,
+        links: list[str],
+    ):
+        """Cache the links of a page, if its response had validators"""
+        if not validators:
+            return
+        self.pending[url] = (
+            url,
+            validators.get("etag"),
+            validators.get("last-modified"),
+            title,
+            json.dumps(links),
+            time.time(),
+        )
+        if len(self.pending) >= PAGE_CACHE_BATCH_SIZE:
+            self.flush()
+
+    def record_revalidation(self, not_modified: bool):
+        if not_modified:
+            self.nb_not_modified += 1
+        else:
+            self.nb_modified += 1
+
+    def flush(self):
+        if not self.pending:
+            return
+        connection = self._connect()
+        with connection:
+            connection.executemany(
+                "INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?, ?, ?)",
+                self.pending.values(),
+            )
+        self.pending = {}
+
+    def close(self):
+        self.flush()
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
@@ -0,0 +1,68 @@
+"""
+Waiting for a rendered page to settle before extracting its links.
+
+`networkidle` waits for 500 ms without network requests: on sites with long-polling, analytics beacons
+or websockets it never comes and every page waits for the whole timeout. The DOM quiescence wait
+watches the document instead. The page is settled once no node was added or removed and the number
+of anchors did not change for a quiet period. Pages animating their DOM, e.g. tickers and carousels,
+are settled once their anchors are stable for a few quiet periods.
+"""
+
+from playwright.async_api import Page
+
+from webportal.map_website.crawl_metrics import is_timeout
+
+WAIT_STRATEGIES = ("dom_quiescence", "networkidle")
+DEFAULT_WAIT_STRATEGY = "dom_quiescence"
+# Defaults and upper bounds of the per-host timeouts
+NAVIGATION_TIMEOUT_SECONDS = 15.0
+SETTLE_TIMEOUT_SECONDS = 10.0
+DOM_QUIET_MS = 500
+# Quiet periods with stable anchors after which DOM mutations are ignored
+STABLE_ANCHORS_PERIODS = 4
+
+DOM_QUIESCENCE_SCRIPT = """
+([quietMs, stableAnchorsMs, timeoutMs]) => new Promise((resolve) => {
+    const started = performance.now();
+    const anchors = document.getElementsByTagName('a');
+    let nbAnchors = anchors.length;
+    let lastMutation = started;
+    let lastAnchorChange = started;
+    const observer = new MutationObserver(() => { lastMutation = performance.now(); });
+    observer.observe(document, {childList: true, subtree: true});
+    const check = () => {
+        const now = performance.now();
+        if (anchors.length !== nbAnchors) {
+            nbAnchors = anchors.length;
+            lastAnchorChange = now;
+        }
+        const anchorsStable = now - lastAnchorChange;
+        const settled = (now - lastMutation >= quietMs && anchorsStable >= quietMs)
+            || anchorsStable >= stableAnchorsMs;
+        if (settled || now - started >= timeoutMs) {
+            observer.disconnect();
+            resolve({settled, anchors: nbAnchors, elapsed: now - started});
+        } else {
+            setTimeout(check, Math.min(50, quietMs));
+        }
+    };
+    check();
+})
+"""
+
+
+async def wait_for_page_to_settle(page: Page, strategy: str, timeout: float) -> bool:
+    """Wait for the page to settle for at most `timeout` seconds, returns whether it did"""
+    if strategy == "networkidle":
+        try:
+            await page.wait_for_load_state("networkidle", timeout=timeout * 1000)
+        except Exception as e:
+            if not is_timeout(e):
+                raise
+            return False
+        return True
+    result = await page.evaluate(
+        DOM_QUIESCENCE_SCRIPT,
+        [DOM_QUIET_MS, STABLE_ANCHORS_PERIODS * DOM_QUIET_MS, timeout * 1000],
+    )
+    return result["settled"]
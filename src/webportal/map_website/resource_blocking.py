@@ -0,0 +1,152 @@
+"""
+Request blocking for the crawler's fast mode.
+
+The crawler only needs the DOM and the links of each page: images, media, fonts and requests to
+analytics/ads hosts are aborted through Playwright request routing.
+"""
+
+from collections import Counter
+
+from playwright.async_api import Page, Route
+
+BLOCKED_RESOURCE_TYPES = {"image", "media", "font"}
+
+BLOCKED_HOSTS = {
+    "google-analytics.com",
+    "googletagmanager.com",
+    "googleadservices.com",
+    "googlesyndication.com",
+    "doubleclick.net",
+    "adservice.google.com",
+    "connect.facebook.net",
+    "facebook.net",
+    "hotjar.com",
+    "clarity.ms",
+    "bat.bing.com",
+    "segment.com",
+    "segment.io",
+    "mixpanel.com",
+    "amplitude.com",
+    "newrelic.com",
+    "nr-data.net",
+    "scorecardresearch.com",
+    "quantserve.com",
+    "chartbeat.com",
+    "chartbeat.net",
+    "optimizely.com",
+    "criteo.com",
+    "criteo.net",
+    "taboola.com",
+    "outbrain.com",
+    "amazon-adsystem.com",
+    "adnxs.com",
+    "adsrvr.org",
+    "rubiconproject.com",
+    "pubmatic.com",
+}
+
+# Typical transfer sizes, used to estimate the bytes saved by blocked requests
+ESTIMATED_RESOURCE_BYTES = {
+    "image": 40_000,
+    "media": 500_000,
+    "font": 40_000,
+    "stylesheet": 20_000,
+    "script": 30_000,
+}
+DEFAULT_ESTIMATED_BYTES = 5_000
+
+
+class PageBlockingStats:
+    def __init__(self):
+        self.blocked_by_type: Counter[str] = Counter()
+        self.allowed_requests = 0
+
+    @property
+    def blocked_requests(self) -> int:
+        return sum(self.blocked_by_type.values())
+
+    @property
+    def estimated_bytes_saved(self) -> int:
+        return sum(
+            ESTIMATED_RESOURCE_BYTES.get(resource_type, DEFAULT_ESTIMATED_BYTES) * count
+            for resource_type, count in self.blocked_by_type.items()
+        )
+
+
+class ResourceBlocker:
+    def __init__(
+        self,
+        blocked_resource_types: set[str] | None = None,
+        blocked_hosts: set[str] | None = None,
+    ):
+        self.blocked_resource_types = (
+            BLOCKED_RESOURCE_TYPES
+            if blocked_resource_types is None
+            else blocked_resource_types
+        )
+        self.blocked_hosts = BLOCKED_HOSTS if blocked_hosts is None else blocked_hosts
+        self.page_stats: dict[Page, PageBlockingStats] = {}
+        self.total = PageBlockingStats()
+        self.pages_counted = 0
+
+    def is_blocked_host(self, host: str) -> bool:
+        """Check the host and each of its parent domains against the block list"""
+        host = host.lower()
+        while True:
+            if host in self.blocked_hosts:
+                return True
+            _, dot, host = host.partition(".")
+            if not dot:
+                return False
+
+    def should_block(self, resource_type: str, url: str) -> bool:
+        if resource_type in self.blocked_resource_types:
+            return True
+        host = url.split("://", 1)[-1].split("/", 1)[0].split(":", 1)[0]
+        return self.is_blocked_host(host)
+
+    async def install(self, page: Page):
+        """Route all the requests of this page through the blocker"""
+        self.page_stats[page] = PageBlockingStats()
+
+        async def handle_route(route: Route):
+            request = route.request
+            stats = self.page_stats.get(page)
+            if self.should_block(request.resource_type, request.url):
+                if stats is not None:
+                    stats.blocked_by_type[request.resource_type] += 1
+                await route.abort("blockedbyclient")
+            else:
+                if stats is not None:
+                    stats.allowed_requests += 1
+                await route.fallback()
+
+        await page.route("**/*", handle_route)
+        page.on("close", lambda _: self.page_stats.pop(page, None))
+
+    def start_page(self, page: Page):
+        """Reset the counters of a page before navigating"""
+        if page in self.page_stats:
+            self.page_stats[page] = PageBlockingStats()
+
+    def finish_page(self, page: Page) -> PageBlockingStats:
+        """Counters of the navigation that just ended, added to the totals"""
+        stats = self.page_stats.get(page, PageBlockingStats())
+        self.total.blocked_by_type.update(stats.blocked_by_type)
+        self.total.allowed_requests += stats.allowed_requests
+        self.pages_counted += 1
+        return stats
+
+    def get_statistics(self) -> dict:
+        return {
+            "pages": self.pages_counted,
+            "blocked_requests": self.total.blocked_requests,
+            "blocked_by_type": dict(self.total.blocked_by_type),
+            "allowed_requests": self.total.allowed_requests,
+            "estimated_bytes_saved": self.total.estimated_bytes_saved,
+            "estimated_bytes_saved_per_page": (
+                self.total.estimated_bytes_saved // self.pages_counted
+                if self.pages_counted
+                else 0
+            ),
+        }
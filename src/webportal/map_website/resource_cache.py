@@ -0,0 +1,329 @@
+"""
+Shared on-disk cache of the static resources of rendered pages, kept across contexts and runs.
+
+Each browser context starts with an empty HTTP cache, so without it every context downloads the
+JS/CSS bundles of the site again. The requests for scripts, stylesheets, fonts and images are routed
+through this cache: fresh entries (Cache-Control max-age, Expires, or 10% of the age given by
+Last-Modified) are served without a request, stale entries are revalidated with their ETag /
+Last-Modified. The cache is bounded in size: the least recently used entries are evicted.
+
+The route handler runs in the event loop of the crawler: its SQLite reads and writes, of bodies up
+to MAX_ENTRY_BYTES, run in worker threads, one at a time on the shared connection.
+"""
+
+import asyncio
+import json
+import sqlite3
+import threading
+import time
+from collections.abc import Mapping
+from email.utils import parsedate_to_datetime
+from pathlib import Path
+
+from playwright.async_api import Page, Route
+
+from webportal.common import DATA_PATH
+
+RESOURCE_CACHE_FILENAME = "resource_cache.sqlite"
+DEFAULT_MAX_BYTES = 500_000_000
+MAX_ENTRY_BYTES = 20_000_000
+# Eviction goes below the size limit, so that it does not run for every new entry
+EVICTION_TARGET_FRACTION = 0.9
+CACHED_RESOURCE_TYPES = {"script", "stylesheet", "font", "image"}
+# Heuristic freshness of responses with Last-Modified only, as a fraction of their age
+HEURISTIC_FRESHNESS_FRACTION = 0.1
+MAX_HEURISTIC_FRESHNESS_SECONDS = 86_400
+# Response headers not replayed: the cached body is already decoded
+DROPPED_HEADERS = {
+    "content-encoding",
+    "content-length",
+    "transfer-encoding",
+    "connection",
+    "keep-alive",
+    "set-cookie",
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS resources (
+    url TEXT PRIMARY KEY,
+    status INTEGER NOT NULL,
+    headers TEXT NOT NULL,
+    body BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    etag TEXT,
+    last_modified TEXT,
+    expires_at REAL NOT NULL,
+    last_used REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS resources_last_used ON resources (last_used);
+"""
+
+
+def _parse_http_date(value: str | None) -> float | None:
+    if not value:
+        return None
+    try:
+        return parsedate_to_datetime(value).timestamp()
+    except (TypeError, ValueError):
+        return None
+
+
+def freshness_lifetime(headers: Mapping[str, str], now: float) -> float | None:
+    """Seconds a response can be served without revalidation, None if it must not be stored"""
+    directives = {}
+    for directive in headers.get("cache-control", "").lower().split(","):
+        name, _, value = directive.strip().partition("=")
+        directives[name] = value.strip('"')
+    if "no-store" in directives:
+        return None
+    if "no-cache" in directives:
+        return 0.0
+    if "max-age" in directives:
+        try:
+            return max(float(directives["max-age"]), 0.0)
+        except ValueError:
+            return 0.0
+    date = _parse_http_date(headers.get("date")) or now
+    expires = _parse_http_date(headers.get("expires"))
+    if expires is not None:
+        return max(expires - date, 0.0)
+    last_modified = _parse_http_date(headers.get("last-modified"))
+    if last_modified is not None:
+        return min(
+            HEURISTIC_FRESHNESS_FRACTION * max(date - last_modified, 0.0),
+            MAX_HEURISTIC_FRESHNESS_SECONDS,
+        )
+    return 0.0
+
+
+class CachedResource:
+    __slots__ = ("url", "status", "headers", "body", "etag", "last_modified", "expires_at")
+
+    def __init__(
+        self,
+        url: str,
+        status: int,
+        headers: dict[str, str],
+        body: bytes,
+        etag: str | None,
+        last_modified: str | None,
+        expires_at: float,
+    ):
+        self.url = url
+        self.status = status
+        self.headers = headers
+        self.body = body
+        self.etag = etag
+        self.last_modified = last_modified
+        self.expires_at = expires_at
+
+    def is_fresh(self, now: float) -> bool:
+        return now < self.expires_at
+
+    def conditional_headers(self) -> dict[str, str]:
+        headers = {}
+        if self.etag:
+            headers["if-none-match"] = self.etag
+        if self.last_modified:
+            headers["if-modified-since"] = self.last_modified
+        return headers
+
+
+class ResourceCache:
+    def __init__(
+        self,
+        path: Path,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+        resource_types: set[str] | None = None,
+    ):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.resource_types = (
+            CACHED_RESOURCE_TYPES if resource_types is None else resource_types
+        )
+        self.connection: sqlite3.Connection | None = None
+        # The connection is used from worker threads, see `handle`
+        self._lock = threading.RLock()
+        self.total_bytes = 0
+        self.nb_hits = 0
+        self.nb_revalidated = 0
+        self.nb_misses = 0
+        self.nb_stored = 0
+        self.nb_evicted = 0
+        self.bytes_saved = 0
+        self.bytes_downloaded = 0
+
+    @classmethod
+    def in_data_directory(cls, max_bytes: int = DEFAULT_MAX_BYTES) -> "ResourceCache":
+        """Cache shared by the crawls of all domains: CDNs serve the same bundles to many sites"""
+        return cls(DATA_PATH / RESOURCE_CACHE_FILENAME, max_bytes)
+
+    def _connect(self) -> sqlite3.Connection:
+        if self.connection is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self.connection = sqlite3.connect(self.path, check_same_thread=False)
+            self.connection.execute("PRAGMA synchronous = NORMAL")
+            self.connection.executescript(SCHEMA)
+            self.total_bytes = self.connection.execute(
+                "SELECT COALESCE(SUM(size), 0) FROM resources"
+            ).fetchone()[0]
+        return self.connection
+
+    def get(self, url: str) -> CachedResource | None:
+        with self._lock:
+            row = (
+                self._connect()
+                .execute(
+                    "SELECT url, status, headers, body, etag, last_modified, expires_at FROM resources WHERE url = ?",
+                    (url,),
+                )
+                .fetchone()
+            )
+        if row is None:
+            return None
+        return CachedResource(row[0], row[1], json.loads(row[2]), row[3], row[4], row[5], row[6])
+
+    def store(self, url: str, status: int, headers: Mapping[str, str], body: bytes) -> bool:
+        """Cache a response, if it is cacheable, returns whether it was stored"""
+        now = time.time()
+        lifetime = freshness_lifetime(headers, now)
+        if status != 200 or lifetime is None or len(body) > MAX_ENTRY_BYTES:
+            return False
+        etag, last_modified = headers.get("etag"), headers.get("last-modified")
+        if not lifetime and not etag and not last_modified:
+            # Neither fresh nor revalidatable: it would never be used
+            return False
+        kept_headers = {
+            name: value for name, value in headers.items() if name not in DROPPED_HEADERS
+        }
+        with self._lock:
+            connection = self._connect()
+            with connection:
+                previous = connection.execute(
+                    "SELECT size FROM resources WHERE url = ?", (url,)
+                ).fetchone()
+                connection.execute(
+                    "INSERT OR REPLACE INTO resources VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (
+                        url,
+                        status,
+                        json.dumps(kept_headers),
+                        body,
+                        len(body),
+                        etag,
+                        last_modified,
+                        now + lifetime,
+                        now,
+                    ),
+                )
+            self.total_bytes += len(body) - (previous[0] if previous else 0)
+            self.nb_stored += 1
+            if self.total_bytes > self.max_bytes:
+                self._evict()
+        return True
+
+    def refresh(self, resource: CachedResource, headers: Mapping[str, str]):
+        """Extend the freshness of an entry revalidated by a 304 response"""
+        now = time.time()
+        lifetime = freshness_lifetime({**resource.headers, **headers}, now) or 0.0
+        resource.expires_at = now + lifetime
+        with self._lock, self._connect() as connection:
+            connection.execute(
+                "UPDATE resources SET expires_at = ?, last_used = ? WHERE url = ?",
+                (resource.expires_at, now, resource.url),
+            )
+
+    def _touch(self, url: str):
+        with self._lock, self._connect() as connection:
+            connection.execute(
+                "UPDATE resources SET last_used = ? WHERE url = ?", (time.time(), url)
+            )
+
+    def _evict(self):
+        """Delete the least recently used entries, down to a fraction of the size limit"""
+        target = EVICTION_TARGET_FRACTION * self.max_bytes
+        with self._lock:
+            connection = self._connect()
+            evicted = []
+            for url, size in connection.execute(
+                "SELECT url, size FROM resources ORDER BY last_used"
+            ).fetchall():
+                if self.total_bytes <= target:
+                    break
+                evicted.append((url,))
+                self.total_bytes -= size
+            with connection:
+                connection.executemany("DELETE FROM resources WHERE url = ?", evicted)
+            self.nb_evicted += len(evicted)
+
+    async def install(self, page: Page):
+        """Route the static resources requested by this page through the cache"""
+
+        async def handle_route(route: Route):
+            request = route.request
+            if request.method != "GET" or request.resource_type not in self.resource_types:
+                await route.fallback()
+                return
+            await self.handle(route)
+
+        await page.route("**/*", handle_route)
+
+    async def handle(self, route: Route):
+        """Serve a request from the cache, revalidating or fetching it when needed"""
+        request = route.request
+        cached = await asyncio.to_thread(self.get, request.url)
+        if cached is not None and cached.is_fresh(time.time()):
+            self.nb_hits += 1
+            self.bytes_saved += len(cached.body)
+            await asyncio.to_thread(self._touch, cached.url)
+            await route.fulfill(status=cached.status, headers=cached.headers, body=cached.body)
+            return
+
+        headers = None
+        if cached is not None and cached.conditional_headers():
+            headers = {**request.headers, **cached.conditional_headers()}
+        try:
+            response = await route.fetch(headers=headers)
+        except Exception:
+            # Let the browser make the request, and fail it, itself
+            await route.fallback()
+            return
+        if response.status == 304 and cached is not None:
+            self.nb_revalidated += 1
+            self.bytes_saved += len(cached.body)
+            await asyncio.to_thread(self.refresh, cached, response.headers)
+            await route.fulfill(status=cached.status, headers=cached.headers, body=cached.body)
+            return
+
+        self.nb_misses += 1
+        body = await response.body()
+        self.bytes_downloaded += len(body)
+        await asyncio.to_thread(
+            self.store, request.url, response.status, response.headers, body
+        )
+        await route.fulfill(response=response, body=body)
+
+    def get_statistics(self) -> dict:
+        nb_requests = self.nb_hits + self.nb_revalidated + self.nb_misses
+        return {
+            "requests": nb_requests,
+            "hits": self.nb_hits,
+            "revalidated": self.nb_revalidated,
+            "misses": self.nb_misses,
+            "hit_rate": (
+                round((self.nb_hits + self.nb_revalidated) / nb_requests, 4)
+                if nb_requests
+                else 0.0
+            ),
+            "bytes_saved": self.bytes_saved,
+            "bytes_downloaded": self.bytes_downloaded,
+            "stored": self.nb_stored,
+            "evicted": self.nb_evicted,
+            "size_bytes": self.total_bytes,
+        }
+
+    def close(self):
+        with self._lock:
+            if self.connection is not None:
+                self.connection.close()
+                self.connection = None
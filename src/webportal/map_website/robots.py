@@ -0,0 +1,225 @@
+"""
+robots.txt handling for the crawler.
+
+The robots.txt of each host is fetched once per job, and cached on disk for `ttl` seconds across jobs.
+Rules follow RFC 9309: the group of our user agent (or `*`) applies, the longest matching rule wins
+and Allow wins ties. Rules without wildcards are plain prefix checks, and the decision for each path
+is memoized, so that every extracted link can be checked.
+"""
+
+import asyncio
+import json
+import re
+import time
+from collections.abc import Callable
+from pathlib import Path
+from urllib.parse import urlparse
+
+import httpx
+
+from webportal.common import DATA_PATH
+from webportal.map_website.browser_pool import CONTEXT_OPTIONS
+
+ROBOTS_CACHE_PATH = DATA_PATH / "robots_cache"
+ROBOTS_CACHE_TTL_SECONDS = 24 * 3600
+# Product token matched against the User-agent lines, before falling back to `*`
+ROBOTS_USER_AGENT = "webportal"
+# RFC 9309: crawlers must parse at least 500 KiB
+MAX_ROBOTS_BYTES = 500 * 1024
+# Higher Crawl-delay values are capped, to keep crawls of a few hundred pages bounded
+MAX_CRAWL_DELAY_SECONDS = 30.0
+MAX_MEMOIZED_PATHS = 10_000
+
+
+class RobotsRule:
+    __slots__ = ("allow", "length", "prefix", "regex")
+
+    def __init__(self, allow: bool, pattern: str):
+        self.allow = allow
+        self.length = len(pattern)
+        if "*" in pattern or pattern.endswith("$"):
+            anchored = pattern.endswith("$")
+            parts = (pattern[:-1] if anchored else pattern).split("*")
+            self.prefix = None
+            self.regex = re.compile(
+                ".*".join(map(re.escape, parts)) + ("$" if anchored else ""), re.DOTALL
+            )
+        else:
+            self.prefix = pattern
+            self.regex = None
+
+    def matches(self, path: str) -> bool:
+        if self.prefix is not None:
+            return path.startswith(self.prefix)
+        return self.regex.match(path) is not None
+
+
+class RobotsRules:
+    def __init__(
+        self,
+        rules: list[RobotsRule] | None = None,
+        crawl_delay: float | None = None,
+        sitemaps: list[str] | None = None,
+    ):
+        # Most specific first: the first matching rule decides
+        self.rules = sorted(rules or [], key=lambda rule: (-rule.length, not rule.allow))
+        self.crawl_delay = crawl_delay
+        self.sitemaps = sitemaps or []
+        self._decisions: dict[str, bool] = {}
+
+    @classmethod
+    def parse(cls, content: str, user_agent: str = ROBOTS_USER_AGENT) -> "RobotsRules":
+        """Rules of the group of `user_agent`, or of the `*` group"""
+        groups: dict[str, list[tuple[str, str]]] = {}
+        sitemaps: list[str] = []
+        current_agents: list[str] = []
+        in_agent_lines = False
+        for line in content.splitlines():
+            key, colon, value = line.split("#", 1)[0].partition(":")
+            if not colon:
+                continue
+            key, value = key.strip().lower(), value.strip()
+            if key == "sitemap":
+                if value:
+                    sitemaps.append(value)
+            elif key == "user-agent":
+                if not in_agent_lines:
+                    current_agents = []
+                in_agent_lines = True
+                current_agents.append(value.lower())
+                groups.setdefault(value.lower(), [])
+            else:
+                in_agent_lines = False
+                for agent in current_agents:
+                    groups[agent].append((key, value))
+
+        lines = groups.get(user_agent.lower(), groups.get("*", []))
+        rules = [
+            RobotsRule(key == "allow", value)
+            for key, value in lines
+            if key in ("allow", "disallow") and value
+        ]
+        crawl_delay = None
+        for key, value in lines:
+            if key == "crawl-delay":
+                try:
+                    crawl_delay = min(float(value), MAX_CRAWL_DELAY_SECONDS)
+                except ValueError:
+                    pass
+        return cls(rules, crawl_delay, sitemaps)
+
+    def is_allowed(self, path: str) -> bool:
+        """Whether a path (with its query string) may be crawled"""
+        decision = self._decisions.get(path)
+        if decision is None:
+            decision = path == "/robots.txt" or next(
+                (rule.allow for rule in self.rules if rule.matches(path)), True
+            )
+            if len(self._decisions) >= MAX_MEMOIZED_PATHS:
+                self._decisions.clear()
+            self._decisions[path] = decision
+        return decision
+
+
+class RobotsCache:
+    """robots.txt rules of each host, fetched once per job"""
+
+    def __init__(
+        self,
+        cache_dir: Path | None = ROBOTS_CACHE_PATH,
+        ttl: float = ROBOTS_CACHE_TTL_SECONDS,
+        timeout: float = 10.0,
+        client: httpx.AsyncClient | None = None,
+        on_load: Callable[[str, RobotsRules], None] | None = None,
+    ):
+        self.cache_dir = cache_dir
+        self.ttl = ttl
+        self.timeout = timeout
+        self.client = client
+        # Called with the host and its rules when they are loaded, e.g. to apply the Crawl-delay
+        self.on_load = on_load
+        self.rules: dict[str, RobotsRules] = {}
+        self._loading: dict[str, asyncio.Task[RobotsRules]] = {}
+        self.nb_fetched = 0
+
+    def _cache_path(self, origin: str) -> Path | None:
+        if self.cache_dir is None:
+            return None
+        return self.cache_dir / f"{origin.replace('://', '_').replace(':', '_')}.json"
+
+    async def get(self, url: str) -> RobotsRules:
+        """Rules of the host of a URL"""
+        parsed = urlparse(url)
+        origin = f"{parsed.scheme}://{parsed.netloc}"
+        rules = self.rules.get(origin)
+        if rules is not None:
+            return rules
+        # Concurrent lookups for the same host share a single fetch
+        task = self._loading.get(origin)
+        if task is None:
+            task = self._loading[origin] = asyncio.ensure_future(self._load(origin))
+        try:
+            rules = await asyncio.shield(task)
+        except Exception as e:
+            # E.g. an invalid URL or an unwritable cache: allow everything, like when unreachable
+            print(f"Could not load robots.txt of {origin}: {str(e)[:50]}")
+            rules = RobotsRules()
+        if origin not in self.rules:
+            self.rules[origin] = rules
+            self._loading.pop(origin, None)
+            if self.on_load is not None:
+                self.on_load(parsed.netloc, rules)
+        return rules
+
+    async def is_allowed(self, url: str) -> bool:
+        parsed = urlparse(url)
+        rules = self.rules.get(f"{parsed.scheme}://{parsed.netloc}") or await self.get(url)
+        path = parsed.path or "/"
+        return rules.is_allowed(f"{path}?{parsed.query}" if parsed.query else path)
+
+    async def _load(self, origin: str) -> RobotsRules:
+        path = self._cache_path(origin)
+        if path is not None and path.exists():
+            try:
+                cached = json.loads(path.read_text())
+                if time.time() - cached["fetched_at"] < self.ttl:
+                    return RobotsRules.parse(cached["content"])
+            except (OSError, json.JSONDecodeError, KeyError) as e:
+                print(f"Could not read cached robots.txt of {origin}: {str(e)[:50]}")
+
+        content = await self._fetch(origin)
+        if content is None:
+            # Unreachable: allow everything, and try again next job
+            return RobotsRules()
+        if path is not None:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_text(json.dumps({"fetched_at": time.time(), "content": content}))
+        return RobotsRules.parse(content)
+
+    async def _fetch(self, origin: str) -> str | None:
+        """Content of the robots.txt, empty if there is none, None if it could not be fetched"""
+        client = self.client or httpx.AsyncClient(
+            timeout=self.timeout,
+            follow_redirects=True,
+            headers={"User-Agent": CONTEXT_OPTIONS["user_agent"]},
+        )
+        try:
+            async with client.stream("GET", f"{origin}/robots.txt") as response:
+                if 400 <= response.status_code < 500:
+                    # No robots.txt: everything is allowed
+                    return ""
+                if response.status_code != 200:
+                    return None
+                body = bytearray()
+                async for chunk in response.aiter_bytes():
+                    body += chunk
+                    if len(body) >= MAX_ROBOTS_BYTES:
+                        break
+            self.nb_fetched += 1
+            return body[:MAX_ROBOTS_BYTES].decode("utf-8", errors="replace")
+        except httpx.HTTPError as e:
+            print(f"Could not fetch robots.txt of {origin}: {str(e)[:50]}")
+            return None
+        finally:
+            if self.client is None:
+                await client.aclose()
@@ -0,0 +1,188 @@
+"""
+Streaming sitemap loader.
+
+Sitemap indexes are followed to any depth (each sitemap is loaded once, so cycles end), child sitemaps
+are fetched concurrently, gzipped sitemaps are decompressed on the fly and the XML is parsed
+incrementally: page URLs are handed over as soon as their <loc> is read, and memory stays flat whatever
+the size of the sitemaps.
+"""
+
+import asyncio
+import zlib
+from collections.abc import AsyncIterator
+
+import httpx
+from lxml import etree
+
+GZIP_MAGIC = b"\x1f\x8b"
+
+
+def _local_name(tag) -> str:
+    """Tag name without its XML namespace (comments and processing instructions have no name)"""
+    if not isinstance(tag, str):
+        return ""
+    return tag.rsplit("}", 1)[-1]
+
+
+class SitemapStreamParser:
+    """Incremental parser for one sitemap file, fed with the raw (possibly gzipped) bytes"""
+
+    def __init__(self):
+        self.parser = etree.XMLPullParser(
+            events=("end",), resolve_entities=False, huge_tree=True
+        )
+        self.decompressor = None
+        self.head = b""
+
+    def feed(self, chunk: bytes) -> list[tuple[str, str]]:
+        """Feed a chunk of the response, returns the (entry kind, url) pairs completed by this chunk.
+
+        The entry kind is "url" for a page and "sitemap" for a child sitemap of a sitemap index.
+        """
+        if self.head is not None:
+            # Wait for enough bytes to detect gzip, whatever the chunking
+            self.head += chunk
+            if len(self.head) < len(GZIP_MAGIC):
+                return []
+            chunk, self.head = self.head, None
+            if chunk.startswith(GZIP_MAGIC):
+                self.decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        if self.decompressor is not None:
+            chunk = self.decompressor.decompress(chunk)
+        self.parser.feed(chunk)
+        return self._read_entries()
+
+    def close(self) -> list[tuple[str, str]]:
+        if self.head:
+            self.parser.feed(self.head)
+        if self.decompressor is not None:
+            self.parser.feed(self.decompressor.flush())
+        self.parser.close()
+        return self._read_entries()
+
+    def _read_entries(self) -> list[tuple[str, str]]:
+        entries = []
+        for _, element in self.parser.read_events():
+            name = _local_name(element.tag)
+            if name == "loc":
+                parent = element.getparent()
+                if parent is not None and element.text and element.text.strip():
+                    entries.append((_local_name(parent.tag), element.text.strip()))
+            elif name in ("url", "sitemap"):
+                # Free the entries already read to keep memory flat
+                element.clear()
+                while element.getprevious() is not None:
+                    del element.getparent()[0]
+        return entries
+
+
+class SitemapLoader:
+    def __init__(
+        self,
+        concurrency: int = 8,
+        timeout: float = 10.0,
+        queue_size: int = 1000,
+        client: httpx.AsyncClient | None = None,
+    ):
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.queue_size = queue_size
+        self.client = client
+
+    async def iter_page_urls(self, sitemap_urls: list[str]) -> AsyncIterator[str]:
+        """Yield the page URLs of these sitemaps and of all the sitemaps they reference.
+
+        Stopping the iteration early (or closing the generator) cancels the pending downloads.
+        """
+        queue: asyncio.Queue[str | None] = asyncio.Queue(maxsize=self.queue_size)
+        semaphore = asyncio.Semaphore(self.concurrency)
+        seen_sitemaps: set[str] = set()
+        tasks: set[asyncio.Task] = set()
+        pending = 0
+
+        client = self.client or httpx.AsyncClient(
+            timeout=self.timeout,
+            follow_redirects=True,
+            headers={
+                "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"
+            },
+        )
+
+        def schedule(sitemap_url: str):
+            nonlocal pending
+            # Each sitemap is loaded once, which also ends cycles between indexes
+            if sitemap_url in seen_sitemaps:
+                return
+            seen_sitemaps.add(sitemap_url)
+            pending += 1
+            task = asyncio.create_task(run(sitemap_url))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+
+        async def run(sitemap_url: str):
+            nonlocal pending
+            try:
+                async with semaphore:
+                    await self._load_sitemap(client, sitemap_url, schedule, queue)
+            except Exception as e:
+                print(f"Could not load sitemap {sitemap_url}: {str(e)[:100]}")
+            pending -= 1
+            if pending == 0:
+                await queue.put(None)
+
+        try:
+            for sitemap_url in sitemap_urls:
+                schedule(sitemap_url)
+            if pending == 0:
+                return
+            while (url := await queue.get()) is not None:
+                yield url
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            if self.client is None:
+                await client.aclose()
+
+    async def _load_sitemap(
+        self,
+        client: httpx.AsyncClient,
+        sitemap_url: str,
+        schedule,
+        queue: asyncio.Queue,
+    ):
+        print(f"Loading sitemap: {sitemap_url}")
+        async with client.stream("GET", sitemap_url) as response:
+            if response.status_code != 200:
+                print(
+                    f"Could not load sitemap {sitemap_url}: HTTP {response.status_code}"
+                )
+                return
+            content_type = response.headers.get("content-type", "").lower()
+            if "html" in content_type:
+                print(
+                    f"Response from {sitemap_url} doesn't appear to be XML (content-type: {content_type})"
+                )
+                return
+
+            parser = SitemapStreamParser()
+            nb_urls = 0
+            try:
+                async for chunk in response.aiter_bytes():
+                    for kind, url in parser.feed(chunk):
+                        nb_urls += await self._dispatch(kind, url, schedule, queue)
+                for kind, url in parser.close():
+                    nb_urls += await self._dispatch(kind, url, schedule, queue)
+            except (etree.XMLSyntaxError, zlib.error) as e:
+                print(f"Invalid sitemap {sitemap_url}: {str(e)[:100]}")
+            print(f"Found {nb_urls} URLs in sitemap {sitemap_url}")
+
+    @staticmethod
+    async def _dispatch(kind: str, url: str, schedule, queue) -> int:
+        if kind == "sitemap":
+            schedule(url)
+            return 0
+        if kind == "url":
+            await queue.put(url)
+            return 1
+        return 0
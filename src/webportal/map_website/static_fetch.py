@@ -0,0 +1,188 @@
+"""
+HTTP-first page fetching for the crawler.
+
+Pages are fetched with a pooled HTTP client and their links extracted with lxml, the same way the
+in-page extraction script of the crawler does. The crawler only escalates to the browser when the
+page looks rendered by JavaScript.
+"""
+
+import asyncio
+import re
+from urllib.parse import urljoin
+
+import httpx
+import lxml.html
+from lxml import etree
+
+from webportal.map_website.browser_pool import CONTEXT_OPTIONS
+from webportal.map_website.near_duplicates import MAX_TEXT_LENGTH, tag_paths
+from webportal.map_website.page_cache import validators_from_headers
+
+MAX_PAGE_BYTES = 5_000_000
+
+# Pages with less visible text than this are considered empty shells
+MIN_BODY_TEXT_LENGTH = 200
+# Pages with fewer links than this are suspicious when they also contain a <noscript> hint
+MIN_STATIC_LINKS = 10
+# Escalate when the static page has less than this share of the links the browser found on the same template
+MIN_LINK_RATIO = 0.5
+
+SPA_ROOT_PATTERN = re.compile(
+    r"<div[^>]+id=[\"'](?:root|app|__next|__nuxt|svelte|main-app)[\"'][^>]*>\s*</div>",
+    re.IGNORECASE,
+)
+NOSCRIPT_HINT_PATTERN = re.compile(
+    r"<noscript[^>]*>(?:(?!</noscript>).)*(?:enable|requires?|turn on|activate)\s+javascript",
+    re.IGNORECASE | re.DOTALL,
+)
+ONCLICK_NAVIGATION_PATTERN = re.compile(
+    r"(?:location\.href|window\.location|navigate)\s*=\s*['\"]([^'\"]+)['\"]"
+)
+
+
+class StaticPage:
+    def __init__(
+        self,
+        url: str,
+        status_code: int | None = None,
+        content_type: str = "",
+        html: str = "",
+        error: str | None = None,
+    ):
+        self.url = url
+        self.status_code = status_code
+        self.content_type = content_type
+        self.html = html
+        self.error = error
+        self.retry_after: str | None = None
+        # ETag / Last-Modified, for conditional requests on the next crawl
+        self.validators: dict[str, str] = {}
+        self.title: str | None = None
+        self.links: list[str] = []
+        self.body_text_length = 0
+        # For near-duplicate detection
+        self.text = ""
+        self.tag_paths: list[str] = []
+
+    @property
+    def is_html(self) -> bool:
+        return "html" in self.content_type
+
+
+def parse_static_page(page: StaticPage):
+    """Fill the title, links, text and tag paths of a fetched HTML page"""
+    try:
+        document = lxml.html.document_fromstring(page.html)
+    except (etree.ParserError, ValueError):
+        return
+
+    base_url = page.url
+    for base in document.xpath("//base[@href]"):
+        base_url = urljoin(page.url, base.get("href"))
+        break
+
+    title = document.findtext(".//title")
+    page.title = title.strip() if title else None
+
+    # Same sources as the in-page extraction script of the crawler
+    links: dict[str, None] = {}
+    for element in document.xpath("//a[@href]"):
+        links[urljoin(base_url, element.get("href").strip())] = None
+    for element in document.xpath("//*[@onclick or @data-href or @data-url]"):
+        onclick = element.get("onclick")
+        if onclick:
+            match = ONCLICK_NAVIGATION_PATTERN.search(onclick)
+            if match:
+                links[urljoin(base_url, match.group(1))] = None
+        data_href = element.get("data-href") or element.get("data-url")
+        if data_href:
+            links[urljoin(base_url, data_href)] = None
+    for element in document.xpath(
+        "//*[@to or starts-with(@href, '/') or starts-with(@href, './') or starts-with(@href, '../')]"
+    ):
+        href = element.get("to") or element.get("href")
+        if href:
+            links[urljoin(base_url, href)] = None
+    page.links = list(links)
+
+    body = document.find("body")
+    if body is not None:
+        for element in body.xpath(".//script | .//style | .//noscript"):
+            element.drop_tree()
+        words = body.text_content().split()
+        page.body_text_length = len("".join(words))
+        page.text = " ".join(words)[:MAX_TEXT_LENGTH]
+        page.tag_paths = tag_paths(document)
+
+
+def escalation_reason(page: StaticPage, expected_links: float | None = None) -> str | None:
+    """Why this page needs a browser render, None if its static HTML is enough"""
+    if page.error is not None:
+        return "fetch_error"
+    if page.status_code != 200:
+        return "http_status"
+    if not page.is_html:
+        return None
+    if SPA_ROOT_PATTERN.search(page.html):
+        return "spa_root"
+    if page.body_text_length < MIN_BODY_TEXT_LENGTH and len(page.links) < MIN_STATIC_LINKS:
+        return "empty_body"
+    if len(page.links) < MIN_STATIC_LINKS and NOSCRIPT_HINT_PATTERN.search(page.html):
+        return "noscript"
+    if expected_links is not None and len(page.links) < MIN_LINK_RATIO * expected_links:
+        return "few_links"
+    return None
+
+
+class StaticFetcher:
+    def __init__(
+        self,
+        concurrency: int = 10,
+        timeout: float = 15.0,
+        client: httpx.AsyncClient | None = None,
+    ):
+        self.client = client or httpx.AsyncClient(
+            timeout=timeout,
+            follow_redirects=True,
+            headers={
+                "User-Agent": CONTEXT_OPTIONS["user_agent"],
+                "Accept": "text/html,application/xhtml+xml,*/*;q=0.8",
+                **CONTEXT_OPTIONS["extra_http_headers"],
+            },
+            limits=httpx.Limits(
+                max_connections=2 * concurrency, max_keepalive_connections=concurrency
+            ),
+        )
+
+    async def fetch(
+        self, url: str, headers: dict[str, str] | None = None, read_body: bool = True
+    ) -> StaticPage:
+        """Fetch a page and parse its links if it is HTML, only its headers without `read_body`"""
+        try:
+            async with self.client.stream("GET", url, headers=headers) as response:
+                page = StaticPage(
+                    str(response.url),
+                    response.status_code,
+                    response.headers.get("content-type", "").lower(),
+                )
+                page.retry_after = response.headers.get("retry-after")
+                page.validators = validators_from_headers(response.headers)
+                if page.status_code == 200 and page.is_html and read_body:
+                    body = bytearray()
+                    async for chunk in response.aiter_bytes():
+                        body += chunk
+                        if len(body) > MAX_PAGE_BYTES:
+                            break
+                    page.html = body.decode(response.encoding or "utf-8", errors="replace")
+        except httpx.TimeoutException:
+            return StaticPage(url, error="timeout")
+        except httpx.HTTPError as e:
+            return StaticPage(url, error=str(e)[:100] or type(e).__name__)
+
+        if page.html:
+            # lxml parsing is CPU-bound: keep it off the event loop
+            await asyncio.to_thread(parse_static_page, page)
+        return page
+
+    async def aclose(self):
+        await self.client.aclose()
@@ -0,0 +1,529 @@
+"""
+URL templates discovered while mapping a website, and the index used to match URLs against them.
+
+A template is the list of "/"-separated segments of a URL, each segment being either fixed
+(a single example value) or variable (several example values were seen at that position).
+Segments may hold placeholders such as {id}: the template also keeps the URL of a real page.
+"""
+
+import abc
+import json
+import random
+from bisect import bisect_left, insort
+from collections import Counter
+from collections.abc import Iterable
+from typing import Annotated, Literal
+
+from pydantic import BaseModel, Field
+
+# Distinct values at a position of sibling templates after which the position becomes variable
+MIN_VALUES_TO_GENERALIZE = 3
+
+
+class TemplateSegment(abc.ABC):
+    __slots__ = ()
+
+    @abc.abstractmethod
+    def to_model(self) -> "TemplateSegmentModel": ...
+
+
+class VariableTemplateSegment(TemplateSegment):
+    """Segment taking several values. Keeps a bounded sample of distinct examples: the first ones
+    (used for display) are always kept, the others are reservoir-sampled over the distinct values,
+    and `total_count` counts every value seen at this position.
+
+    Only the sampled values are remembered: a value seen again after its eviction from the sample
+    counts as a new distinct value.
+    """
+
+    __slots__ = ("_examples", "_example_set", "_nb_distinct", "total_count")
+
+    MAX_EXAMPLES = 100
+    PINNED_EXAMPLES = 3
+
+    def __init__(self, examples: Iterable[str] = (), total_count: int = 0):
+        self._examples: list[str] = []
+        self._example_set: set[str] = set()
+        # Distinct values offered to the sample, the size of the reservoir population
+        self._nb_distinct = 0
+        self.total_count = 0
+        for example in examples:
+            self.add_example(example)
+        self.total_count = max(self.total_count, total_count)
+
+    @property
+    def examples(self) -> list[str]:
+        return list(self._examples)
+
+    def __contains__(self, example: str) -> bool:
+        return example in self._example_set
+
+    def add_example(self, example: str):
+        """Record a value seen at this position"""
+        self.total_count += 1
+        if example in self._example_set:
+            return
+        self._nb_distinct += 1
+        if len(self._examples) < self.MAX_EXAMPLES:
+            self._examples.append(example)
+            self._example_set.add(example)
+            return
+        # Reservoir sampling over the non-pinned slots
+        slot = random.randrange(self._nb_distinct)
+        if self.PINNED_EXAMPLES <= slot < self.MAX_EXAMPLES:
+            self._example_set.discard(self._examples[slot])
+            self._examples[slot] = example
+            self._example_set.add(example)
+
+    def to_model(self) -> "VariableTemplateSegmentModel":
+        return VariableTemplateSegmentModel(
+            examples=self._examples, total_count=self.total_count
+        )
+
+    def __repr__(self) -> str:
+        return f"VariableTemplateSegment(examples={self._examples!r}, total_count={self.total_count})"
+
+
+class FixedTemplateSegment(TemplateSegment):
+    __slots__ = ("example",)
+
+    def __init__(self, example: str):
+        self.example = example
+
+    def to_model(self) -> "FixedTemplateSegmentModel":
+        return FixedTemplateSegmentModel(example=self.example)
+
+    def __repr__(self) -> str:
+        return f"FixedTemplateSegment(example={self.example!r})"
+
+
+class Template:
+    __slots__ = ("segments", "example")
+
+    def __init__(self, segments: list[TemplateSegment], example: str | None = None):
+        self.segments = segments
+        # URL of the page this template was first seen on, without placeholders
+        self.example = example
+
+    def to_model(self) -> "TemplateModel":
+        return TemplateModel(
+            segments=[segment.to_model() for segment in self.segments], example=self.example
+        )
+
+    @classmethod
+    def from_model(cls, model: "TemplateModel") -> "Template":
+        segments: list[TemplateSegment] = []
+        for segment in model.segments:
+            if isinstance(segment, FixedTemplateSegmentModel):
+                segments.append(FixedTemplateSegment(example=segment.example))
+            else:
+                segments.append(
+                    VariableTemplateSegment(
+                        examples=segment.examples, total_count=segment.total_count
+                    )
+                )
+        return cls(segments=segments, example=model.example)
+
+    def example_url(self) -> str:
+        """A URL of the template: its example page, or the first example of each segment"""
+        if self.example is not None:
+            return self.example
+        values = [
+            segment.example
+            if isinstance(segment, FixedTemplateSegment)
+            else segment.examples[0]
+            for segment in self.segments
+        ]
+        return values[0] + "//" + "/".join(values[1:])
+
+    def __repr__(self) -> str:
+        return f"Template(segments={self.segments!r}, example={self.example!r})"
+
+
+def templates_to_json(templates: list[Template]) -> str:
+    return json.dumps([template.to_model().model_dump() for template in templates])
+
+
+def templates_from_json(content: str) -> list[Template]:
+    return [
+        Template.from_model(TemplateModel.model_validate(template))
+        for template in json.loads(content)
+    ]
+
+
+# Pydantic versions of the templates, for serialization only
+class TemplateSegmentModel(BaseModel):
+    pass
+
+
+class VariableTemplateSegmentModel(TemplateSegmentModel):
+    kind: Literal["variable"] = "variable"
+    examples: list[str] = []
+    total_count: int = 0
+
+
+class FixedTemplateSegmentModel(TemplateSegmentModel):
+    kind: Literal["fixed"] = "fixed"
+    example: str
+
+
+class TemplateModel(BaseModel):
+    segments: list[
+        Annotated[
+            FixedTemplateSegmentModel | VariableTemplateSegmentModel,
+            Field(discriminator="kind"),
+        ]
+    ]
+    example: str | None = None
+
+
+class _TrieNode:
+    __slots__ = ("fixed", "wildcard", "template_ids")
+
+    def __init__(self):
+        self.fixed: dict[str, _TrieNode] = {}
+        self.wildcard: _TrieNode | None = None
+        # Ids of the templates ending at this node, kept sorted
+        self.template_ids: list[int] = []
+
+    def is_empty(self) -> bool:
+        return not self.fixed and self.wildcard is None and not self.template_ids
+
+
+class TemplateIndex:
+    """Stores templates in insertion order and indexes them for matching in ~O(segments).
+
+    Two structures are kept in sync with the templates:
+    - a segment trie per segment count, with a wildcard edge for variable positions, to find the
+      templates whose fixed segments all match a URL
+    - for fully fixed templates, a map from (position, segments without that position) to template
+      ids, to find the templates differing from a URL by exactly one segment
+
+    The structures hold template ids, given in insertion order, rather than indices in `templates`:
+    removing a template does not change the ids of the others, so it is unindexed alone. The index
+    of a template is the rank of its id among the ids of the templates kept.
+
+    The matching criterion is the one of `FastJSCrawler.matches_existing_template`: when several
+    templates match, the first one in insertion order wins.
+
+    With `min_values_to_generalize`, templates also generalize over several positions, e.g.
+    /{lang}/journal/{slug}: templates with variable segments are indexed by (position, shape with
+    that position masked), and once that many distinct values were seen at the masked position,
+    in sibling templates or in URLs matching no template, the position becomes variable in the
+    first sibling. It then absorbs the templates it covers, which shifts the indices of the others.
+    A generalized template keeps a fixed path segment, e.g. "journal": /{section}/{topic}/{slug}
+    would match every URL with 3 path segments.
+    """
+
+    # Segments of the scheme and host, before the path
+    PATH_START = 2
+
+    def __init__(
+        self,
+        templates: list[Template] | None = None,
+        min_values_to_generalize: int | None = None,
+    ):
+        self.templates: list[Template] = []
+        self.min_values_to_generalize = min_values_to_generalize
+        # Templates ever added, absorbed ones included
+        self.nb_added = 0
+        # Ids of `templates`, increasing, and the templates by id
+        self._ids: list[int] = []
+        self._by_id: dict[int, Template] = {}
+        self._roots: dict[int, _TrieNode] = {}
+        self._one_off: dict[tuple[int, tuple[str, ...]], list[int]] = {}
+        # Templates with variable segments by sibling key, and their variable positions by length
+        self._siblings: dict[tuple[int, tuple[str | None, ...]], list[int]] = {}
+        self._masks: dict[int, Counter[tuple[int, ...]]] = {}
+        # Values at the masked position of URLs which matched no template, by sibling key, in order
+        self._unmatched_values: dict[tuple[int, tuple[str | None, ...]], dict[str, None]] = {}
+        for template in templates or []:
+            self.add(template)
+
+    def __len__(self) -> int:
+        return len(self.templates)
+
+    def add(self, template: Template) -> int:
+        """Append a template and return its index"""
+        template_id = self.nb_added
+        self.nb_added += 1
+        self.templates.append(template)
+        self._ids.append(template_id)
+        self._by_id[template_id] = template
+        self._index(template_id)
+        return len(self.templates) - 1
+
+    def _position(self, template_id: int) -> int:
+        """Index in `templates` of a template id"""
+        return bisect_left(self._ids, template_id)
+
+    def match(self, segments: list[str], update: bool = True) -> int:
+        """Return the index of the template matching these segments, -1 if there is none.
+
+        On a match, unless `update` is False, the template is updated: the segment values at variable
+        positions are added to the examples, and a fully fixed template differing at one position
+        gets this position promoted to a variable segment. With `min_values_to_generalize`, segments
+        matching no template may also generalize one, see the class docstring.
+        """
+        if not segments:
+            return -1
+        root = self._roots.get(len(segments))
+        if root is None:
+            return -1
+
+        best_id = -1
+        # 1. Templates whose fixed segments all match
+        stack = [(root, 0)]
+        while stack:
+            node, depth = stack.pop()
+            if depth == len(segments):
+                if node.template_ids and (best_id == -1 or node.template_ids[0] < best_id):
+                    best_id = node.template_ids[0]
+                continue
+            child = node.fixed.get(segments[depth])
+            if child is not None:
+                stack.append((child, depth + 1))
+            if node.wildcard is not None:
+                stack.append((node.wildcard, depth + 1))
+
+        # 2. Fully fixed templates differing at exactly one position
+        promoted_position = -1
+        for position in range(len(segments)):
+            key = (position, tuple(segments[:position] + segments[position + 1 :]))
+            for template_id in self._one_off.get(key, ()):
+                if best_id != -1 and template_id >= best_id:
+                    break
+                fixed_segment = self._by_id[template_id].segments[position]
+                if fixed_segment.example != segments[position]:  # type: ignore
+                    best_id = template_id
+                    promoted_position = position
+                    break
+
+        generalize = update and self.min_values_to_generalize is not None
+        if best_id == -1:
+            # 3. Templates with variable segments differing at one fixed position, given enough evidence
+            best_id = self._generalize_to(segments) if generalize else -1
+            return self._position(best_id) if best_id != -1 else -1
+        if not update:
+            return self._position(best_id)
+        if promoted_position != -1:
+            self._promote(best_id, promoted_position, segments[promoted_position])
+            if generalize:
+                self._generalize_siblings(best_id)
+        else:
+            self._add_examples(best_id, segments)
+        return self._position(best_id)
+
+    def _add_examples(self, template_id: int, segments: list[str]):
+        template = self._by_id[template_id]
+        for segment, template_segment in zip(segments, template.segments):
+            if isinstance(template_segment, VariableTemplateSegment):
+                template_segment.add_example(segment)
+
+    def _generalize_to(self, segments: list[str]) -> int:
+        """Generalize a template so that it matches these segments, if there is enough evidence.
+
+        Returns the id of the generalized template, -1 if the segments still match no template.
+        """
+        best: tuple[int, tuple[int, tuple[str | None, ...]]] | None = None
+        for mask in self._masks.get(len(segments), ()):
+            for position in range(len(segments)):
+                if position in mask:
+                    continue
+                key = self._sibling_key(segments, mask, position)
+                siblings = self._siblings.get(key)
+                if not siblings or not self._keeps_fixed_path_segment(key):
+                    continue
+                unmatched = self._unmatched_values.setdefault(key, {})
+                if len(unmatched) < self.min_values_to_generalize:  # type: ignore
+                    unmatched[segments[position]] = None
+                if self._nb_values(key) >= self.min_values_to_generalize and (  # type: ignore
+                    best is None or siblings[0] < best[0]
+                ):
+                    best = (siblings[0], key)
+        if best is None:
+            return -1
+        template_id = best[0]
+        self._generalize(*best)
+        self._add_examples(template_id, segments)
+        return template_id
+
+    def _generalize_siblings(self, template_id: int):
+        """Generalize the siblings of a template which got a variable segment, if there is enough
+        evidence. The template, or the first sibling absorbing it, keeps matching its URLs."""
+        segments = self._by_id[template_id].segments
+        mask = self._variable_positions(segments)
+        for position in range(len(segments)):
+            if position in mask:
+                continue
+            key = self._sibling_key(segments, mask, position)
+            if (
+                self._keeps_fixed_path_segment(key)
+                and self._nb_values(key) >= self.min_values_to_generalize  # type: ignore
+            ):
+                self._generalize(self._siblings[key][0], key)
+                return
+
+    def _keeps_fixed_path_segment(self, key: tuple[int, tuple[str | None, ...]]) -> bool:
+        """Whether the masked position of a sibling key can become variable"""
+        return any(value is not None for value in key[1][self.PATH_START :])
+
+    def _nb_values(self, key: tuple[int, tuple[str | None, ...]]) -> int:
+        """Distinct values seen at the masked position of a sibling key"""
+        position = key[0]
+        values = {
+            self._by_id[template_id].segments[position].example  # type: ignore
+            for template_id in self._siblings.get(key, ())
+        }
+        return len(values.union(self._unmatched_values.get(key, ())))
+
+    def _generalize(self, template_id: int, key: tuple[int, tuple[str | None, ...]]):
+        """Make the masked position of a sibling key variable in a template, and merge the other
+        templates it now covers into it. Only the template and the ones it absorbs are reindexed."""
+        template = self._by_id[template_id]
+        self._promote(template_id, key[0], *self._unmatched_values.pop(key, ()))
+        for other_id in self._covered(template_id):
+            if other_id == template_id:
+                continue
+            for segment, other_segment in zip(template.segments, self._by_id[other_id].segments):
+                if not isinstance(segment, VariableTemplateSegment):
+                    continue
+                if isinstance(other_segment, FixedTemplateSegment):
+                    segment.add_example(other_segment.example)
+                else:
+                    for example in other_segment.examples:  # type: ignore
+                        segment.add_example(example)
+            self._remove(other_id)
+
+    def _covered(self, template_id: int) -> list[int]:
+        """Ids of the templates matching a subset of the URLs of a template, itself included"""
+        segments = self._by_id[template_id].segments
+        nodes = [self._roots[len(segments)]]
+        for segment in segments:
+            if isinstance(segment, FixedTemplateSegment):
+                nodes = [
+                    node.fixed[segment.example] for node in nodes if segment.example in node.fixed
+                ]
+            else:
+                nodes = [
+                    child
+                    for node in nodes
+                    for child in [*node.fixed.values(), node.wildcard]
+                    if child is not None
+                ]
+        return sorted(template_id for node in nodes for template_id in node.template_ids)
+
+    def _remove(self, template_id: int):
+        """Drop an absorbed template, the indices of the templates after it shift down by one"""
+        self._unindex(template_id)
+        position = self._position(template_id)
+        del self.templates[position]
+        del self._ids[position]
+        del self._by_id[template_id]
+
+    def _promote(self, template_id: int, position: int, *segments: str):
+        """Turn a fixed segment of a template into a variable one"""
+        template = self._by_id[template_id]
+        self._unindex(template_id)
+        template.segments[position] = VariableTemplateSegment(
+            examples=[template.segments[position].example, *segments]  # type: ignore
+        )
+        self._index(template_id)
+
+    def _index(self, template_id: int):
+        segments = self._by_id[template_id].segments
+        node = self._roots.setdefault(len(segments), _TrieNode())
+        for segment in segments:
+            if isinstance(segment, FixedTemplateSegment):
+                node = node.fixed.setdefault(segment.example, _TrieNode())
+            else:
+                if node.wildcard is None:
+                    node.wildcard = _TrieNode()
+                node = node.wildcard
+        insort(node.template_ids, template_id)
+
+        examples = self._fixed_examples(segments)
+        if examples is not None:
+            for position in range(len(examples)):
+                key = (position, tuple(examples[:position] + examples[position + 1 :]))
+                insort(self._one_off.setdefault(key, []), template_id)
+        elif self.min_values_to_generalize is not None:
+            mask = self._variable_positions(segments)
+            self._masks.setdefault(len(segments), Counter())[mask] += 1
+            for key in self._sibling_keys(segments, mask):
+                insort(self._siblings.setdefault(key, []), template_id)
+
+    def _unindex(self, template_id: int):
+        segments = self._by_id[template_id].segments
+        path = [self._roots[len(segments)]]
+        for segment in segments:
+            if isinstance(segment, FixedTemplateSegment):
+                path.append(path[-1].fixed[segment.example])
+            else:
+                path.append(path[-1].wildcard)  # type: ignore
+        path[-1].template_ids.remove(template_id)
+        # Prune the nodes left empty, from the leaf up
+        for depth in range(len(segments), 0, -1):
+            if not path[depth].is_empty():
+                break
+            segment = segments[depth - 1]
+            if isinstance(segment, FixedTemplateSegment):
+                del path[depth - 1].fixed[segment.example]
+            else:
+                path[depth - 1].wildcard = None
+
+        examples = self._fixed_examples(segments)
+        if examples is not None:
+            for position in range(len(examples)):
+                key = (position, tuple(examples[:position] + examples[position + 1 :]))
+                self._one_off[key].remove(template_id)
+                if not self._one_off[key]:
+                    del self._one_off[key]
+        elif self.min_values_to_generalize is not None:
+            mask = self._variable_positions(segments)
+            masks = self._masks[len(segments)]
+            masks[mask] -= 1
+            if not masks[mask]:
+                del masks[mask]
+            for key in self._sibling_keys(segments, mask):
+                self._siblings[key].remove(template_id)
+                if not self._siblings[key]:
+                    del self._siblings[key]
+
+    @staticmethod
+    def _fixed_examples(segments: list[TemplateSegment]) -> list[str] | None:
+        """Segment values of a fully fixed template, None if the template has a variable segment"""
+        examples = []
+        for segment in segments:
+            if not isinstance(segment, FixedTemplateSegment):
+                return None
+            examples.append(segment.example)
+        return examples
+
+    @staticmethod
+    def _variable_positions(segments: list[TemplateSegment]) -> tuple[int, ...]:
+        return tuple(
+            position
+            for position, segment in enumerate(segments)
+            if isinstance(segment, VariableTemplateSegment)
+        )
+
+    @staticmethod
+    def _sibling_key(
+        segments: list[str] | list[TemplateSegment], mask: tuple[int, ...], position: int
+    ) -> tuple[int, tuple[str | None, ...]]:
+        """Position and segment values, None at the variable positions and at this position"""
+        return position, tuple(
+            None
+            if index == position or index in mask
+            else segment if isinstance(segment, str) else segment.example  # type: ignore
+            for index, segment in enumerate(segments)
+        )
+
+    @classmethod
+    def _sibling_keys(cls, segments: list[TemplateSegment], mask: tuple[int, ...]):
+        return [
+            cls._sibling_key(segments, mask, position)
+            for position in range(len(segments))
+            if position not in mask
+        ]
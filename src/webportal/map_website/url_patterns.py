@@ -0,0 +1,54 @@
+"""
+Replacement of variable URL segments (ids, hashes, uuids, versions) with generic placeholders.
+"""
+
+import re
+from functools import lru_cache
+
+# Pattern definitions for individual segments (without slashes), by priority order
+SEGMENT_PATTERNS: list[tuple[str, str]] = [
+    # UUIDs
+    (r"[a-f0-9]{8}-[a-f0-9]{4}-[a-f0-9]{4}-[a-f0-9]{4}-[a-f0-9]{12}", "{uuid}"),
+    # Alphanumeric hashes (like commit hashes, session IDs) - must be 8+ hex chars
+    (r"[a-f0-9]{8,}", "{hash}"),
+    # Numeric IDs
+    (r"\d+", "{id}"),
+    # Version numbers (like v1.2.3, 2024.1.1)
+    (r"v?\d+(?:\.\d+)*", "{version}"),
+    # Anything without 3 consecutive letters (like 12-34, a1b2)
+    (r"(?!.*[a-zA-Z]{3}).*", "{id}"),
+]
+
+# All patterns in a single alternation: the first alternative matching the whole segment wins,
+# like trying the patterns one after the other
+_SEGMENT_REGEX = re.compile(
+    "|".join(
+        f"(?P<p{i}>^{pattern}$)" for i, (pattern, _) in enumerate(SEGMENT_PATTERNS)
+    )
+)
+_PLACEHOLDERS = {f"p{i}": name for i, (_, name) in enumerate(SEGMENT_PATTERNS)}
+
+
+@lru_cache(maxsize=100_000)
+def classify_segment(segment: str) -> str:
+    """Return the placeholder of a URL segment, or the segment itself if it is not variable"""
+    if not segment:  # Skip empty segments
+        return segment
+    match = _SEGMENT_REGEX.match(segment)
+    if match is None:
+        return segment
+    return _PLACEHOLDERS[match.lastgroup]  # type: ignore
+
+
+def _split_protocol(url: str) -> tuple[str, str]:
+    # Handle the protocol part separately to preserve double slashes
+    if "://" in url:
+        protocol_part, path_part = url.split("://", 1)
+        return protocol_part + "://", path_part
+    return "", url
+
+
+def replace_with_generic_pattern(url: str) -> str:
+    """Apply generic pattern detection to individual URL segments"""
+    protocol_prefix, path_part = _split_protocol(url)
+    return protocol_prefix + "/".join(map(classify_segment, path_part.split("/")))
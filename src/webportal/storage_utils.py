@@ -67,8 +67,11 @@ def _write_file_to_bucket_or_data_dir(file_path: Path, blob_name: str) -> bool:
     # Always save locally for debugging
     local_dest = DATA_PATH / blob_name
     local_dest.parent.mkdir(parents=True, exist_ok=True)
-    if file_path.suffix.lower() in ['.png', '.jpg', '.jpeg', '.gif', '.webp', '.svg']:
-        # For images, copy the binary file
+    if local_dest.resolve() == file_path.resolve():
+        # Already written in the data directory
+        pass
+    elif file_path.suffix.lower() in ['.png', '.jpg', '.jpeg', '.gif', '.webp', '.svg', '.sqlite']:
+        # For images and databases, copy the binary file
         local_dest.write_bytes(file_path.read_bytes())
     else:
         # For text files
@@ -141,6 +144,71 @@ def _read_file_from_bucket_or_data_dir(blob_name: str) -> str:
     else:
         raise FileNotFoundError(f"File not found locally or in bucket: {blob_name}")
 
+def _download_file_from_bucket_or_data_dir(blob_name: str, file_path: Path) -> bool:
+    """
+    Copy a file from the local data directory, or from the bucket, to a local path. Returns False if it does not exist.
+    """
+    local_path = DATA_PATH / blob_name
+    if local_path.exists():
+        if local_path.resolve() != file_path.resolve():
+            file_path.parent.mkdir(parents=True, exist_ok=True)
+            file_path.write_bytes(local_path.read_bytes())
+        return True
+
+    if has_bucket_access():
+        blob = get_bucket().blob(blob_name)
+        if blob.exists():
+            file_path.parent.mkdir(parents=True, exist_ok=True)
+            blob.download_to_filename(str(file_path))
+            return True
+    return False
+
+
+def download_job_file_to_path(domain_name: str, job_id: str, filename: str, file_path: Path) -> bool:
+    """
+    Copy a job-specific file from storage to a local path, returns False if it does not exist.
+    """
+    return _download_file_from_bucket_or_data_dir(f"{domain_name}/{job_id}/{filename}", file_path)
+
+
+def download_domain_file_to_path(domain_name: str, filename: str, file_path: Path) -> bool:
+    """
+    Copy a file shared by the jobs of a domain from storage to a local path: domain_name/filename
+    """
+    return _download_file_from_bucket_or_data_dir(f"{domain_name}/{filename}", file_path)
+
+
+def write_domain_file_from_path_to_storage(domain_name: str, filename: str, file_path: Path) -> bool:
+    """
+    Upload a file shared by the jobs of a domain: domain_name/filename
+    """
+    return _write_file_to_bucket_or_data_dir(file_path, f"{domain_name}/{filename}")
+
+
+def read_latest_job_file_from_storage(domain_name: str, filename: str, current_job_id: str) -> str | None:
+    """
+    Read a file of the latest job of a domain other than `current_job_id`, None if there is none.
+
+    The latest job is the one whose file was written last: job ids are not required to sort by date.
+    """
+    updated_by_job_id = {}
+    domain_path = DATA_PATH / domain_name
+    if domain_path.is_dir():
+        for path in domain_path.glob(f"*/{filename}"):
+            updated_by_job_id[path.parent.name] = path.stat().st_mtime
+    if has_bucket_access():
+        for blob in get_bucket().list_blobs(prefix=f"{domain_name}/"):
+            parts = blob.name.split("/")
+            if len(parts) == 3 and parts[2] == filename and blob.updated is not None:
+                updated = blob.updated.timestamp()
+                updated_by_job_id[parts[1]] = max(updated, updated_by_job_id.get(parts[1], updated))
+
+    updated_by_job_id.pop(current_job_id, None)
+    if not updated_by_job_id:
+        return None
+    latest_job_id = max(updated_by_job_id, key=updated_by_job_id.__getitem__)
+    return read_job_file_from_storage(domain_name, latest_job_id, filename)
+
 def read_job_file_from_storage(domain_name: str, job_id: str, filename: str) -> str:
     """
     Read a job-specific file from storage: domain_name/job_id/filename
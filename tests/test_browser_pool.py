@@ -0,0 +1,111 @@
+"""Tests for the browser context pool, with stand-ins for the Playwright objects"""
+
+import asyncio
+
+import pytest
+
+from webportal.map_website.browser_pool import BrowserContextPool
+
+
+class FakePage:
+    def __init__(self):
+        self.urls: list[str] = []
+        self.closed = False
+
+    async def goto(self, url, **kwargs):
+        self.urls.append(url)
+
+    def is_closed(self) -> bool:
+        return self.closed
+
+
+class FakeContext:
+    def __init__(self):
+        self.page = FakePage()
+        self.closed = False
+
+    async def new_page(self):
+        return self.page
+
+    async def close(self):
+        self.closed = True
+        self.page.closed = True
+
+
+class FakeBrowser:
+    def __init__(self):
+        self.contexts: list[FakeContext] = []
+
+    async def new_context(self, **kwargs):
+        self.contexts.append(FakeContext())
+        return self.contexts[-1]
+
+
+@pytest.mark.asyncio
+async def test_pages_are_reused_then_recycled():
+    browser = FakeBrowser()
+    pool = BrowserContextPool(browser, size=1, max_pages_per_context=3)
+
+    for i in range(4):
+        async with pool.page() as page:
+            await page.goto(f"https://example.com/{i}")
+
+    assert pool.contexts_created == 2
+    first_context = browser.contexts[0]
+    assert first_context.closed
+    # The page is reset between navigations, not after the last one of the context
+    assert first_context.page.urls == [
+        "https://example.com/0",
+        "about:blank",
+        "https://example.com/1",
+        "about:blank",
+        "https://example.com/2",
+    ]
+    await pool.close()
+    assert browser.contexts[1].closed
+
+
+@pytest.mark.asyncio
+async def test_context_replaced_after_error():
+    browser = FakeBrowser()
+    pool = BrowserContextPool(browser, size=2)
+
+    with pytest.raises(TimeoutError):
+        async with pool.page():
+            raise TimeoutError("Navigation timeout")
+    async with pool.page():
+        pass
+
+    assert browser.contexts[0].closed
+    assert pool.contexts_replaced_after_error == 1
+    assert pool.contexts_created == 2
+
+
+@pytest.mark.asyncio
+async def test_no_pooling_creates_a_context_per_page():
+    browser = FakeBrowser()
+    pool = BrowserContextPool(browser, size=2, max_pages_per_context=1)
+
+    for _ in range(5):
+        async with pool.page():
+            pass
+
+    assert pool.contexts_created == 5
+    assert all(context.closed for context in browser.contexts)
+
+
+@pytest.mark.asyncio
+async def test_slots_are_spread_over_browsers():
+    browsers = [FakeBrowser(), FakeBrowser()]
+    pool = BrowserContextPool(browsers, size=4, max_pages_per_context=1)
+
+    async def visit():
+        async with pool.page() as page:
+            await page.goto("https://example.com")
+
+    for _ in range(3):
+        await asyncio.gather(*(visit() for _ in range(4)))
+
+    # Each slot creates its contexts in the same browser, also after a replacement
+    assert [len(browser.contexts) for browser in browsers] == [6, 6]
+    await pool.close()
@@ -0,0 +1,118 @@
+"""Tests for the checkpoints of the crawl state"""
+
+import httpx
+import pytest
+
+from webportal.map_website.checkpoint import CrawlCheckpoint
+from webportal.map_website.crawl import FastJSCrawler
+from webportal.map_website.static_fetch import StaticFetcher
+from webportal.map_website.templates import (
+    FixedTemplateSegment,
+    Template,
+    VariableTemplateSegment,
+)
+
+START_URL = "https://example.com/news"
+
+
+@pytest.mark.asyncio
+async def test_checkpoint_round_trip(tmp_path):
+    checkpoint = CrawlCheckpoint(tmp_path / "crawl.sqlite")
+    templates = [
+        Template(
+            [
+                FixedTemplateSegment("news"),
+                VariableTemplateSegment(["a", "b"], total_count=5),
+            ]
+        )
+    ]
+
+    checkpoint.record_queued(START_URL, 0)
+    checkpoint.record_queued("https://example.com/news/a", 1)
+    checkpoint.record_queued("https://example.com/news/b", 1)
+    checkpoint.record_visited(START_URL, "News")
+    await checkpoint.save(START_URL, templates)
+    # Visited after the save: only known to the next checkpoint
+    checkpoint.record_visited("https://example.com/news/a")
+    checkpoint.close()
+
+    state = CrawlCheckpoint(tmp_path / "crawl.sqlite").load()
+    assert state.start_url == START_URL
+    assert state.visited == {START_URL: "News"}
+    assert state.frontier == [
+        ("https://example.com/news/a", 1),
+        ("https://example.com/news/b", 1),
+    ]
+    [template] = state.templates
+    assert template.segments[0].example == "news"
+    assert template.segments[1].examples == ["a", "b"]
+    assert template.segments[1].total_count == 5
+
+
+def test_checkpoint_missing(tmp_path):
+    assert CrawlCheckpoint(tmp_path / "crawl.sqlite").load() is None
+
+
+@pytest.mark.asyncio
+async def test_checkpoint_saves_at_interval(tmp_path):
+    uploaded = []
+    checkpoint = CrawlCheckpoint(
+        tmp_path / "crawl.sqlite", interval=3600, max_pending=3, on_save=uploaded.append
+    )
+
+    checkpoint.record_queued(START_URL, 0)
+    assert not await checkpoint.maybe_save(START_URL, [])
+    checkpoint.record_queued("https://example.com/a", 1)
+    checkpoint.record_visited(START_URL)
+    assert await checkpoint.maybe_save(START_URL, [])
+    assert checkpoint.nb_pending == 0
+    assert uploaded == [tmp_path / "crawl.sqlite"]
+
+    checkpoint.interval = 0
+    assert not await checkpoint.maybe_save(START_URL, [])  # nothing pending
+    checkpoint.record_visited("https://example.com/a")
+    assert await checkpoint.maybe_save(START_URL, [])
+
+
+@pytest.mark.asyncio
+async def test_crawler_resumes_without_revisiting(tmp_path):
+    links = "".join(f'<a href="/news/topic-{i}/article">Article</a>' for i in range(12))
+    html = f"<html><head><title>News</title></head><body>{links}<p>{'text ' * 100}</p></body></html>"
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(200, headers={"content-type": "text/html"}, text=html)
+
+    crawler = FastJSCrawler(
+        START_URL,
+        http_first=True,
+        respect_robots=False,
+        checkpoint=CrawlCheckpoint(tmp_path / "crawl.sqlite"),
+    )
+    crawler.static_fetcher = StaticFetcher(
+        client=httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    )
+    await crawler.enqueue(START_URL, 0)
+    url, depth = await crawler.to_visit.get()
+    await crawler.crawl_page(None, url, depth)
+    await crawler.checkpoint.save(crawler.start_url, crawler.pattern_templates)
+    crawler.checkpoint.close()
+    await crawler.static_fetcher.aclose()
+
+    resumed = FastJSCrawler(
+        START_URL,
+        checkpoint=CrawlCheckpoint(tmp_path / "crawl.sqlite"),
+        resume=True,
+    )
+    assert resumed.restore_checkpoint()
+    assert resumed.visited == {START_URL}
+    assert resumed.page_titles == {START_URL: "News"}
+    assert resumed.to_visit.qsize() == crawler.to_visit.qsize()
+    assert len(resumed.pattern_templates) == len(crawler.pattern_templates)
+
+    # The checkpoint of another crawl is ignored
+    other = FastJSCrawler(
+        "https://other.com",
+        checkpoint=CrawlCheckpoint(tmp_path / "crawl.sqlite"),
+        resume=True,
+    )
+    assert not other.restore_checkpoint()
@@ -0,0 +1,82 @@
+"""Tests for the consent-state caching of the crawler"""
+
+import pytest
+
+from webportal.map_website.consent import BANNER_LESS_AFTER_PAGES, ConsentStore
+
+STATE_BEFORE_CLICK = {
+    "cookies": [
+        {"name": "session", "value": "abc", "domain": "www.nature.com", "path": "/"},
+        {"name": "_ga", "value": "x", "domain": ".tracker.com", "path": "/"},
+    ],
+    "origins": [
+        {"origin": "https://www.nature.com", "localStorage": [{"name": "cart", "value": "2"}]},
+    ],
+}  # fmt: skip
+STATE_AFTER_CLICK = {
+    "cookies": [
+        {"name": "OptanonAlertBoxClosed", "value": "1", "domain": ".nature.com", "path": "/"},
+        {"name": "session", "value": "abc", "domain": "www.nature.com", "path": "/"},
+        {"name": "_ga", "value": "x", "domain": ".tracker.com", "path": "/"},
+        {"name": "consent_id", "value": "y", "domain": ".tracker.com", "path": "/"},
+    ],
+    "origins": [
+        {"origin": "https://www.nature.com", "localStorage": [
+            {"name": "cart", "value": "2"}, {"name": "consent", "value": "1"},
+        ]},
+        {"origin": "https://tracker.com", "localStorage": [{"name": "consent", "value": "1"}]},
+    ],
+}  # fmt: skip
+
+
+class FakeContext:
+    def __init__(self):
+        self.added_cookies: list[dict] = []
+        self.clicked = False
+
+    async def storage_state(self):
+        return STATE_AFTER_CLICK if self.clicked else STATE_BEFORE_CLICK
+
+    async def add_cookies(self, cookies):
+        self.added_cookies += cookies
+
+
+@pytest.mark.asyncio
+async def test_consent_saved_per_host_and_reused(tmp_path):
+    store = ConsentStore(cache_dir=tmp_path)
+    clicking_context, other_context = FakeContext(), FakeContext()
+
+    assert not store.has_consent("www.nature.com")
+    await store.snapshot(clicking_context)
+    clicking_context.clicked = True
+    await store.save(clicking_context, "www.nature.com", "onetrust")
+
+    # Only what the click set on the host is saved: not the session cookie
+    assert store.has_consent("www.nature.com")
+    state = store.storage_state()
+    assert [cookie["name"] for cookie in state["cookies"]] == ["OptanonAlertBoxClosed"]
+    assert state["origins"] == [
+        {"origin": "https://www.nature.com", "localStorage": [{"name": "consent", "value": "1"}]}
+    ]
+
+    # Contexts get the cookies once, except the one that clicked
+    await store.apply(clicking_context)
+    await store.apply(other_context)
+    await store.apply(other_context)
+    assert clicking_context.added_cookies == []
+    assert [cookie["name"] for cookie in other_context.added_cookies] == ["OptanonAlertBoxClosed"]
+
+    # A later run reloads the consent from disk
+    next_run_store = ConsentStore(cache_dir=tmp_path)
+    assert next_run_store.load("www.nature.com")
+    assert next_run_store.storage_state() == state
+    assert not next_run_store.load("support.nature.com")
+
+
+def test_banner_less_hosts():
+    store = ConsentStore(cache_dir=None)
+    assert store.storage_state() is None
+    for _ in range(BANNER_LESS_AFTER_PAGES):
+        assert not store.is_banner_less("arxiv.org")
+        store.record_no_banner("arxiv.org")
+    assert store.is_banner_less("arxiv.org")
@@ -0,0 +1,122 @@
+"""Tests for the instrumentation of the crawler"""
+
+import asyncio
+import json
+
+import httpx
+import pytest
+
+from webportal.map_website import crawl_metrics
+from webportal.map_website.crawl import FastJSCrawler
+from webportal.map_website.crawl_metrics import CrawlMetrics, Histogram
+from webportal.map_website.static_fetch import StaticFetcher
+
+
+def test_histogram_quantiles():
+    histogram = Histogram((1, 2, 5))
+    for value in (0.5, 1.5, 1.5, 4, 8):
+        histogram.observe(value)
+
+    assert histogram.counts == [1, 2, 1, 1]
+    assert histogram.quantile(0.5) == pytest.approx(1.75)
+    assert histogram.quantile(1) == 8
+    assert Histogram((1,)).quantile(0.5) is None
+    assert histogram.to_dict()["buckets"] == {"1": 1, "2": 2, "5": 1, "+Inf": 1}
+
+
+def test_stage_errors_and_timeouts():
+    metrics = CrawlMetrics()
+    with pytest.raises(asyncio.TimeoutError):
+        with metrics.time("navigation"):
+            raise asyncio.TimeoutError()
+    with pytest.raises(ValueError):
+        with metrics.time("navigation"):
+            raise ValueError()
+    with metrics.time("cookie_handling"):
+        pass
+
+    assert metrics.stages["navigation"].count == 2
+    assert metrics.to_dict()["counters"] == {
+        "errors": {"navigation": 2},
+        "timeouts": {"navigation": 1},
+    }
+
+
+def test_pages_with_most_links():
+    metrics = CrawlMetrics()
+    for i in range(15):
+        metrics.record_page(f"https://example.com/{i}", "static", i)
+
+    assert metrics.total("links") == sum(range(15))
+    assert metrics.pages_with_most_links()[:2] == [
+        ("https://example.com/14", 14),
+        ("https://example.com/13", 13),
+    ]
+    assert len(metrics.pages_with_most_links()) == crawl_metrics.NB_TOP_PAGES
+
+
+def test_queue_depth_samples_are_bounded(monkeypatch):
+    monkeypatch.setattr(crawl_metrics, "MAX_QUEUE_DEPTH_SAMPLES", 10)
+    metrics = CrawlMetrics()
+    metrics.queue_depth_interval = 0
+    for depth in range(25):
+        metrics.sample_queue_depth(depth)
+    assert len(metrics.queue_depth) <= 10
+    assert metrics.queue_depth[0][1] == 0
+
+
+def test_prometheus_export():
+    metrics = CrawlMetrics()
+    metrics.observe("navigation", 0.3)
+    metrics.record_page("https://example.com", "browser", 12)
+    metrics.record_error("static_fetch", timeout=True)
+
+    lines = metrics.to_prometheus(labels={"domain": 'exa"mple.com'}).splitlines()
+    assert "# TYPE webportal_crawl_stage_seconds histogram" in lines
+    assert (
+        'webportal_crawl_stage_seconds_bucket{domain="exa\\"mple.com",stage="navigation",le="0.25"} 0'
+        in lines
+    )
+    assert (
+        'webportal_crawl_stage_seconds_bucket{domain="exa\\"mple.com",stage="navigation",le="+Inf"} 1'
+        in lines
+    )
+    assert 'webportal_crawl_pages_total{domain="exa\\"mple.com",fetch="browser"} 1' in lines
+    assert 'webportal_crawl_timeouts_total{domain="exa\\"mple.com",stage="static_fetch"} 1' in lines
+    assert 'webportal_crawl_links_total{domain="exa\\"mple.com"} 12' in lines
+
+
+@pytest.mark.asyncio
+async def test_crawler_records_stages():
+    links = "".join(f'<a href="/news/topic-{i}/article">Article</a>' for i in range(12))
+    html = f"<html><head><title>News</title></head><body>{links}<p>{'text ' * 100}</p></body></html>"
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        if request.url.path != "/news":
+            raise httpx.ReadTimeout("timed out", request=request)
+        return httpx.Response(200, headers={"content-type": "text/html"}, text=html)
+
+    crawler = FastJSCrawler(
+        "https://example.com/news", http_first=True, respect_robots=False
+    )
+    crawler.static_fetcher = StaticFetcher(
+        client=httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    )
+    await crawler.crawl_page(None, "https://example.com/news", 0)
+    # Escalated to the browser, whose pool is missing
+    await crawler.crawl_page(None, "https://example.com/news/topic-0/article", 1)
+    await crawler.static_fetcher.aclose()
+
+    stats = crawler.get_statistics()
+    assert stats["total_links_found"] == 12
+    assert stats["pages_with_most_links"] == [("https://example.com/news", 12)]
+    metrics = json.loads(crawler.metrics.to_json())
+    assert set(metrics["stage_seconds"]) == {"static_fetch", "template_matching", "page"}
+    assert metrics["stage_seconds"]["page"]["count"] == 2
+    assert metrics["counters"] == {
+        "errors": {"static_fetch": 1},
+        "failed_pages": 1,
+        "links": 12,
+        "pages": {"static": 1},
+        "timeouts": {"static_fetch": 1},
+    }
@@ -0,0 +1,99 @@
+"""Tests for the detection of crawl traps in the frontier"""
+
+import httpx
+import pytest
+
+from webportal.map_website.crawl import FastJSCrawler
+from webportal.map_website.crawl_traps import TrapDetector
+from webportal.map_website.static_fetch import StaticFetcher
+
+PARAGRAPH = f"<p>{'text ' * 100}</p>"
+
+
+def test_deep_paths_are_refused():
+    detector = TrapDetector(max_path_depth=4)
+    assert detector.check("https://example.com/a/b/c/d") is None
+    assert detector.check("https://example.com/a/b/c/d/e") == "path deeper than 4 segments"
+    assert detector.nb_rejected["depth"] == 1
+
+
+def test_segment_cycles_quarantine_their_branch():
+    detector = TrapDetector()
+    assert detector.check("https://example.com/docs/next/next") is None
+    assert detector.check("https://example.com/docs/next/next/next") == "repeated path segments"
+    assert detector.check("https://example.com/docs/a/b/a/b") == "repeated path segments"
+    # Under a quarantined branch, whatever follows
+    assert detector.check("https://example.com/docs/a/b/a/b/c") == "repeated path segments"
+    assert detector.check("https://example.com/docs/a/b/c") is None
+    assert set(detector.quarantined) == {
+        "example.com/docs/next/next/next",
+        "example.com/docs/a/b/a/b",
+    }
+
+
+def test_template_fan_out_is_capped():
+    detector = TrapDetector(max_links_per_template=3)
+    facets = ["color-red", "color-blue", "size-9", "size-10", "brand-x"]
+    results = [detector.check(f"https://example.com/shop/{facet}", "shop") for facet in facets]
+    assert results[:3] == [None, None, None]
+    assert results[3:] == ["template fan-out capped"] * 2
+    # Links from pages of other templates are still queued
+    assert detector.check("https://example.com/shop/brand-y", "home") is None
+
+
+def test_increasing_numbers_quarantine_their_shape():
+    detector = TrapDetector(max_increasing_run=5)
+    results = [detector.check(f"https://example.com/archive/week-{week}") for week in range(1, 9)]
+    assert results[:4] == [None] * 4
+    assert results[4:] == ["numbers increasing over 5 URLs"] * 4
+    assert detector.quarantined == {
+        "example.com/archive/week-#": "numbers increasing over 5 URLs"
+    }
+    # Numbers going back and forth are not a sequence
+    for page in (3, 1, 4, 1, 5, 9, 2, 6):
+        assert detector.check(f"https://example.com/gallery/photo-{page}") is None
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("detect_crawl_traps", [False, True])
+async def test_crawler_quarantines_calendar_trap(detect_crawl_traps):
+    def handler(request: httpx.Request) -> httpx.Response:
+        path = request.url.path.rstrip("/")
+        if path == "":
+            links = ["/about", "/events/calendar", "/blog/first-post"]
+        elif path.startswith("/events/calendar"):
+            # "next" resolved against the current page, without end
+            links = [f"{path}/next", "/about"]
+        else:
+            links = ["/"]
+        anchors = "".join(f'<a href="{link}">Link</a>' for link in links)
+        html = f"<html><head><title>{path}</title></head><body>{anchors}{PARAGRAPH}</body></html>"
+        return httpx.Response(200, headers={"content-type": "text/html"}, text=html)
+
+    crawler = FastJSCrawler(
+        "https://example.com/",
+        max_pages=30,
+        max_depth=100,
+        http_first=True,
+        respect_robots=False,
+        detect_crawl_traps=detect_crawl_traps,
+    )
+    crawler.static_fetcher = StaticFetcher(
+        client=httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    )
+    await crawler.enqueue("https://example.com/", 0)
+    while not crawler.to_visit.empty() and len(crawler.visited) < crawler.max_pages:
+        url, depth = crawler.to_visit.get_nowait()
+        await crawler.crawl_page(None, url, depth)
+    await crawler.static_fetcher.aclose()
+
+    assert {"https://example.com/about", "https://example.com/blog/first-post"} <= crawler.visited
+    crawl_traps = crawler.get_statistics()["crawl_traps"]
+    if detect_crawl_traps:
+        assert len(crawler.visited) < 10
+        assert crawl_traps["quarantined"] == {
+            "example.com/events/calendar/next/next/next": "repeated path segments"
+        }
+    else:
+        assert crawl_traps is None
+        assert len(crawler.visited) == crawler.max_pages
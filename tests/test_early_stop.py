@@ -0,0 +1,132 @@
+"""Tests for the early termination of the crawl"""
+
+import asyncio
+import time
+
+import httpx
+import pytest
+
+from webportal.map_website.crawl import FastJSCrawler
+from webportal.map_website.static_fetch import StaticFetcher
+
+PARAGRAPH = f"<p>{'text ' * 100}</p>"
+
+
+def page(links: list[str]) -> httpx.Response:
+    anchors = "".join(f'<a href="{link}">Link</a>' for link in links * 6)
+    return httpx.Response(
+        200,
+        headers={"content-type": "text/html"},
+        text=f"<html><head><title>Page</title></head><body>{anchors}{PARAGRAPH}</body></html>",
+    )
+
+
+def crawler_for(handler, **kwargs) -> FastJSCrawler:
+    crawler = FastJSCrawler(
+        "https://example.com/",
+        use_sitemap=False,
+        http_first=True,
+        respect_robots=False,
+        **kwargs,
+    )
+    crawler.static_fetcher = StaticFetcher(
+        client=httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    )
+    return crawler
+
+
+async def run(crawler: FastJSCrawler):
+    await crawler.enqueue(crawler.start_url, 0)
+    await asyncio.wait_for(crawler.run_workers(None), timeout=5)
+    await crawler.static_fetcher.aclose()
+
+
+@pytest.mark.asyncio
+async def test_stops_when_page_budget_is_spent():
+    def handler(request: httpx.Request) -> httpx.Response:
+        # Every page links to new sections, the frontier never runs dry
+        path = request.url.path.rstrip("/")
+        return page([f"{path}/section-{i}" for i in range(3)])
+
+    # The sections repeat in the paths: a crawl trap, followed to spend the budget
+    crawler = crawler_for(
+        handler, max_pages=5, max_depth=100, concurrency=2, detect_crawl_traps=False
+    )
+    await run(crawler)
+
+    assert crawler.stop_reason == "page budget spent"
+    assert len(crawler.visited) == 5
+    # The frontier does not grow once stopped
+    queued = crawler.to_visit.qsize()
+    await crawler.enqueue("https://example.com/late", 1)
+    assert crawler.to_visit.qsize() == queued
+
+
+@pytest.mark.asyncio
+async def test_stops_when_template_discovery_saturates():
+    sections = ["/alpha", "/beta/one", "/gamma/one/two", "/delta/one/two/three"]
+    sections += ["/epsilon/one/two/three/four", "/zeta/one/two/three/four/five"]
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        # The home page links to every template, the other pages find nothing new
+        if request.url.path == "/":
+            return page(sections)
+        return page(["/", request.url.path])
+
+    crawler = crawler_for(
+        handler,
+        max_pages=100,
+        concurrency=1,
+        min_new_templates_per_page=0.5,
+        saturation_window=4,
+    )
+    await run(crawler)
+
+    assert crawler.stop_reason is not None
+    assert "new templates per page over the last 4 pages" in crawler.stop_reason
+    # The home page and the next 4 pages
+    assert len(crawler.visited) == 5
+
+
+@pytest.mark.asyncio
+async def test_pages_of_the_budget_are_finished():
+    async def handler(request: httpx.Request) -> httpx.Response:
+        if request.url.path == "/":
+            return page(["/slow", "/other/page/b"])
+        await asyncio.sleep(0.3)
+        return page([])
+
+    crawler = crawler_for(handler, max_pages=2, concurrency=3, stop_grace_period=0.1)
+    await run(crawler)
+
+    assert crawler.stop_reason == "page budget spent"
+    # The page started with the last page of the budget is finished, not cancelled
+    assert len(crawler.visited) == crawler.nb_pages_done == 2
+    assert "https://example.com/" in crawler.visited
+
+
+@pytest.mark.asyncio
+async def test_pages_in_flight_are_cancelled_after_grace_period():
+    async def handler(request: httpx.Request) -> httpx.Response:
+        if request.url.path == "/":
+            return page(["/slow", "/other/page/b"])
+        if request.url.path == "/slow":
+            await asyncio.sleep(10)
+        return page([])
+
+    # No new template on the second page finished: the crawl stops with /slow in flight
+    crawler = crawler_for(
+        handler,
+        max_pages=100,
+        concurrency=3,
+        min_new_templates_per_page=0.5,
+        saturation_window=1,
+        stop_grace_period=0.1,
+    )
+    started = time.monotonic()
+    await run(crawler)
+
+    assert time.monotonic() - started < 2
+    assert "new templates per page" in crawler.stop_reason
+    # The cancelled page is not counted as visited
+    assert crawler.visited == {"https://example.com/", "https://example.com/other/page/b"}
@@ -0,0 +1,80 @@
+"""Tests for the priority frontier of the crawler"""
+
+import pytest
+
+from webportal.map_website.frontier import PriorityFrontier
+
+
+async def drain(frontier: PriorityFrontier) -> list[str]:
+    urls = []
+    while not frontier.empty():
+        url, _ = await frontier.get()
+        urls.append(url)
+        frontier.task_done()
+    return urls
+
+
+@pytest.mark.asyncio
+async def test_frontier_spreads_over_sections():
+    frontier = PriorityFrontier()
+    for i in range(3):
+        await frontier.put((f"https://example.com/shop/item-{i}", 1))
+    await frontier.put(("https://example.com/about", 1))
+    await frontier.put(("https://example.com/blog/post", 1))
+
+    assert await drain(frontier) == [
+        "https://example.com/shop/item-0",
+        "https://example.com/about",
+        "https://example.com/blog/post",
+        "https://example.com/shop/item-1",
+        "https://example.com/shop/item-2",
+    ]
+
+
+@pytest.mark.asyncio
+async def test_frontier_prefers_shallow_urls():
+    frontier = PriorityFrontier()
+    frontier.put_nowait(("https://example.com/a/b/c", 3))
+    frontier.put_nowait(("https://example.com/d", 1))
+    frontier.put_nowait(("https://example.com/e/f", 2))
+
+    assert await drain(frontier) == [
+        "https://example.com/d",
+        "https://example.com/e/f",
+        "https://example.com/a/b/c",
+    ]
+
+
+@pytest.mark.asyncio
+async def test_frontier_rescores_waiting_urls():
+    frontier = PriorityFrontier()
+    frontier.put_nowait(("https://example.com/news/a", 1))
+    frontier.put_nowait(("https://example.com/news/b", 1))
+    # Queued after the news section got its first visit, but scored against fresh counts when popped
+    assert await frontier.get() == ("https://example.com/news/a", 1)
+    frontier.put_nowait(("https://example.com/events/x/y", 2))
+
+    assert await drain(frontier) == [
+        "https://example.com/events/x/y",
+        "https://example.com/news/b",
+    ]
+
+
+@pytest.mark.asyncio
+async def test_frontier_spreads_over_templates():
+    def template_of(url: str) -> str | None:
+        return "listing" if url.endswith("/page") else None
+
+    frontier = PriorityFrontier(template_of)
+    frontier.put_nowait(("https://example.com/news/page", 1))
+    frontier.put_nowait(("https://example.com/events/page", 1))
+    frontier.put_nowait(("https://example.com/news/first-post", 1))
+    frontier.put_nowait(("https://example.com/events/launch", 1))
+
+    # Without templates, the events listing would come second, being queued before the launch page
+    assert await drain(frontier) == [
+        "https://example.com/news/page",
+        "https://example.com/events/launch",
+        "https://example.com/news/first-post",
+        "https://example.com/events/page",
+    ]
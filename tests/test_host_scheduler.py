@@ -0,0 +1,240 @@
+"""Tests for the per-host adaptive scheduler of the crawler"""
+
+import asyncio
+import time
+from contextlib import asynccontextmanager
+
+import httpx
+import pytest
+
+from webportal.map_website.crawl import FastJSCrawler
+from webportal.map_website.host_scheduler import (
+    MIN_TIMEOUT_SECONDS,
+    HostScheduler,
+    parse_retry_after,
+)
+from webportal.map_website.static_fetch import StaticFetcher
+
+
+def test_limit_increases_on_fast_responses_and_halves_on_errors():
+    scheduler = HostScheduler(max_host_limit=8, initial_host_limit=2)
+    for _ in range(20):
+        scheduler.record("fast.example.com", 0.1, 200)
+    fast = scheduler.get_statistics()["fast.example.com"]
+    assert fast["limit"] == 6
+    assert [limit for _, limit in fast["limit_history"]] == [2, 3, 4, 5, 6]
+
+    scheduler.record("fast.example.com", 0.1, None)
+    assert scheduler.get_statistics()["fast.example.com"]["limit"] == 3
+    # Hosts are independent
+    assert "other.example.com" not in scheduler.get_statistics()
+
+
+def test_timeouts_follow_the_wait_durations_of_each_host():
+    scheduler = HostScheduler()
+    assert scheduler.timeout("fast.example.com", "settle", 10.0) == 10.0
+    for seconds in (0.4, 0.5, 0.6, 0.5, 0.5, 0.9):
+        scheduler.record_wait("fast.example.com", "settle", seconds)
+    # 3 times the 95th percentile, not below the minimum timeout
+    assert scheduler.timeout("fast.example.com", "settle", 10.0) == pytest.approx(2.7)
+    assert scheduler.timeout("fast.example.com", "navigation", 15.0) == 15.0
+    assert scheduler.timeout("slow.example.com", "settle", 10.0) == 10.0
+    assert scheduler.get_statistics()["fast.example.com"]["wait_p95"] == {"settle": 0.9}
+
+    for _ in range(6):
+        scheduler.record_wait("quick.example.com", "navigation", 0.05)
+    assert scheduler.timeout("quick.example.com", "navigation", 15.0) == MIN_TIMEOUT_SECONDS
+    # Timed-out waits are sampled at the timeout, which grows back to the default
+    for _ in range(3):
+        scheduler.record_wait("quick.example.com", "navigation", MIN_TIMEOUT_SECONDS)
+    assert scheduler.timeout("quick.example.com", "navigation", 15.0) == 3 * MIN_TIMEOUT_SECONDS
+
+
+def test_limit_decreases_on_slow_responses():
+    scheduler = HostScheduler(max_host_limit=8, initial_host_limit=4)
+    scheduler.record("slow.example.com", 0.1, 200)
+    scheduler.record("slow.example.com", 2.0, 200)
+    assert scheduler.hosts["slow.example.com"].limit == pytest.approx(
+        (4 + 1 / 4) * 0.75
+    )
+
+
+def test_throttling_backs_off():
+    scheduler = HostScheduler()
+    scheduler.record("example.com", 0.1, 429, retry_after="30")
+    state = scheduler.hosts["example.com"]
+    assert state.backoff_until - time.monotonic() == pytest.approx(30, abs=1)
+    assert scheduler.get_statistics()["example.com"]["throttled"] == 1
+
+    # Exponential backoff without Retry-After
+    scheduler.record("other.example.com", 0.1, 503)
+    scheduler.record("other.example.com", 0.1, 503)
+    state = scheduler.hosts["other.example.com"]
+    assert state.backoff_until - time.monotonic() == pytest.approx(2, abs=0.5)
+
+
+def test_parse_retry_after():
+    assert parse_retry_after("120") == 120
+    assert parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT") == 0
+    assert parse_retry_after("soon") is None
+    assert parse_retry_after(None) is None
+
+
+@pytest.mark.asyncio
+async def test_slots_per_host():
+    scheduler = HostScheduler(max_host_limit=4, initial_host_limit=1)
+    in_flight = {"a.example.com": 0, "b.example.com": 0}
+    max_in_flight = dict(in_flight)
+
+    async def request(host: str):
+        await scheduler.acquire(host)
+        in_flight[host] += 1
+        max_in_flight[host] = max(max_in_flight[host], in_flight[host])
+        await asyncio.sleep(0.01)
+        in_flight[host] -= 1
+        await scheduler.release(host)
+
+    await asyncio.gather(*(request(host) for host in in_flight for _ in range(3)))
+    assert max_in_flight == {"a.example.com": 1, "b.example.com": 1}
+
+
+@pytest.mark.asyncio
+async def test_crawl_delay_spaces_requests():
+    scheduler = HostScheduler()
+    scheduler.set_crawl_delay("example.com", 0.05)
+    starts = []
+
+    async def request():
+        await scheduler.acquire("example.com")
+        starts.append(time.monotonic())
+        await scheduler.release("example.com")
+
+    await asyncio.gather(*(request() for _ in range(3)))
+    assert starts[2] - starts[0] >= 0.1 - 0.01
+
+
+@pytest.mark.asyncio
+async def test_throttled_page_is_retried():
+    responses = iter(
+        [
+            httpx.Response(429, headers={"retry-after": "0"}),
+            httpx.Response(
+                200,
+                headers={"content-type": "text/html"},
+                text="<html><head><title>Ok</title></head><body>"
+                + "<a href='/a'>a</a>" * 12
+                + "<p>text</p>" * 100
+                + "</body></html>",
+            ),
+        ]
+    )
+
+    crawler = FastJSCrawler(
+        "https://example.com", http_first=True, respect_robots=False
+    )
+    crawler.static_fetcher = StaticFetcher(
+        client=httpx.AsyncClient(transport=httpx.MockTransport(lambda _: next(responses)))
+    )
+
+    await crawler.crawl_page(None, "https://example.com", 0)
+    assert "https://example.com" not in crawler.visited
+    url, depth = await crawler.to_visit.get()
+    await crawler.crawl_page(None, url, depth)
+
+    assert crawler.page_titles == {"https://example.com": "Ok"}
+    stats = crawler.get_statistics()["hosts"]["example.com"]
+    assert stats["responses"] == 2
+    assert stats["throttled"] == 1
+    await crawler.static_fetcher.aclose()
+
+
+@pytest.mark.asyncio
+async def test_pages_waiting_for_their_host_do_not_hold_global_slots():
+    def handler(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(
+            200,
+            headers={"content-type": "text/html"},
+            text=f"<html><head><title>Ok</title></head><body><p>{'text ' * 100}</p></body></html>",
+        )
+
+    crawler = FastJSCrawler(
+        "https://example.com", concurrency=2, http_first=True, respect_robots=False
+    )
+    crawler.static_fetcher = StaticFetcher(
+        client=httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    )
+    # Every slot of the busy host is taken
+    crawler.host_scheduler._state("busy.example.com").limit = 1
+    await crawler.host_scheduler.acquire("busy.example.com")
+    waiting = [
+        asyncio.create_task(crawler.crawl_page(None, f"https://busy.example.com/{i}", 0))
+        for i in range(2)
+    ]
+    await asyncio.sleep(0.05)
+
+    # Both global slots are free for the other hosts
+    assert await asyncio.wait_for(crawler.crawl_page(None, "https://example.com/a", 0), 1)
+    # Cancelled while waiting for its host: not visited
+    waiting[0].cancel()
+    await asyncio.gather(*waiting[:1], return_exceptions=True)
+    assert "https://busy.example.com/0" not in crawler.visited
+
+    await crawler.host_scheduler.release("busy.example.com")
+    assert await asyncio.wait_for(waiting[1], 1)
+    await crawler.static_fetcher.aclose()
+
+
+@pytest.mark.asyncio
+async def test_page_cancelled_while_waiting_for_a_global_slot_releases_its_host():
+    crawler = FastJSCrawler("https://example.com", concurrency=1, respect_robots=False)
+    # The only global slot is taken
+    await crawler.semaphore.acquire()
+    task = asyncio.create_task(crawler.crawl_page(None, "https://example.com/a", 0))
+    await asyncio.sleep(0.05)
+    assert crawler.host_scheduler.hosts["example.com"].in_flight == 1
+
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+    assert crawler.host_scheduler.hosts["example.com"].in_flight == 0
+    assert "https://example.com/a" not in crawler.visited
+    crawler.semaphore.release()
+
+
+class FailingNavigationPage:
+    def __init__(self):
+        self.context = FailingNavigationPool()
+
+    async def goto(self, url, **kwargs):
+        raise TimeoutError("navigation timed out")
+
+
+class FailingNavigationPool:
+    @asynccontextmanager
+    async def page(self):
+        yield FailingNavigationPage()
+
+
+@pytest.mark.asyncio
+async def test_page_escalated_to_browser_is_recorded_once():
+    def handler(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(
+            200,
+            headers={"content-type": "text/html"},
+            text='<html><body><div id="app"></div></body></html>',
+        )
+
+    crawler = FastJSCrawler(
+        "https://example.com", http_first=True, respect_robots=False
+    )
+    crawler.static_fetcher = StaticFetcher(
+        client=httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    )
+
+    await crawler.crawl_page(FailingNavigationPool(), "https://example.com/app", 0)
+
+    # Only the navigation is recorded, not the static fetch before it
+    stats = crawler.get_statistics()["hosts"]["example.com"]
+    assert stats["responses"] == 1
+    assert stats["errors"] == 1
+    await crawler.static_fetcher.aclose()
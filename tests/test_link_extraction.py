@@ -0,0 +1,94 @@
+"""Tests for the extraction of the links of rendered pages, filtered in Python or in the page"""
+
+import pytest
+
+from webportal.map_website.crawl import FastJSCrawler
+from webportal.map_website.link_extraction import (
+    EXTRACT_CANDIDATE_LINKS_SCRIPT,
+    EXTRACT_LINKS_SCRIPT,
+    STATIC_EXTENSIONS,
+    STATIC_PATHS,
+    is_static_asset,
+)
+from webportal.map_website.page_settling import DOM_QUIESCENCE_SCRIPT
+
+RAW_LINKS = [
+    "https://example.com/news",
+    "https://example.com/news#top",
+    "https://example.com/news?page=2",
+    "https://www.example.com/about",
+    "https://blog.example.com/posts/first",
+    "https://other.com/news",
+    "https://example.com/logo.PNG",
+    "https://example.com/assets/app",
+    "https://user@example.com/account",
+    "mailto:contact@example.com",
+]
+# What the in-page script returns for RAW_LINKS
+CANDIDATE_LINKS = [
+    "https://example.com/news",
+    "https://example.com/news?page=2",
+    "https://www.example.com/about",
+    "https://blog.example.com/posts/first",
+]
+# The links queued, without query
+NEW_LINKS = [
+    "https://example.com/news",
+    "https://www.example.com/about",
+    "https://blog.example.com/posts/first",
+]
+
+
+class FakePage:
+    def __init__(self, settles: bool = True):
+        self.settles = settles
+        self.scripts: list[str] = []
+
+    async def title(self):
+        return "Home"
+
+    async def evaluate(self, script, arg=None):
+        if script == DOM_QUIESCENCE_SCRIPT:
+            return {"settled": self.settles, "anchors": len(RAW_LINKS), "elapsed": 500}
+        self.scripts.append(script)
+        if script == EXTRACT_LINKS_SCRIPT:
+            return RAW_LINKS
+        assert script == EXTRACT_CANDIDATE_LINKS_SCRIPT
+        assert arg == ["example.com", list(STATIC_EXTENSIONS), list(STATIC_PATHS)]
+        return {"total": len(RAW_LINKS), "links": CANDIDATE_LINKS}
+
+
+def test_static_assets():
+    assert is_static_asset("https://example.com/logo.PNG")
+    assert is_static_asset("https://example.com/static/page")
+    assert not is_static_asset("https://example.com/news/javascript")
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("filter_links_in_page", [False, True])
+async def test_both_modes_find_the_same_links(filter_links_in_page):
+    crawler = FastJSCrawler(
+        "https://example.com/",
+        respect_robots=False,
+        filter_links_in_page=filter_links_in_page,
+    )
+    page = FakePage()
+    new_links = await crawler.extract_link_patterns(page, "https://example.com/", 0)
+
+    assert len(page.scripts) == 1
+    assert new_links == NEW_LINKS
+    assert crawler.page_titles["https://example.com/"] == "Home"
+    assert set(crawler.link_graph.urls) == {"https://example.com/", *NEW_LINKS}
+    # Links per page count all the links of the page, filtered or not
+    assert crawler.metrics.total("links") == len(RAW_LINKS)
+
+
+@pytest.mark.asyncio
+async def test_links_of_pages_which_did_not_settle_are_extracted():
+    crawler = FastJSCrawler("https://example.com/", respect_robots=False)
+    new_links = await crawler.extract_link_patterns(
+        FakePage(settles=False), "https://example.com/", 0
+    )
+
+    assert new_links == NEW_LINKS
+    assert crawler.get_statistics()["pages_not_settled"] == 1
@@ -0,0 +1,100 @@
+"""Tests for the link graph and the ranking of the crawled pages"""
+
+import httpx
+import pytest
+
+from webportal.map_website.crawl import FastJSCrawler
+from webportal.map_website.link_graph import LinkGraph, select_representative_urls
+from webportal.map_website.static_fetch import StaticFetcher
+
+
+def star_graph() -> LinkGraph:
+    """Every page links to the home page, which links to the sections"""
+    graph = LinkGraph()
+    graph.add_page("/", ["/news", "/shop", "/about", "/"])
+    graph.add_page("/news", ["/", "/news/a", "/news/b", "/news/a"])
+    graph.add_page("/shop", ["/", "/shop/x"])
+    graph.add_page("/news/a", ["/", "/news"])
+    return graph
+
+
+def test_csr_adjacency():
+    graph = star_graph()
+    offsets, targets = graph.csr()
+
+    assert graph.nb_nodes == 7
+    assert graph.nb_edges == 10
+    home, news = graph.node_ids["/"], graph.node_ids["/news"]
+    news_links = targets[offsets[news] : offsets[news + 1]]
+    assert sorted(graph.urls[target] for target in news_links) == ["/", "/news/a", "/news/b"]
+    # Self-links are dropped
+    assert home not in targets[offsets[home] : offsets[home + 1]]
+    assert graph.in_degrees()[home] == 3
+
+
+def test_pagerank():
+    graph = star_graph()
+    ranks = graph.pagerank()
+
+    assert sum(ranks) == pytest.approx(1)
+    best = max(range(graph.nb_nodes), key=ranks.__getitem__)
+    assert graph.urls[best] == "/"
+    assert ranks[graph.node_ids["/news"]] > ranks[graph.node_ids["/about"]]
+    assert LinkGraph().pagerank() == []
+
+
+def test_selection_covers_templates_first():
+    graph = star_graph()
+    graph.add_page("/news/b", ["/"])
+
+    def template_of(url: str) -> str:
+        return "article" if url.startswith("/news/") else url
+
+    selected = select_representative_urls(graph, 4, template_of)
+    assert selected[0] == "/"
+    # A single article until every other page was picked
+    assert len([url for url in selected if url.startswith("/news/")]) == 1
+    assert select_representative_urls(graph, 5, template_of)[-1].startswith("/news/")
+
+    # Link targets never crawled are not picked
+    selected = select_representative_urls(graph, 100, template_of)
+    assert set(selected) == {"/", "/news", "/shop", "/news/a", "/news/b"}
+
+    selected = select_representative_urls(
+        graph, 100, template_of, is_candidate=lambda url: not url.startswith("/shop")
+    )
+    assert selected[:2] == ["/", "/news"]
+    assert len(selected) == 4
+
+
+@pytest.mark.asyncio
+async def test_crawler_records_link_graph():
+    pages = {
+        "/": ["/news", "/about", "/news#top", "/logo.png", "https://other.com/"],
+        "/news": ["/", "/news/1/article", "/news/2/article"],
+    }
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        links = "".join(f'<a href="{link}">Link</a>' for link in pages[request.url.path])
+        html = f"<html><head><title>Page</title></head><body>{links * 4}<p>{'text ' * 100}</p></body></html>"
+        return httpx.Response(200, headers={"content-type": "text/html"}, text=html)
+
+    crawler = FastJSCrawler("https://example.com/", http_first=True, respect_robots=False)
+    crawler.static_fetcher = StaticFetcher(
+        client=httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    )
+    await crawler.crawl_page(None, "https://example.com/", 0)
+    await crawler.crawl_page(None, "https://example.com/news", 1)
+    await crawler.static_fetcher.aclose()
+
+    graph = crawler.link_graph
+    assert set(graph.urls) == {
+        "https://example.com/",
+        "https://example.com/news",
+        "https://example.com/about",
+        "https://example.com/news/1/article",
+        "https://example.com/news/2/article",
+    }
+    assert crawler.get_statistics()["link_graph"] == {"nodes": 5, "edges": 5}
+    # Only the crawled pages are picked
+    assert set(crawler.select_urls(4)) == {"https://example.com/", "https://example.com/news"}
@@ -0,0 +1,109 @@
+"""Tests for the near-duplicate detection of crawled pages"""
+
+import random
+
+import httpx
+import lxml.html
+import pytest
+
+from webportal.map_website.crawl import FastJSCrawler
+from webportal.map_website.near_duplicates import (
+    NearDuplicateIndex,
+    page_fingerprint,
+    simhash,
+    tag_paths,
+    text_shingles,
+)
+from webportal.map_website.static_fetch import StaticFetcher
+
+WORDS = [f"word{i}" for i in range(1000)]
+
+
+def article(seed: int, nb_words: int = 2000) -> str:
+    rng = random.Random(seed)
+    return " ".join(rng.choices(WORDS, k=nb_words))
+
+
+def distance(a: int, b: int) -> int:
+    return (a ^ b).bit_count()
+
+
+def test_simhash_distances():
+    text = article(0)
+    edited = text.replace(" ", " edited ", 1)
+    assert simhash(text_shingles(text)) == simhash(text_shingles(text))
+    assert distance(simhash(text_shingles(text)), simhash(text_shingles(edited))) <= 3
+    assert distance(simhash(text_shingles(text)), simhash(text_shingles(article(1)))) > 10
+
+
+def test_tag_paths_of_visible_elements():
+    document = lxml.html.document_fromstring(
+        "<html><body><div><p>a</p><p>b</p><script>x</script></div><ul><li>c</li></ul></body></html>"
+    )
+    assert sorted(tag_paths(document)) == [
+        "html",
+        "html/body",
+        "html/body/div",
+        "html/body/div/p",
+        "html/body/ul",
+        "html/body/ul/li",
+    ]
+
+
+def test_index_finds_fingerprints_within_distance():
+    index = NearDuplicateIndex(max_distance=3, max_structure_distance=0)
+    rng = random.Random(0)
+    text_hash, structure_hash = rng.getrandbits(64), rng.getrandbits(64)
+    index.add("https://example.com/a", (text_hash, structure_hash))
+
+    # 3 bits flipped in different blocks
+    near = text_hash ^ (1 << 0) ^ (1 << 20) ^ (1 << 63)
+    assert index.find((near, structure_hash)) == "https://example.com/a"
+    assert index.find((near ^ (1 << 40), structure_hash)) is None
+    # Same text, another structure
+    assert index.find((text_hash, structure_hash ^ 1)) is None
+    assert page_fingerprint("too short", ["html"]) is None
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("near_duplicate_distance", [None, 3])
+async def test_links_of_near_duplicates_are_not_followed(near_duplicate_distance):
+    def handler(request: httpx.Request) -> httpx.Response:
+        path = request.url.path
+        if path in ("/en-gb/article", "/en-us/article", "/article/print"):
+            # Alias routes and mirrors of the same article, with their own links
+            text = article(0)
+            links = [f"{path}/{i}/related-topic" for i in range(12)]
+        else:
+            text = article(len(path))
+            links = ["/en-gb/article", "/en-us/article", "/article/print"]
+        anchors = "".join(f'<li><a href="{link}">Related</a></li>' for link in links)
+        html = f"<html><head><title>Page</title></head><body><ul>{anchors}</ul><p>{text}</p></body></html>"
+        return httpx.Response(200, headers={"content-type": "text/html"}, text=html)
+
+    crawler = FastJSCrawler(
+        "https://example.com/",
+        http_first=True,
+        respect_robots=False,
+        near_duplicate_distance=near_duplicate_distance,
+    )
+    crawler.static_fetcher = StaticFetcher(
+        client=httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    )
+    await crawler.crawl_page(None, "https://example.com/", 0)
+    for path in ("/en-gb/article", "/en-us/article", "/article/print"):
+        await crawler.crawl_page(None, f"https://example.com{path}", 1)
+    await crawler.static_fetcher.aclose()
+
+    near_duplicates = crawler.get_statistics()["near_duplicates"]
+    if near_duplicate_distance is None:
+        assert near_duplicates["pages"] == 0
+    else:
+        assert near_duplicates["pages"] == 2
+        assert near_duplicates["links_not_followed"] == 24
+        assert near_duplicates["pages_saved"] > 0
+        assert len(crawler.near_duplicates) == 2
+        # Only the links of the first copy were followed
+        queued = [crawler.to_visit.get_nowait()[0] for _ in range(crawler.to_visit.qsize())]
+        assert any(url.startswith("https://example.com/en-gb/") for url in queued)
+        assert not any(url.startswith("https://example.com/en-us/") for url in queued)
@@ -0,0 +1,109 @@
+"""Tests for the recrawl cache of the crawler"""
+
+import httpx
+import pytest
+
+from webportal.map_website.crawl import FastJSCrawler
+from webportal.map_website.page_cache import PageCache
+from webportal.map_website.static_fetch import StaticFetcher
+from webportal.map_website.templates import (
+    FixedTemplateSegment,
+    Template,
+    VariableTemplateSegment,
+)
+
+ETAG = '"v1"'
+LINKS = "".join(f'<a href="/docs/section-{i}/page">Page</a>' for i in range(12))
+HTML = f"<html><head><title>Docs</title></head><body>{LINKS}<p>{'text ' * 100}</p></body></html>"
+
+
+def test_page_cache_round_trip(tmp_path):
+    cache = PageCache(tmp_path / "page_cache.sqlite")
+    cache.store("https://example.com/a", {"etag": ETAG}, "A", ["https://example.com/b"])
+    # Without validators, the page could not be revalidated
+    cache.store("https://example.com/c", {}, "C", [])
+    assert cache.get("https://example.com/a").links == ["https://example.com/b"]
+    cache.close()
+
+    cache = PageCache(tmp_path / "page_cache.sqlite")
+    cached = cache.get("https://example.com/a")
+    assert cached.title == "A"
+    assert cached.conditional_headers() == {"If-None-Match": ETAG}
+    assert cache.get("https://example.com/c") is None
+
+
+class UnusablePool:
+    def page(self):
+        raise AssertionError("unchanged pages must not be rendered")
+
+
+@pytest.mark.asyncio
+async def test_unchanged_page_reuses_cached_links(tmp_path):
+    requests = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(request)
+        if request.headers.get("if-none-match") == ETAG:
+            return httpx.Response(304)
+        return httpx.Response(
+            200, headers={"content-type": "text/html", "etag": ETAG}, text=HTML
+        )
+
+    def crawler_with_cache(http_first: bool) -> FastJSCrawler:
+        crawler = FastJSCrawler(
+            "https://example.com/docs",
+            http_first=http_first,
+            respect_robots=False,
+            page_cache=PageCache(tmp_path / "page_cache.sqlite"),
+        )
+        crawler.static_fetcher = StaticFetcher(
+            client=httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        )
+        return crawler
+
+    first = crawler_with_cache(http_first=True)
+    await first.crawl_page(UnusablePool(), "https://example.com/docs", 0)
+    first.page_cache.close()
+
+    # Next job, rendering pages with the browser unless they are unchanged
+    second = crawler_with_cache(http_first=False)
+    await second.crawl_page(UnusablePool(), "https://example.com/docs", 0)
+
+    assert requests[1].headers["if-none-match"] == ETAG
+    assert second.page_titles == {"https://example.com/docs": "Docs"}
+    assert second.get_statistics()["pages_not_modified"] == 1
+    assert second.to_visit.qsize() == first.to_visit.qsize()
+    assert len(second.pattern_templates) == len(first.pattern_templates)
+
+
+@pytest.mark.asyncio
+async def test_previous_templates_seed_the_frontier():
+    previous_templates = [
+        Template(
+            [
+                FixedTemplateSegment("https:"),
+                FixedTemplateSegment("example.com"),
+                FixedTemplateSegment("news"),
+                VariableTemplateSegment(["a", "b"]),
+            ]
+        ),
+        # Placeholders are not real URLs
+        Template(
+            [
+                FixedTemplateSegment("https:"),
+                FixedTemplateSegment("example.com"),
+                FixedTemplateSegment("{id}"),
+            ]
+        ),
+        Template([FixedTemplateSegment("https:"), FixedTemplateSegment("other.com")]),
+    ]
+    crawler = FastJSCrawler(
+        "https://example.com",
+        respect_robots=False,
+        previous_templates=previous_templates,
+    )
+
+    await crawler.seed_from_previous_templates()
+
+    assert await crawler.to_visit.get() == ("https://example.com/news/a", 1)
+    assert crawler.to_visit.empty()
@@ -0,0 +1,85 @@
+"""Tests for the request blocking of the crawler's fast mode"""
+
+import pytest
+
+from webportal.map_website.resource_blocking import ResourceBlocker
+
+
+class FakeRequest:
+    def __init__(self, url: str, resource_type: str):
+        self.url = url
+        self.resource_type = resource_type
+
+
+class FakeRoute:
+    def __init__(self, url: str, resource_type: str):
+        self.request = FakeRequest(url, resource_type)
+        self.outcome = None
+
+    async def abort(self, error_code=None):
+        self.outcome = "aborted"
+
+    async def fallback(self):
+        self.outcome = "continued"
+
+
+class FakePage:
+    def __init__(self):
+        self.handler = None
+
+    async def route(self, url, handler):
+        self.handler = handler
+
+    def on(self, event, callback):
+        pass
+
+
+def test_should_block():
+    blocker = ResourceBlocker()
+    assert blocker.should_block("image", "https://example.com/logo.png")
+    assert blocker.should_block("font", "https://example.com/font.woff2")
+    assert blocker.should_block(
+        "script", "https://www.googletagmanager.com/gtm.js?id=GTM-1"
+    )
+    assert blocker.should_block("xhr", "https://stats.g.doubleclick.net:443/collect")
+    assert not blocker.should_block("document", "https://example.com/")
+    assert not blocker.should_block("script", "https://example.com/app.js")
+    # Only parent domains match, not arbitrary suffixes
+    assert not blocker.should_block("script", "https://notdoubleclick.net/app.js")
+
+    custom = ResourceBlocker(blocked_resource_types=set(), blocked_hosts={"cdn.test"})
+    assert not custom.should_block("image", "https://example.com/logo.png")
+    assert custom.should_block("script", "https://a.cdn.test/lib.js")
+
+
+@pytest.mark.asyncio
+async def test_per_page_counters():
+    blocker = ResourceBlocker()
+    page = FakePage()
+    await blocker.install(page)
+
+    blocker.start_page(page)
+    routes = [
+        FakeRoute("https://example.com/", "document"),
+        FakeRoute("https://example.com/a.png", "image"),
+        FakeRoute("https://example.com/b.png", "image"),
+        FakeRoute("https://www.google-analytics.com/analytics.js", "script"),
+    ]
+    for route in routes:
+        await page.handler(route)
+    stats = blocker.finish_page(page)
+
+    assert [route.outcome for route in routes] == [
+        "continued",
+        "aborted",
+        "aborted",
+        "aborted",
+    ]
+    assert stats.blocked_requests == 3
+    assert stats.blocked_by_type == {"image": 2, "script": 1}
+    assert stats.estimated_bytes_saved > 0
+
+    blocker.start_page(page)
+    assert blocker.finish_page(page).blocked_requests == 0
+    assert blocker.get_statistics()["blocked_requests"] == 3
+    assert blocker.get_statistics()["pages"] == 2
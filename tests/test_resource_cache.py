@@ -0,0 +1,174 @@
+"""Tests for the shared disk cache of the static resources of rendered pages"""
+
+import asyncio
+
+import pytest
+
+from webportal.map_website.resource_cache import ResourceCache, freshness_lifetime
+
+NOW = 1_700_000_000.0
+
+
+class FakeRequest:
+    def __init__(self, url: str, resource_type: str = "script", method: str = "GET"):
+        self.url = url
+        self.resource_type = resource_type
+        self.method = method
+        self.headers = {"user-agent": "test"}
+
+
+class FakeResponse:
+    def __init__(self, status: int, headers: dict[str, str], body: bytes = b""):
+        self.status = status
+        self.headers = headers
+        self._body = body
+
+    async def body(self) -> bytes:
+        return self._body
+
+
+class FakeRoute:
+    def __init__(self, request: FakeRequest, response: FakeResponse | None = None):
+        self.request = request
+        self.response = response
+        self.fetch_headers = None
+        self.outcome = None
+        self.body = None
+
+    async def fetch(self, headers=None):
+        self.fetch_headers = headers
+        return self.response
+
+    async def fulfill(self, status=None, headers=None, body=None, response=None):
+        self.outcome = "fulfilled"
+        self.body = body
+
+    async def fallback(self):
+        self.outcome = "continued"
+
+
+class FakePage:
+    def __init__(self):
+        self.handler = None
+
+    async def route(self, url, handler):
+        self.handler = handler
+
+
+def test_freshness_lifetime():
+    assert freshness_lifetime({"cache-control": "public, max-age=3600"}, NOW) == 3600
+    assert freshness_lifetime({"cache-control": "no-store"}, NOW) is None
+    assert freshness_lifetime({"cache-control": "no-cache", "etag": '"a"'}, NOW) == 0
+    assert freshness_lifetime(
+        {
+            "date": "Tue, 14 Nov 2023 22:00:00 GMT",
+            "expires": "Tue, 14 Nov 2023 23:00:00 GMT",
+        },
+        NOW,
+    ) == 3600
+    # 10% of the age given by Last-Modified
+    assert freshness_lifetime(
+        {
+            "date": "Tue, 14 Nov 2023 22:00:00 GMT",
+            "last-modified": "Tue, 14 Nov 2023 12:00:00 GMT",
+        },
+        NOW,
+    ) == 3600
+
+
+@pytest.mark.asyncio
+async def test_resources_are_shared_across_pages_and_runs(tmp_path):
+    url = "https://cdn.example.com/app.js"
+    cache = ResourceCache(tmp_path / "resources.sqlite")
+    first_page, second_page = FakePage(), FakePage()
+    await cache.install(first_page)
+    await cache.install(second_page)
+
+    miss = FakeRoute(
+        FakeRequest(url),
+        FakeResponse(
+            200, {"cache-control": "max-age=600", "content-encoding": "gzip"}, b"x" * 1000
+        ),
+    )
+    await first_page.handler(miss)
+    hit = FakeRoute(FakeRequest(url))
+    await second_page.handler(hit)
+    assert (miss.outcome, hit.outcome, hit.body) == ("fulfilled", "fulfilled", b"x" * 1000)
+    assert cache.get(url).headers == {"cache-control": "max-age=600"}
+    cache.close()
+
+    # A later run reads the same file
+    cache = ResourceCache(tmp_path / "resources.sqlite")
+    page = FakePage()
+    await cache.install(page)
+    await page.handler(FakeRoute(FakeRequest(url)))
+    document = FakeRoute(FakeRequest("https://example.com/", "document"))
+    await page.handler(document)
+    assert document.outcome == "continued"
+    statistics = cache.get_statistics()
+    assert statistics["hits"] == 1
+    assert statistics["bytes_saved"] == 1000
+    assert statistics["size_bytes"] == 1000
+
+
+@pytest.mark.asyncio
+async def test_stale_resources_are_revalidated(tmp_path):
+    url = "https://example.com/site.css"
+    cache = ResourceCache(tmp_path / "resources.sqlite")
+    cache.store(url, 200, {"etag": '"v1"', "cache-control": "no-cache"}, b"body {}")
+
+    route = FakeRoute(
+        FakeRequest(url, "stylesheet"), FakeResponse(304, {"cache-control": "max-age=60"})
+    )
+    await cache.handle(route)
+    assert route.fetch_headers["if-none-match"] == '"v1"'
+    assert route.body == b"body {}"
+    # Fresh for 60 seconds after the revalidation
+    fresh = FakeRoute(FakeRequest(url, "stylesheet"))
+    await cache.handle(fresh)
+    assert fresh.fetch_headers is None
+    statistics = cache.get_statistics()
+    assert (statistics["revalidated"], statistics["hits"], statistics["hit_rate"]) == (1, 1, 1.0)
+
+
+def test_uncacheable_responses_are_not_stored(tmp_path):
+    cache = ResourceCache(tmp_path / "resources.sqlite")
+    assert not cache.store("https://example.com/a.js", 200, {"cache-control": "no-store"}, b"a")
+    assert not cache.store("https://example.com/b.js", 404, {"cache-control": "max-age=60"}, b"b")
+    # Neither fresh nor with validators
+    assert not cache.store("https://example.com/c.js", 200, {}, b"c")
+    assert cache.get_statistics()["size_bytes"] == 0
+
+
+def test_least_recently_used_resources_are_evicted(tmp_path):
+    cache = ResourceCache(tmp_path / "resources.sqlite", max_bytes=3000)
+    headers = {"cache-control": "max-age=600"}
+    for name in ("a", "b", "c"):
+        cache.store(f"https://example.com/{name}.js", 200, headers, b"x" * 1000)
+    cache._touch("https://example.com/a.js")
+    cache.store("https://example.com/d.js", 200, headers, b"x" * 1000)
+
+    assert cache.get("https://example.com/b.js") is None
+    assert cache.get("https://example.com/a.js") is not None
+    assert cache.get_statistics()["evicted"] == 2
+    assert cache.total_bytes == 2000
+
+
+@pytest.mark.asyncio
+async def test_concurrent_requests_share_the_connection(tmp_path):
+    cache = ResourceCache(tmp_path / "resources.sqlite")
+    headers = {"cache-control": "max-age=600"}
+    routes = [
+        FakeRoute(
+            FakeRequest(f"https://example.com/{index}.js"),
+            FakeResponse(200, headers, b"x" * 1000),
+        )
+        for index in range(20)
+    ]
+    # The SQLite reads and writes run in worker threads
+    await asyncio.gather(*(cache.handle(route) for route in routes))
+
+    assert {route.outcome for route in routes} == {"fulfilled"}
+    assert cache.get_statistics()["stored"] == 20
+    assert cache.total_bytes == 20_000
+    cache.close()
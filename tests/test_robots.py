@@ -0,0 +1,153 @@
+"""Tests for the robots.txt handling of the crawler"""
+
+import httpx
+import pytest
+
+from webportal.map_website.crawl import FastJSCrawler
+from webportal.map_website.robots import RobotsCache, RobotsRules
+from webportal.map_website.sitemap import SitemapLoader
+
+ROBOTS_TXT = """
+# Comment
+User-agent: googlebot
+Disallow: /
+
+User-agent: *
+Disallow: /private/
+Allow: /private/public
+Disallow: /*.pdf$
+Disallow: /search?
+Crawl-delay: 2
+
+Sitemap: https://example.com/sitemap_index.xml
+Sitemap: https://example.com/news/sitemap.xml
+"""
+
+
+def mock_robots_cache(robots: dict[str, str], **kwargs) -> RobotsCache:
+    """Robots cache answering from the given {origin: robots.txt} mapping, 404 otherwise"""
+    requests = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(str(request.url))
+        origin = f"{request.url.scheme}://{request.url.netloc.decode()}"
+        if origin in robots:
+            return httpx.Response(200, text=robots[origin])
+        return httpx.Response(404)
+
+    cache = RobotsCache(
+        client=httpx.AsyncClient(transport=httpx.MockTransport(handler)), **kwargs
+    )
+    cache.requests = requests
+    return cache
+
+
+def test_parse_robots_rules():
+    rules = RobotsRules.parse(ROBOTS_TXT)
+
+    assert rules.crawl_delay == 2
+    assert rules.sitemaps == [
+        "https://example.com/sitemap_index.xml",
+        "https://example.com/news/sitemap.xml",
+    ]
+    assert rules.is_allowed("/")
+    assert rules.is_allowed("/news/article")
+    assert not rules.is_allowed("/private/")
+    assert not rules.is_allowed("/private/data")
+    # The longest matching rule wins
+    assert rules.is_allowed("/private/public/page")
+    assert not rules.is_allowed("/docs/report.pdf")
+    assert rules.is_allowed("/docs/report.pdf.html")
+    assert not rules.is_allowed("/search?q=test")
+    assert rules.is_allowed("/search")
+    assert rules.is_allowed("/robots.txt")
+
+    # Our user agent group when there is one
+    assert not RobotsRules.parse(
+        "User-agent: *\nAllow: /\n\nUser-agent: WebPortal\nDisallow: /"
+    ).is_allowed("/page")
+
+
+@pytest.mark.asyncio
+async def test_robots_fetched_once_and_cached_on_disk(tmp_path):
+    cache = mock_robots_cache({"https://example.com": ROBOTS_TXT}, cache_dir=tmp_path)
+
+    assert await cache.is_allowed("https://example.com/news")
+    assert not await cache.is_allowed("https://example.com/private/x")
+    # No robots.txt: everything is allowed
+    assert await cache.is_allowed("https://support.example.com/private/x")
+    assert len(cache.requests) == 2
+
+    next_job_cache = mock_robots_cache({}, cache_dir=tmp_path)
+    assert not await next_job_cache.is_allowed("https://example.com/private/x")
+    assert next_job_cache.requests == []
+
+    expired_cache = mock_robots_cache({}, cache_dir=tmp_path, ttl=0)
+    assert await expired_cache.is_allowed("https://example.com/private/x")
+    assert len(expired_cache.requests) == 1
+
+
+@pytest.mark.asyncio
+async def test_robots_failing_to_load_allow_everything(tmp_path):
+    # The cache directory cannot be created
+    (tmp_path / "file").touch()
+    cache = mock_robots_cache(
+        {"https://example.com": ROBOTS_TXT}, cache_dir=tmp_path / "file" / "robots"
+    )
+
+    assert await cache.is_allowed("https://example.com/private/x")
+    # Not loaded again for every link of the host
+    assert await cache.is_allowed("https://example.com/private/y")
+    assert len(cache.requests) == 1
+    assert cache._loading == {}
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("prefiltered", [False, True])
+async def test_crawler_applies_robots_rules(prefiltered):
+    crawler = FastJSCrawler("https://example.com")
+    crawler.robots = mock_robots_cache(
+        {"https://example.com": ROBOTS_TXT},
+        cache_dir=None,
+        on_load=crawler._apply_robots_rules,
+    )
+
+    new_links = await crawler.process_links(
+        [
+            "https://example.com/private/data",
+            "https://example.com/docs/guide",
+            "https://example.com/search?q=x",
+        ],
+        0,
+        # Links filtered in the page keep their query for the rules matching it
+        prefiltered=prefiltered,
+    )
+
+    assert new_links == ["https://example.com/docs/guide"]
+    assert crawler.get_statistics()["links_disallowed_by_robots"] == 2
+    assert crawler.host_scheduler.hosts["example.com"].crawl_delay == 2
+
+
+@pytest.mark.asyncio
+async def test_sitemaps_of_robots_are_loaded():
+    news_sitemap = b"""<?xml version="1.0" encoding="UTF-8"?>
+<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">
+  <url><loc>https://example.com/news/a</loc></url>
+  <url><loc>https://example.com/news/b</loc></url>
+</urlset>"""
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        if str(request.url) == "https://example.com/news/sitemap.xml":
+            return httpx.Response(200, content=news_sitemap)
+        return httpx.Response(404)
+
+    crawler = FastJSCrawler("https://example.com")
+    crawler.robots = mock_robots_cache(
+        {"https://example.com": ROBOTS_TXT}, cache_dir=None
+    )
+    crawler.sitemap_loader = SitemapLoader(
+        client=httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    )
+
+    assert await crawler.load_sitemap() == 2
+    assert crawler.visited == {"https://example.com/news/a", "https://example.com/news/b"}
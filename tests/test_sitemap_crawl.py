@@ -1,10 +1,14 @@
 """Tests for sitemap functionality in crawl.py"""
 
-from unittest.mock import Mock, patch
+import asyncio
+import gzip
 
-import requests
+import httpx
+import pytest
 
-from src.webportal.get_skeleton.crawl import FastJSCrawler
+from webportal.map_website.checkpoint import CrawlCheckpoint
+from webportal.map_website.crawl import FastJSCrawler
+from webportal.map_website.sitemap import SitemapLoader, SitemapStreamParser
 
 # Sample sitemap XML content for testing
 SAMPLE_SITEMAP_XML = """<?xml version="1.0" encoding="UTF-8"?>
@@ -48,73 +52,150 @@ SIMPLE_SITEMAP_XML = """<?xml version="1.0" encoding="UTF-8"?>
 """
 
 
+SITEMAP_INDEX_XML = """<?xml version="1.0" encoding="UTF-8"?>
+<sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">
+    <sitemap>
+        <loc>https://example.com/sitemap-pages.xml</loc>
+    </sitemap>
+    <sitemap>
+        <loc>https://example.com/sitemap-nested-index.xml</loc>
+    </sitemap>
+</sitemapindex>
+"""
+
+NESTED_SITEMAP_INDEX_XML = """<?xml version="1.0" encoding="UTF-8"?>
+<sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">
+    <sitemap>
+        <loc>https://example.com/sitemap-articles.xml.gz</loc>
+    </sitemap>
+</sitemapindex>
+"""
+
+
+def mock_sitemap_loader(sitemaps: dict[str, bytes]) -> SitemapLoader:
+    """Sitemap loader answering from the given {url: body} mapping, 404 otherwise"""
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        body = sitemaps.get(str(request.url))
+        if body is None:
+            return httpx.Response(404)
+        return httpx.Response(200, content=body)
+
+    client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    return SitemapLoader(concurrency=2, client=client)
+
+
+def collect_urls(loader: SitemapLoader, sitemap_url: str) -> list[str]:
+    async def collect():
+        return [url async for url in loader.iter_page_urls([sitemap_url])]
+
+    return asyncio.run(collect())
+
+
 def test_load_sitemap_success():
     """Test successful sitemap loading"""
-    crawler = FastJSCrawler("https://example.com", use_sitemap=True)
+    loader = mock_sitemap_loader(
+        {"https://example.com/sitemap.xml": SAMPLE_SITEMAP_XML.encode("utf-8")}
+    )
+    urls = collect_urls(loader, "https://example.com/sitemap.xml")
 
-    # Mock the requests.get call
-    mock_response = Mock()
-    mock_response.content = SAMPLE_SITEMAP_XML.encode("utf-8")
-    mock_response.raise_for_status = Mock()
-
-    with patch("requests.get", return_value=mock_response) as mock_get:
-        urls = crawler.load_sitemap()
-
-        # Verify the request was made correctly
-        mock_get.assert_called_once_with("https://example.com/sitemap.xml", timeout=10)
-        mock_response.raise_for_status.assert_called_once()
-
-        # Verify URLs were extracted correctly
-        expected_urls = [
-            "https://example.com/",
-            "https://example.com/page1",
-            "https://example.com/page2",
-            "https://example.com/category/item1",
-            "https://example.com/category/item2",
-            "https://example.com/deep/nested/path/page",
-            "https://example.com/static/style.css",
-            "https://otherdomain.com/external",
-        ]
-        assert len(urls) == len(expected_urls)
-        assert all(url in urls for url in expected_urls)
+    expected_urls = [
+        "https://example.com/",
+        "https://example.com/page1",
+        "https://example.com/page2",
+        "https://example.com/category/item1",
+        "https://example.com/category/item2",
+        "https://example.com/deep/nested/path/page",
+        "https://example.com/static/style.css",
+        "https://otherdomain.com/external",
+    ]
+    assert urls == expected_urls
 
 
 def test_load_sitemap_no_namespace():
     """Test sitemap loading without XML namespace"""
-    crawler = FastJSCrawler("https://example.com", use_sitemap=True)
-
-    mock_response = Mock()
-    mock_response.content = SIMPLE_SITEMAP_XML.encode("utf-8")
-    mock_response.raise_for_status = Mock()
-
-    with patch("requests.get", return_value=mock_response):
-        urls = crawler.load_sitemap()
-
-        expected_urls = ["https://example.com/", "https://example.com/simple"]
-        assert len(urls) == 2
-        assert all(url in urls for url in expected_urls)
+    loader = mock_sitemap_loader(
+        {"https://example.com/sitemap.xml": SIMPLE_SITEMAP_XML.encode("utf-8")}
+    )
+    urls = collect_urls(loader, "https://example.com/sitemap.xml")
+    assert urls == ["https://example.com/", "https://example.com/simple"]
+
+
+def test_load_sitemap_index_recursive_and_gzip():
+    """Test that sitemap indexes are followed at any depth, including gzipped sitemaps"""
+    loader = mock_sitemap_loader(
+        {
+            "https://example.com/sitemap.xml": SITEMAP_INDEX_XML.encode("utf-8"),
+            "https://example.com/sitemap-pages.xml": SIMPLE_SITEMAP_XML.encode("utf-8"),
+            "https://example.com/sitemap-nested-index.xml": NESTED_SITEMAP_INDEX_XML.encode(
+                "utf-8"
+            ),
+            "https://example.com/sitemap-articles.xml.gz": gzip.compress(
+                SAMPLE_SITEMAP_XML.encode("utf-8")
+            ),
+        }
+    )
+    urls = collect_urls(loader, "https://example.com/sitemap.xml")
+
+    # Sitemap entries are followed, not returned as pages
+    assert not any("sitemap" in url for url in urls)
+    assert "https://example.com/simple" in urls
+    assert "https://example.com/deep/nested/path/page" in urls
+    assert len(urls) == 10
+
+
+def test_load_sitemap_index_deep_and_cyclic():
+    """Test that a long chain of indexes is followed, and that cycles between indexes end"""
+
+    def index(*locs: str) -> bytes:
+        entries = "".join(f"<sitemap><loc>{loc}</loc></sitemap>" for loc in locs)
+        return f'<sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">{entries}</sitemapindex>'.encode()
+
+    sitemaps = {
+        f"https://example.com/index-{i}.xml": index(
+            f"https://example.com/index-{i + 1}.xml", "https://example.com/index-0.xml"
+        )
+        for i in range(10)
+    }
+    sitemaps["https://example.com/index-10.xml"] = SIMPLE_SITEMAP_XML.encode("utf-8")
+    urls = collect_urls(
+        mock_sitemap_loader(sitemaps), "https://example.com/index-0.xml"
+    )
+    assert urls == ["https://example.com/", "https://example.com/simple"]
+
+
+def test_stream_parser_byte_by_byte():
+    """Test that the parser handles arbitrary chunking of gzipped content"""
+    parser = SitemapStreamParser()
+    entries = []
+    for byte in gzip.compress(SITEMAP_INDEX_XML.encode("utf-8")):
+        entries += parser.feed(bytes([byte]))
+    entries += parser.close()
+    assert entries == [
+        ("sitemap", "https://example.com/sitemap-pages.xml"),
+        ("sitemap", "https://example.com/sitemap-nested-index.xml"),
+    ]
 
 
 def test_load_sitemap_request_failure():
     """Test sitemap loading when request fails"""
-    crawler = FastJSCrawler("https://example.com", use_sitemap=True)
+    loader = mock_sitemap_loader({})
+    assert collect_urls(loader, "https://example.com/sitemap.xml") == []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        raise httpx.ConnectError("Not found")
 
-    with patch("requests.get", side_effect=requests.RequestException("Not found")):
-        urls = crawler.load_sitemap()
-        assert urls == []
+    client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    loader = SitemapLoader(client=client)
+    assert collect_urls(loader, "https://example.com/sitemap.xml") == []
 
 
 def test_load_sitemap_invalid_xml():
     """Test sitemap loading with invalid XML"""
-    crawler = FastJSCrawler("https://example.com", use_sitemap=True)
-
-    mock_response = Mock()
-    mock_response.content = b"Not valid XML content"
-    mock_response.raise_for_status = Mock()
-
-    with patch("requests.get", return_value=mock_response):
-        urls = crawler.load_sitemap()
-        assert urls == []
+    loader = mock_sitemap_loader(
+        {"https://example.com/sitemap.xml": b"Not valid XML content"}
+    )
+    assert collect_urls(loader, "https://example.com/sitemap.xml") == []
 
 
 def test_filter_sitemap_urls_max_pages():
@@ -191,87 +272,73 @@ def test_filter_sitemap_urls_max_depth():
     assert filtered == expected
 
 
-def test_sitemap_url_pattern_extraction():
+@pytest.mark.asyncio
+async def test_sitemap_url_pattern_extraction():
     """Test that sitemap URLs are processed into templates correctly"""
-    crawler = FastJSCrawler("https://example.com", use_sitemap=True)
+    crawler = FastJSCrawler("https://example.com", use_sitemap=True, respect_robots=False)
+    crawler.sitemap_loader = mock_sitemap_loader(
+        {"https://example.com/sitemap.xml": SAMPLE_SITEMAP_XML.encode("utf-8")}
+    )
+
+    nb_urls = await crawler.load_sitemap()
+
+    # Static assets and other domains are filtered out
+    assert nb_urls == 6
+    assert "https://otherdomain.com/external" not in crawler.visited
+
+    # Verify that templates were created
+    assert len(crawler.pattern_templates) > 0
+
+    # Check that similar URLs created variable templates
+    # Both /category/item1 and /category/item2 should create a template with variable segment
+    category_templates = [
+        t
+        for t in crawler.pattern_templates
+        if any(
+            hasattr(seg, "example") and seg.example == "category" for seg in t.segments
+        )
+    ]
+    assert len(category_templates) > 0
 
-    # Mock successful sitemap loading
-    mock_response = Mock()
-    mock_response.content = SAMPLE_SITEMAP_XML.encode("utf-8")
-    mock_response.raise_for_status = Mock()
-
-    with patch("requests.get", return_value=mock_response):
-        # Test the full sitemap processing workflow
-        sitemap_urls = crawler.load_sitemap()
-        filtered_urls = crawler.filter_sitemap_urls(sitemap_urls)
-
-        # Process URLs to build templates
-        for url in filtered_urls:
-            normalized_url = crawler.normalize_url(url)
-            normalized_url = crawler._replace_with_generic_pattern_if_necessary(
-                normalized_url
-            )
-
-            matching_template_index = crawler.matches_existing_template(normalized_url)
-            if matching_template_index == -1:
-                crawler.log_new_fixed_template(normalized_url)
-
-        # Verify that templates were created
-        assert len(crawler.pattern_templates) > 0
-
-        # Check that similar URLs created variable templates
-        # Both /category/item1 and /category/item2 should create a template with variable segment
-        category_templates = [
-            t
-            for t in crawler.pattern_templates
-            if any(
-                hasattr(seg, "example") and seg.example == "category"
-                for seg in t.segments
-            )
-        ]
-        assert len(category_templates) > 0
-
-
-def test_crawl_with_sitemap_sync():
-    """Test sitemap workflow synchronously"""
-    crawler = FastJSCrawler("https://example.com", max_pages=5, use_sitemap=True)
-
-    # Mock successful sitemap loading
-    mock_response = Mock()
-    mock_response.content = SAMPLE_SITEMAP_XML.encode("utf-8")
-    mock_response.raise_for_status = Mock()
-
-    with patch("requests.get", return_value=mock_response):
-        # Test the sitemap loading and filtering workflow
-        sitemap_urls = crawler.load_sitemap()
-        filtered_urls = crawler.filter_sitemap_urls(sitemap_urls)
-
-        # Process URLs to build templates (mimicking what crawl() does)
-        for url in filtered_urls:
-            normalized_url = crawler.normalize_url(url)
-            normalized_url = crawler._replace_with_generic_pattern_if_necessary(
-                normalized_url
-            )
-
-            matching_template_index = crawler.matches_existing_template(normalized_url)
-            if matching_template_index == -1:
-                crawler.log_new_fixed_template(normalized_url)
-
-            crawler.visited.add(url)
-
-        # Verify that URLs were processed
-        assert len(crawler.visited) > 0
-        assert len(crawler.pattern_templates) > 0
-
-        # Verify max_pages was respected
-        assert len(crawler.visited) <= 5
-
-
-def test_sitemap_fallback_detection():
+
+@pytest.mark.asyncio
+async def test_crawl_with_sitemap():
+    """Test that crawl() builds the templates from the sitemap and respects max_pages"""
+    crawler = FastJSCrawler("https://example.com", max_pages=5, use_sitemap=True, respect_robots=False)
+    crawler.sitemap_loader = mock_sitemap_loader(
+        {"https://example.com/sitemap.xml": SAMPLE_SITEMAP_XML.encode("utf-8")}
+    )
+
+    await crawler.crawl()
+
+    assert len(crawler.visited) == 5
+    assert len(crawler.pattern_templates) > 0
+
+
+@pytest.mark.asyncio
+async def test_crawl_with_sitemap_saves_and_closes_the_checkpoint(tmp_path):
+    checkpoint = CrawlCheckpoint(tmp_path / "crawl.sqlite")
+    crawler = FastJSCrawler(
+        "https://example.com",
+        use_sitemap=True,
+        respect_robots=False,
+        checkpoint=checkpoint,
+    )
+    crawler.sitemap_loader = mock_sitemap_loader(
+        {"https://example.com/sitemap.xml": SAMPLE_SITEMAP_XML.encode("utf-8")}
+    )
+
+    await crawler.crawl()
+
+    assert checkpoint.connection is None
+    state = CrawlCheckpoint(tmp_path / "crawl.sqlite").load()
+    assert len(state.templates) == len(crawler.pattern_templates)
+
+
+@pytest.mark.asyncio
+async def test_sitemap_fallback_detection():
     """Test that crawler detects when sitemap fails"""
-    crawler = FastJSCrawler("https://example.com", use_sitemap=True)
+    crawler = FastJSCrawler("https://example.com", use_sitemap=True, respect_robots=False)
+    crawler.sitemap_loader = mock_sitemap_loader({})
 
-    # Mock failed sitemap loading
-    with patch("requests.get", side_effect=requests.RequestException("Not found")):
-        urls = crawler.load_sitemap()
-        assert urls == []  # Should return empty list on failure
+    assert await crawler.load_sitemap() == 0  # Crawl falls back to the browser
@@ -0,0 +1,128 @@
+"""Tests for the HTTP-first page fetching of the crawler"""
+
+import httpx
+import pytest
+
+from webportal.map_website.crawl import FastJSCrawler
+from webportal.map_website.static_fetch import (
+    StaticFetcher,
+    StaticPage,
+    escalation_reason,
+    parse_static_page,
+)
+
+PARAGRAPH = "<p>" + "Some server-rendered article text. " * 20 + "</p>"
+
+
+def static_page(html: str, url: str = "https://example.com/news") -> StaticPage:
+    page = StaticPage(url, 200, "text/html; charset=utf-8", html)
+    parse_static_page(page)
+    return page
+
+
+def article_html(nb_links: int) -> str:
+    links = "".join(
+        f'<a href="/news/article-{i}">Article {i}</a>' for i in range(nb_links)
+    )
+    return f"<html><head><title> News </title></head><body>{links}{PARAGRAPH}</body></html>"
+
+
+def test_parse_static_page_links():
+    page = static_page(
+        """<html><head><title>Home</title></head><body>
+        <a href="/about#team">About</a>
+        <a href="https://example.com/contact">Contact</a>
+        <a href="/about#team">About again</a>
+        <div onclick="window.location='/jobs'">Jobs</div>
+        <span data-href="/events">Events</span>
+        <router-link to="/blog">Blog</router-link>
+        <script>document.write('<a href="/hidden">')</script>
+        </body></html>"""
+    )
+
+    assert page.title == "Home"
+    assert page.links == [
+        "https://example.com/about#team",
+        "https://example.com/contact",
+        "https://example.com/jobs",
+        "https://example.com/events",
+        "https://example.com/blog",
+    ]
+
+
+def test_escalation_reasons():
+    assert escalation_reason(static_page(article_html(20))) is None
+    assert (
+        escalation_reason(
+            static_page('<html><body><div id="root"></div><script src="/app.js"></script></body></html>')
+        )
+        == "spa_root"
+    )
+    assert escalation_reason(static_page("<html><body><a href='/a'>A</a></body></html>")) == "empty_body"
+    assert (
+        escalation_reason(
+            static_page(
+                f"<html><body>{PARAGRAPH}<noscript>Please enable JavaScript to use this site</noscript></body></html>"
+            )
+        )
+        == "noscript"
+    )
+    # The browser found many more links on pages of the same template
+    assert escalation_reason(static_page(article_html(20)), expected_links=60) == "few_links"
+    assert escalation_reason(StaticPage("https://example.com", 404, "text/html")) == "http_status"
+    assert escalation_reason(StaticPage("https://example.com", error="timeout")) == "fetch_error"
+
+
+class UnusablePool:
+    def page(self):
+        raise AssertionError("the browser must not be used for static pages")
+
+
+@pytest.mark.asyncio
+async def test_crawl_page_without_browser():
+    def handler(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(
+            200, headers={"content-type": "text/html"}, text=article_html(12)
+        )
+
+    crawler = FastJSCrawler(
+        "https://example.com/news", http_first=True, respect_robots=False
+    )
+    crawler.static_fetcher = StaticFetcher(
+        client=httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    )
+
+    await crawler.crawl_page(UnusablePool(), "https://example.com/news", 0)
+
+    assert crawler.page_titles["https://example.com/news"] == "News"
+    assert crawler.to_visit.qsize() > 0
+    stats = crawler.get_statistics()
+    assert stats["pages_without_browser"] == 1
+    assert stats["pages_with_browser"] == 0
+    await crawler.static_fetcher.aclose()
+
+
+@pytest.mark.asyncio
+async def test_crawl_page_escalates_to_browser():
+    def handler(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(
+            200,
+            headers={"content-type": "text/html"},
+            text='<html><body><div id="app"></div></body></html>',
+        )
+
+    crawler = FastJSCrawler(
+        "https://example.com/news", http_first=True, respect_robots=False
+    )
+    crawler.static_fetcher = StaticFetcher(
+        client=httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    )
+
+    # The error raised by the pool is caught by the crawler, like a failed navigation
+    await crawler.crawl_page(UnusablePool(), "https://example.com/news", 0)
+
+    stats = crawler.get_statistics()
+    assert stats["pages_without_browser"] == 0
+    assert stats["pages_with_browser"] == 1
+    assert stats["browser_escalations"] == {"spa_root": 1}
+    await crawler.static_fetcher.aclose()
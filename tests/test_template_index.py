@@ -0,0 +1,167 @@
+"""Tests for the template index used by FastJSCrawler.matches_existing_template"""
+
+import copy
+import random
+
+import pytest
+
+from webportal.map_website.crawl import (
+    FastJSCrawler,
+    FixedTemplateSegment,
+    Template,
+    VariableTemplateSegment,
+)
+from webportal.map_website.templates import TemplateIndex, TemplateModel
+
+
+def _reference_match(templates: list[Template], segments: list[str]) -> int:
+    """Linear scan implementing the matching criterion, without side effects"""
+    for template_index, template in enumerate(templates):
+        if len(template.segments) != len(segments):
+            continue
+        differences = [
+            isinstance(template_segment, FixedTemplateSegment)
+            and template_segment.example != segment
+            for segment, template_segment in zip(segments, template.segments)
+        ]
+        if not any(differences):
+            return template_index
+        fully_fixed = all(
+            isinstance(template_segment, FixedTemplateSegment)
+            for template_segment in template.segments
+        )
+        if fully_fixed and sum(differences) == 1:
+            return template_index
+    return -1
+
+
+def test_match_promotes_and_collects_examples():
+    crawler = FastJSCrawler("https://arxiv.org")
+    crawler.log_new_fixed_template("https://arxiv.org/abs/2507.14279")
+    crawler.log_new_fixed_template("https://arxiv.org/list/cs.AI/recent")
+
+    assert crawler.matches_existing_template("https://arxiv.org/abs/2507.14279") == 0
+    assert crawler.matches_existing_template("https://arxiv.org/abs/2507.14280") == 0
+    assert crawler.pattern_templates[0].segments[-1].examples == [
+        "2507.14279",
+        "2507.14280",
+    ]
+    # Differs at two positions from the first template
+    assert crawler.matches_existing_template("https://arxiv.org/pdf/2507.1") == -1
+    assert crawler.matches_existing_template("https://arxiv.org/list/cs.LG/recent") == 1
+    assert crawler.matches_existing_template("https://arxiv.org/list/cs.CV/recent") == 1
+    assert crawler.pattern_templates[1].segments[3].examples == [
+        "cs.AI",
+        "cs.LG",
+        "cs.CV",
+    ]
+    assert crawler.matches_existing_template("") == -1
+
+
+def test_pattern_templates_assignment_rebuilds_index():
+    crawler = FastJSCrawler("https://github.com")
+    crawler.pattern_templates = [
+        Template(
+            segments=[
+                FixedTemplateSegment(example="github.com"),
+                VariableTemplateSegment(examples=["tree", "blob"]),
+                FixedTemplateSegment(example="main"),
+            ]
+        ),
+        Template(
+            segments=[
+                FixedTemplateSegment(example="github.com"),
+                FixedTemplateSegment(example="tree"),
+                FixedTemplateSegment(example="main"),
+            ]
+        ),
+    ]
+    assert crawler.matches_existing_template("github.com/tree/main") == 0
+    assert crawler.matches_existing_template("github.com/raw/main") == 0
+    assert crawler.pattern_templates[0].segments[1].examples == ["tree", "blob", "raw"]
+
+
+def test_index_agrees_with_linear_scan():
+    rng = random.Random(0)
+    alphabet = ["a", "b", "c", "d"]
+    index = TemplateIndex()
+    reference_templates: list[Template] = []
+
+    for _ in range(3000):
+        segments = [rng.choice(alphabet) for _ in range(rng.randint(1, 4))]
+        expected = _reference_match(reference_templates, segments)
+        assert index.match(segments) == expected
+        if expected == -1:
+            new_template = Template(
+                segments=[FixedTemplateSegment(example=s) for s in segments]
+            )
+            index.add(new_template)
+            reference_templates.append(copy.deepcopy(new_template))
+        else:
+            # Mirror the promotion on the reference templates
+            reference_templates[expected] = copy.deepcopy(index.templates[expected])
+
+    assert [t.to_model() for t in index.templates] == [
+        t.to_model() for t in reference_templates
+    ]
+
+
+def test_variable_segment_examples_are_bounded():
+    segment = VariableTemplateSegment(examples=["a", "b"])
+    for i in range(10 * VariableTemplateSegment.MAX_EXAMPLES):
+        segment.add_example(f"value-{i}")
+    segment.add_example("a")
+
+    assert len(segment.examples) == VariableTemplateSegment.MAX_EXAMPLES
+    assert segment.examples[:3] == ["a", "b", "value-0"]  # Displayed examples are kept
+    assert segment.total_count == 10 * VariableTemplateSegment.MAX_EXAMPLES + 3
+    assert "a" in segment and "never-seen" not in segment
+
+
+def test_repeated_values_do_not_crowd_out_new_ones():
+    random.seed(0)
+    segment = VariableTemplateSegment()
+    for i in range(VariableTemplateSegment.MAX_EXAMPLES):
+        segment.add_example(f"value-{i}")
+    for _ in range(100 * VariableTemplateSegment.MAX_EXAMPLES):
+        segment.add_example("value-0")
+    for i in range(VariableTemplateSegment.MAX_EXAMPLES):
+        segment.add_example(f"new-{i}")
+
+    # About half of the non-pinned slots, against ~1 if the repeated values counted in the sampling
+    nb_new = sum(example.startswith("new-") for example in segment.examples)
+    assert nb_new > VariableTemplateSegment.MAX_EXAMPLES // 4
+
+
+def test_template_model_round_trip():
+    template = Template(
+        segments=[
+            FixedTemplateSegment(example="arxiv.org"),
+            VariableTemplateSegment(examples=["abs", "pdf"], total_count=12),
+        ],
+        example="https://arxiv.org/abs",
+    )
+    model = TemplateModel.model_validate_json(template.to_model().model_dump_json())
+    restored = Template.from_model(model)
+
+    assert restored.segments[0].example == "arxiv.org"
+    assert restored.segments[1].examples == ["abs", "pdf"]
+    assert restored.segments[1].total_count == 12
+    assert restored.example_url() == "https://arxiv.org/abs"
+
+
+@pytest.mark.asyncio
+async def test_frontier_gets_real_pages_of_templates_with_placeholders():
+    crawler = FastJSCrawler("https://example.com/", respect_robots=False)
+    crawler.add_url_to_templates("https://example.com/blog/a1b2c3d4e5f6a7b8c9d0/post")
+
+    new_links = await crawler.process_links(
+        ["https://example.com/jobs/123456/details#apply"], 0
+    )
+
+    assert new_links == ["https://example.com/jobs/123456/details"]
+    assert crawler.to_visit.get_nowait() == ("https://example.com/jobs/123456/details", 1)
+    blog, jobs = crawler.pattern_templates
+    assert "{" in "/".join(segment.example for segment in jobs.segments)
+    assert jobs.example_url() == "https://example.com/jobs/123456/details"
+    assert blog.example_url() == "https://example.com/blog/a1b2c3d4e5f6a7b8c9d0/post"
@@ -0,0 +1,144 @@
+"""Regression fixtures for the inference of URL templates, over one or several variable positions"""
+
+import itertools
+import random
+
+import pytest
+
+from webportal.map_website.crawl import FastJSCrawler
+from webportal.map_website.templates import (
+    MIN_VALUES_TO_GENERALIZE,
+    FixedTemplateSegment,
+    Template,
+    TemplateIndex,
+)
+
+SUBJECTS = ["physics", "biology", "chemistry", "climate", "astronomy", "genetics"]
+SLUGS = ["cell-biology", "quantum-optics", "ocean-warming", "dark-matter"]
+
+
+def render(template: Template) -> str:
+    return "/".join(
+        segment.example
+        if isinstance(segment, FixedTemplateSegment)
+        else "{" + "|".join(segment.examples) + "}"
+        for segment in template.segments
+    )
+
+
+def infer(urls: list[str], min_values_to_generalize: int | None) -> tuple[list[int], list[str]]:
+    """Template index of each URL (-1 for a new template, i.e. a queued page), and the templates"""
+    crawler = FastJSCrawler(
+        "https://example.com", min_values_to_generalize=min_values_to_generalize
+    )
+    indices = [crawler.add_url_to_templates(url) for url in urls]
+    return indices, [render(template) for template in crawler.pattern_templates]
+
+
+# (URLs in discovery order, index of the template of each URL, templates), from the cases of
+# `test_crawler_logs_variable_template`: single variable positions, the same with or without
+# generalization over several positions
+SINGLE_POSITION_FIXTURES = [
+    (
+        ["https://arxiv.org/abs/", "https://arxiv.org/pdf/", "https://arxiv.org/html/"],
+        [-1, 0, 0],
+        ["https:/arxiv.org/{abs|pdf|html}"],
+    ),
+    (
+        [
+            "https://arxiv.org/abs/2507.14279",
+            "https://arxiv.org/abs/2507.14280",
+            "https://arxiv.org/abs/2507.14260",
+        ],
+        [-1, 0, 0],
+        ["https:/arxiv.org/abs/{version}"],
+    ),
+    (
+        [
+            "https://www.nature.com/naturecareers/job/12841799/687/v1.2.3/139941a0/v12/postdoctoral-researchers-in-experimental-condensed-matter-physics/",
+            "https://www.nature.com/naturecareers/job/12841800/688/v1.2.4/139941a1/v13/postdoctoral-researchers-in-experimental-condensed-matter-physics/",
+        ],
+        [-1, 0],
+        [
+            "https:/www.nature.com/naturecareers/job/{hash}/{id}/{version}/{hash}/{version}/postdoctoral-researchers-in-experimental-condensed-matter-physics"
+        ],
+    ),
+]
+
+
+@pytest.mark.parametrize("urls, indices, templates", SINGLE_POSITION_FIXTURES)
+@pytest.mark.parametrize("min_values_to_generalize", [None, MIN_VALUES_TO_GENERALIZE])
+def test_single_position_fixtures(urls, indices, templates, min_values_to_generalize):
+    assert infer(urls, min_values_to_generalize) == (indices, templates)
+
+
+def test_generalizes_over_several_positions():
+    urls = [f"https://www.nature.com/{subject}/journal/{slug}" for subject, slug in itertools.product(SUBJECTS, SLUGS)]  # fmt: skip
+    random.Random(1).shuffle(urls)
+
+    indices, templates = infer(urls, None)
+    assert indices.count(-1) == 7
+    assert len(templates) == 7
+
+    indices, templates = infer(urls, MIN_VALUES_TO_GENERALIZE)
+    assert indices.count(-1) == 3
+    assert len(templates) == 1
+    variable_subjects, _, variable_slugs = templates[0].split("/")[2:]
+    assert sorted(variable_subjects.strip("{}").split("|")) == sorted(SUBJECTS)
+    assert sorted(variable_slugs.strip("{}").split("|")) == sorted(SLUGS)
+
+
+def test_generalization_needs_evidence():
+    urls = [
+        "https://example.com/physics/journal/cell-biology",
+        "https://example.com/physics/journal/dark-matter",
+        "https://example.com/biology/journal/ocean-warming",
+    ]
+    # Two subjects: not enough to generalize
+    indices, templates = infer(urls, 3)
+    assert indices == [-1, 0, -1]
+    assert templates[1] == "https:/example.com/biology/journal/ocean-warming"
+
+    # The third subject generalizes the first template, which absorbs the second
+    indices, templates = infer(urls + ["https://example.com/climate/journal/dark-matter"], 3)
+    assert indices[-1] == 0
+    assert templates == [
+        "https:/example.com/{physics|biology|climate}/journal/{cell-biology|dark-matter|ocean-warming}"
+    ]
+
+
+def test_generalized_templates_keep_a_fixed_path_segment():
+    urls = [
+        f"https://example.com/{subject}/{topic}/{slug}"
+        for subject, topic, slug in itertools.product(SUBJECTS[:4], ["news", "reviews"], SLUGS)
+    ]
+    indices, templates = infer(urls, 2)
+    # /{subject}/{topic}/{slug} would match every URL with 3 path segments
+    assert len(templates) > 1
+    assert all("{" in template.split("/")[-1] for template in templates)
+    assert indices.count(-1) == len(templates)
+
+
+def test_index_without_generalization_is_unchanged():
+    index = TemplateIndex()
+    for segments in (["https:", "a.com", "x", "j", "1"], ["https:", "a.com", "y", "j", "2"]):
+        index.add(Template([FixedTemplateSegment(example=s) for s in segments]))
+    index.match(["https:", "a.com", "x", "j", "3"])
+    index.match(["https:", "a.com", "y", "j", "4"])
+
+    assert index.match(["https:", "a.com", "z", "j", "5"]) == -1
+    assert len(index) == index.nb_added == 2
+
+
+def test_urls_keep_matching_after_generalization():
+    rng = random.Random(0)
+    index = TemplateIndex(min_values_to_generalize=2)
+    seen = []
+    for _ in range(3000):
+        segments = ["https:", "a.com"] + [rng.choice("abcd") for _ in range(rng.randint(1, 4))]
+        if index.match(segments) == -1:
+            index.add(Template([FixedTemplateSegment(example=s) for s in segments]))
+        seen.append(segments)
+
+    assert all(index.match(segments, update=False) != -1 for segments in seen)
+    assert len(index) < index.nb_added
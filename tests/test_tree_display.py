@@ -3,7 +3,7 @@
 Test script for the tree display functionality
 """
 
-from src.webportal.get_skeleton.crawl import (
+from webportal.map_website.crawl import (
     FastJSCrawler,
     FixedTemplateSegment,
     Template,
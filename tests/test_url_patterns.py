@@ -0,0 +1,61 @@
+"""Tests for the generic URL segment classification"""
+
+import random
+import re
+
+from webportal.map_website.url_patterns import (
+    classify_segment,
+    replace_with_generic_pattern,
+)
+
+# Former per-call pattern list, tried one after the other
+LEGACY_SEGMENT_PATTERNS = [
+    (r"^[a-f0-9]{8}-[a-f0-9]{4}-[a-f0-9]{4}-[a-f0-9]{4}-[a-f0-9]{12}$", "{uuid}"),
+    (r"^[a-f0-9]{8,}$", "{hash}"),
+    (r"^\d+$", "{id}"),
+    (r"^v?\d+(\.\d+)*$", "{version}"),
+    (r"^(?!.*[a-zA-Z]{3}).*$", "{id}"),
+]
+
+
+def legacy_classify_segment(segment: str) -> str:
+    for pattern_regex, pattern_name in LEGACY_SEGMENT_PATTERNS:
+        if re.match(pattern_regex, segment):
+            return pattern_name
+    return segment
+
+
+def test_classify_segment():
+    assert classify_segment("0b4e7a0e-5fe5-4b6d-9c3a-1f2e3d4c5b6a") == "{uuid}"
+    assert classify_segment("139941a0") == "{hash}"
+    assert classify_segment("12841799") == "{hash}"
+    assert classify_segment("687") == "{id}"
+    assert classify_segment("v1.2.3") == "{version}"
+    assert classify_segment("2024.1.1") == "{version}"
+    assert classify_segment("a1-b2") == "{id}"
+    assert classify_segment("postdoctoral-researchers") == "postdoctoral-researchers"
+
+
+def test_same_output_as_legacy_patterns():
+    rng = random.Random(0)
+    alphabet = "abcdefvxyzABC0123456789-._~"
+    segments = [
+        "".join(rng.choices(alphabet, k=rng.randint(1, 40))) for _ in range(5000)
+    ]
+    segments += ["abs", "12345678-1234-1234-1234-123456789abc", "v12", "١٢٣", "ab\n"]
+    for segment in segments:
+        assert classify_segment(segment) == legacy_classify_segment(segment), segment
+
+
+def test_replace_with_generic_pattern():
+    assert (
+        replace_with_generic_pattern(
+            "https://www.nature.com/naturecareers/job/12841799/687/v1.2.3/139941a0/v12/postdoctoral-researchers/"
+        )
+        == "https://www.nature.com/naturecareers/job/{hash}/{id}/{version}/{hash}/{version}/postdoctoral-researchers/"
+    )
+    assert replace_with_generic_pattern("https://arxiv.org/abs/2507.14279") == "https://arxiv.org/abs/{version}"
+    # Empty segments and relative URLs are kept as they are
+    assert replace_with_generic_pattern("https://arxiv.org//abs/") == "https://arxiv.org//abs/"
+    assert replace_with_generic_pattern("relative/path/42") == "relative/path/{id}"
+    assert replace_with_generic_pattern("") == ""
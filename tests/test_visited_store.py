@@ -0,0 +1,98 @@
+"""Tests for the compact stores of visited URLs"""
+
+import httpx
+import pytest
+
+from webportal.map_website.crawl import FastJSCrawler
+from webportal.map_website.static_fetch import StaticFetcher
+from webportal.map_website.visited_store import (
+    HashedURLSet,
+    ScalableBloomFilter,
+    TitleStore,
+    make_visited_store,
+)
+
+URLS = [f"https://example.com/news/article-{i}" for i in range(20_000)]
+
+
+@pytest.mark.parametrize("kind", ["set", "hashed", "bloom"])
+def test_visited_store_membership(kind):
+    store = make_visited_store(kind, error_rate=1e-6)
+    store.update(URLS[:10_000])
+    store.add(URLS[0])
+
+    assert len(store) == 10_000
+    assert all(url in store for url in URLS[:10_000])
+    assert not any(url in store for url in URLS[10_000:])
+
+    store.discard(URLS[0])
+    assert URLS[0] not in store
+    assert len(store) == 9_999
+    store.add(URLS[0])
+    assert URLS[0] in store
+    assert len(store) == 10_000
+
+
+def test_hashed_set_merges_recent_hashes():
+    store = HashedURLSet(URLS)
+    assert len(store._sorted) > 0
+    assert list(store._sorted) == sorted(store._sorted)
+    assert all(url in store for url in URLS)
+    store.discard(URLS[5])
+    assert URLS[5] not in store
+    assert len(store) == len(URLS) - 1
+
+
+def test_bloom_filter_scales_within_error_rate():
+    store = ScalableBloomFilter(URLS, error_rate=1e-2, initial_capacity=1000)
+    assert len(store.filters) > 1
+    unseen = [f"https://example.com/blog/post-{i}" for i in range(20_000)]
+    # Hashes differ between processes: leave some margin over the expected rate
+    assert sum(url in store for url in unseen) / len(unseen) < 1.5e-2
+
+    with pytest.raises(ValueError):
+        ScalableBloomFilter(error_rate=0)
+
+
+def test_title_store_is_bounded():
+    titles = TitleStore(max_titles=2, max_length=5)
+    titles.update({URLS[0]: "First page", URLS[1]: None})
+    titles[URLS[2]] = "Third"
+    titles[URLS[0]] = "Renamed"
+
+    assert titles == {URLS[0]: "Renam", URLS[1]: None}
+    assert titles.nb_dropped == 1
+
+
+@pytest.mark.asyncio
+async def test_crawler_with_hashed_visited_store():
+    links = "".join(f'<a href="/news/topic-{i}/article">Article</a>' for i in range(12))
+    html = f"<html><head><title>News</title></head><body>{links}<p>{'text ' * 100}</p></body></html>"
+    requests = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(request.url)
+        return httpx.Response(200, headers={"content-type": "text/html"}, text=html)
+
+    crawler = FastJSCrawler(
+        "https://example.com/news",
+        http_first=True,
+        respect_robots=False,
+        visited_store="hashed",
+        max_titles=10,
+    )
+    crawler.static_fetcher = StaticFetcher(
+        client=httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    )
+    await crawler.crawl_page(None, "https://example.com/news", 0)
+    await crawler.crawl_page(None, "https://example.com/news", 0)
+
+    assert len(requests) == 1
+    assert "https://example.com/news" in crawler.visited
+    assert crawler.page_titles == {"https://example.com/news": "News"}
+    stats = crawler.get_statistics()
+    assert stats["pages_crawled"] == 1
+    assert stats["depth_distribution"] == {}
+    with pytest.raises(ValueError):
+        crawler.export_structure("urls")
+    await crawler.static_fetcher.aclose()